@@ -0,0 +1,69 @@
+"""
+命令行迁移标注存储后端（每图一个 JSON 文件 <-> SQLite 数据库）
+
+迁移会保留每条标注的版本时间戳，迁移后修改 config.json 中的 annotation_store 并重启服务。
+
+用法（在 backend 目录下）:
+    python annotation_store_tool.py to-sqlite                 # JSON 文件 -> annotations.db
+    python annotation_store_tool.py to-files                  # annotations.db -> JSON 文件
+    python annotation_store_tool.py to-sqlite --annotations-dir D:/data/annotations
+"""
+import json
+import argparse
+
+from config import Config
+from services import FileAnnotationStore, SqliteAnnotationStore
+
+
+BATCH_SIZE = 500    # 每批写入的标注数
+
+
+def migrate(source, target, indent):
+    """
+    把 source 中的所有标注写入 target
+
+    Returns:
+        int: 迁移的标注数
+    """
+    versions = source.versions()
+    count = 0
+    batch = []
+    for stem, data in source.iter_all():
+        text = json.dumps(data, ensure_ascii=False, indent=indent)
+        batch.append((stem, data, text, versions.get(stem)))
+        if len(batch) >= BATCH_SIZE:
+            target.save_many(batch)
+            count += len(batch)
+            batch = []
+            print(f"[信息] 已迁移 {count} 条标注")
+    if batch:
+        target.save_many(batch)
+        count += len(batch)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在 JSON 文件与 SQLite 之间迁移标注")
+    parser.add_argument('command', choices=['to-sqlite', 'to-files'])
+    parser.add_argument('--annotations-dir', help="标注目录（默认使用 config.json 中的配置）")
+    args = parser.parse_args()
+
+    config_manager = Config()
+    annotations_dir = args.annotations_dir or config_manager.annotations_dir
+    durability = config_manager.get('annotation_durability', 'atomic')
+    files = FileAnnotationStore(annotations_dir, cache_size=0, durability=durability)
+    database = SqliteAnnotationStore(annotations_dir, durability)
+
+    source, target = (files, database) if args.command == 'to-sqlite' else (database, files)
+    try:
+        count = migrate(source, target, config_manager.get('json_indent', 2))
+    finally:
+        files.close()
+        database.close()
+
+    print(f"[信息] 已从 {source.name} 迁移 {count} 条标注到 {target.name}")
+    print(f"[信息] 请将 config.json 中的 annotation_store 设置为 \"{target.name}\" 并重启服务")
+
+
+if __name__ == '__main__':
+    main()
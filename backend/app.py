@@ -2,29 +2,42 @@
 VLM Annotation Tool - 后端服务
 重构版本 - 标准MVC架构
 """
+import time
+import threading
+
 from flask import Flask
 from flask_cors import CORS
 
 # 导入配置和工具
 from config import Config
-from utils import SystemHelper
+from utils import SystemHelper, FileSender, CompactJSONProvider, ResponseCompressor
 
 # 导入服务层
-from services import ImageService, AnnotationService, FolderService
+from services import (
+    ImageService, AnnotationService, FolderService, ExportService, JobManager, StatsService, SearchService
+)
 
 # 导入控制器
 from controllers import (
     ConfigController,
     ImageController,
     AnnotationController,
-    FolderController
+    FolderController,
+    ExportController,
+    JobController,
+    StatsController,
+    SearchController
 )
 
+# 多 worker 部署时检查其他 worker 所做修改的最短间隔（秒）
+WORKER_SYNC_INTERVAL = 1.0
+
 
 def create_app():
     """应用工厂函数"""
     # 初始化 Flask 应用
     app = Flask(__name__)
+    app.json = CompactJSONProvider(app)
     CORS(app)
     
     # 初始化配置和系统检测
@@ -32,21 +45,87 @@ def create_app():
     gui_available = SystemHelper.has_gui_support()
     
     # 初始化服务层
-    image_service = ImageService(
-        config_manager.images_dir,
-        config_manager.annotations_dir
-    )
     annotation_service = AnnotationService(
         config_manager.annotations_dir,
         config_manager.config
     )
+    image_service = ImageService(
+        config_manager.images_dir,
+        config_manager.annotations_dir,
+        thumbnail_workers=config_manager.get('thumbnail_workers'),
+        prewarm_thumbnails=config_manager.get('thumbnail_prewarm', True),
+        thumbnail_profile=config_manager.get('thumbnail_profile', 'balanced'),
+        preview_size=int(config_manager.get('preview_size', 1600)),
+        cache_max_mb=config_manager.get('derivative_cache_max_mb', 2048),
+        progressive_cache_max_mb=config_manager.get('progressive_cache_max_mb', 2048),
+        full_hash=config_manager.get('fingerprint_full_hash', False),
+        annotation_store=annotation_service.store
+    )
     folder_service = FolderService(gui_available)
+    export_service = ExportService(annotation_service, config_manager)
+    # 任务快照放在各 worker 共享的目录中，任意 worker 都能查询和取消任务
+    job_manager = JobManager(config_manager.base_dir / '.jobs')
+    stats_service = StatsService(annotation_service)
+    search_service = SearchService(annotation_service, image_service)
+    
+    # 标注变更时同步图片索引中的标注状态
+    annotation_service.add_listener(image_service.on_annotation_changed)
+    
+    # 后台监听目录变化，增量更新图片索引
+    if config_manager.get('watch_images', True):
+        image_service.start_watcher(
+            poll_interval=float(config_manager.get('watch_poll_interval', 5))
+        )
+    
+    # 后台预生成缺失的缩略图
+    if image_service.prewarm_thumbnails:
+        image_service.warm_thumbnails_async()
     
     # 初始化控制器
     config_controller = ConfigController(config_manager, gui_available)
-    image_controller = ImageController(image_service)
-    annotation_controller = AnnotationController(annotation_service)
+    image_controller = ImageController(
+        image_service,
+        FileSender(
+            config_manager.get('static_offload', 'off'),
+            config_manager.get('static_offload_prefix', '/_protected'),
+            root=lambda: image_service.thumbnails_dir.parent
+        )
+    )
+    annotation_controller = AnnotationController(annotation_service, image_service, job_manager)
     folder_controller = FolderController(folder_service, config_manager, SystemHelper)
+    export_controller = ExportController(export_service)
+    job_controller = JobController(job_manager)
+    stats_controller = StatsController(stats_service)
+    search_controller = SearchController(search_service)
+    
+    # ============= 多 worker 同步 =============
+    # 生产环境由 gunicorn 启动多个 worker 进程（见 gunicorn.conf.py），每个进程有各自的配置和服务实例，
+    # 请求前（最多每秒一次）加载其他 worker 保存的配置、同步其他 worker 写入的标注
+    last_sync = [0.0]
+    sync_lock = threading.Lock()
+    
+    @app.before_request
+    def sync_with_other_workers():
+        now = time.monotonic()
+        if now - last_sync[0] < WORKER_SYNC_INTERVAL or not sync_lock.acquire(blocking=False):
+            return
+        try:
+            last_sync[0] = now
+            if config_manager.reload_if_changed():
+                print("[信息] 配置已被其他进程修改，重新加载")
+                config_controller.apply_config(image_service, annotation_service)
+            image_service.sync_annotations(annotation_service.store.sync_external())
+        except Exception as e:
+            print(f"[错误] 同步其他进程的修改失败: {e}")
+        finally:
+            sync_lock.release()
+    
+    # 较大的 JSON 响应（图片列表、全部标注）按 Accept-Encoding 压缩
+    response_compressor = ResponseCompressor(config_manager.get('json_compress_min_bytes', 1024))
+    
+    @app.after_request
+    def compress_response(response):
+        return response_compressor.apply(response)
     
     # ============= 注册路由 =============
     
@@ -73,10 +152,34 @@ def create_app():
     def get_images():
         return image_controller.get_images()
     
+    @app.route('/api/images/refresh', methods=['POST'])
+    def refresh_images():
+        return image_controller.refresh_images()
+    
+    @app.route('/api/images/changes', methods=['GET'])
+    def get_image_changes():
+        return image_controller.get_image_changes()
+    
+    @app.route('/api/images/events', methods=['GET'])
+    def stream_image_events():
+        return image_controller.stream_image_events()
+    
     @app.route('/api/images/<path:filename>', methods=['GET'])
     def serve_image(filename):
         return image_controller.serve_image(filename)
     
+    @app.route('/api/thumbnails/stats', methods=['GET'])
+    def get_thumbnail_stats():
+        return image_controller.get_thumbnail_stats()
+    
+    @app.route('/api/thumbnails/batch', methods=['POST'])
+    def get_thumbnail_batch():
+        return image_controller.get_thumbnail_batch()
+    
+    @app.route('/api/thumbnails/warm', methods=['POST'])
+    def warm_thumbnails():
+        return image_controller.warm_thumbnails()
+    
     @app.route('/api/thumbnails/<path:filename>', methods=['GET'])
     def serve_thumbnail(filename):
         return image_controller.serve_thumbnail(filename)
@@ -86,6 +189,22 @@ def create_app():
         return image_controller.delete_image(filename)
     
     # 标注相关路由
+    @app.route('/api/annotations/cache/stats', methods=['GET'])
+    def get_annotation_cache_stats():
+        return annotation_controller.get_cache_stats()
+    
+    @app.route('/api/annotations/summaries', methods=['POST'])
+    def get_annotation_summaries():
+        return annotation_controller.get_annotation_summaries()
+    
+    @app.route('/api/annotations/migrate', methods=['POST'])
+    def migrate_annotations():
+        return annotation_controller.migrate_annotations()
+    
+    @app.route('/api/annotations/bulk', methods=['POST'])
+    def save_annotations_bulk():
+        return annotation_controller.save_annotations_bulk()
+    
     @app.route('/api/annotations/<path:image_name>', methods=['GET'])
     def get_annotation(image_name):
         return annotation_controller.get_annotation(image_name)
@@ -102,9 +221,43 @@ def create_app():
     def get_all_annotations():
         return annotation_controller.get_all_annotations()
     
+    # 后台任务相关路由
+    @app.route('/api/jobs', methods=['GET'])
+    def list_jobs():
+        return job_controller.list_jobs()
+    
+    @app.route('/api/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        return job_controller.get_job(job_id)
+    
+    @app.route('/api/jobs/<job_id>', methods=['DELETE'])
+    def cancel_job(job_id):
+        return job_controller.cancel_job(job_id)
+    
+    # 导出相关路由
+    @app.route('/api/export/vlm', methods=['GET'])
+    def export_vlm():
+        return export_controller.export_vlm()
+    
+    # 统计相关路由
+    @app.route('/api/stats', methods=['GET'])
+    def get_stats():
+        return stats_controller.get_stats()
+    
+    # 搜索相关路由
+    @app.route('/api/search', methods=['GET'])
+    def search_annotations():
+        return search_controller.search()
+    
+    @app.route('/api/search/stats', methods=['GET'])
+    def get_search_stats():
+        return search_controller.get_index_stats()
+    
     # 存储配置管理器供其他地方使用
     app.config_manager = config_manager
     app.gui_available = gui_available
+    # ASGI 入口（asgi.py）以协程处理变更订阅时使用
+    app.image_service = image_service
     
     return app
 
@@ -122,4 +275,5 @@ if __name__ == '__main__':
     print(f"GUI support: {'Available' if app.gui_available else 'Not available (container mode)'}")
     print("=" * 60)
     
+    # 开发服务器（单进程）；生产环境使用 gunicorn -c gunicorn.conf.py wsgi:app
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,43 @@
+"""
+ASGI 入口 - 供 uvicorn 加载
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+与 wsgi.py 共用同一个 Flask 应用和服务实例，区别在于：
+- 图片变更订阅（SSE / 长轮询）由协程处理，打开的标注页面不再各自占用一个线程
+- 其余请求按类型在独立线程池中执行（读取图片/生成缩略图、读写标注、导出），
+  文件和 PIL 等阻塞操作不会阻塞事件循环，某一类请求变慢也不会占满其他请求的线程
+
+线程池大小可用环境变量 VLM_MEDIA_THREADS、VLM_ANNOTATION_THREADS、VLM_EXPORT_THREADS、VLM_THREADS 调整；
+多 worker 时同时设置 VLM_WEB_WORKERS 与 --workers 一致（缩略图进程池按 worker 数分配 CPU）。
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app import create_app
+from controllers import AsyncImageController
+from utils.asgi_bridge import AsgiBridge
+
+
+def _pool(env_name, default, prefix):
+    return ThreadPoolExecutor(max_workers=int(os.environ.get(env_name, default)), thread_name_prefix=prefix)
+
+
+flask_app = create_app()
+async_image_controller = AsyncImageController(flask_app.image_service)
+
+media_pool = _pool('VLM_MEDIA_THREADS', 16, 'media')
+app = AsgiBridge(
+    flask_app.wsgi_app,
+    pools=[
+        ('/api/images', media_pool),
+        ('/api/thumbnails', media_pool),
+        ('/api/annotations', _pool('VLM_ANNOTATION_THREADS', 8, 'annotations')),
+        ('/api/export/', _pool('VLM_EXPORT_THREADS', 2, 'export')),
+    ],
+    default_pool=_pool('VLM_THREADS', 8, 'default'),
+    routes={
+        ('GET', '/api/images/changes'): async_image_controller.get_image_changes,
+        ('GET', '/api/images/events'): async_image_controller.stream_image_events,
+    }
+)
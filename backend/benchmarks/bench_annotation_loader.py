@@ -0,0 +1,108 @@
+"""
+批量读取标注基准测试
+
+比较不同并发线程数下 FileAnnotationStore.iter_all 的吞吐量（文件/秒），
+分别在本地磁盘和模拟的高延迟文件系统（每次打开文件前 sleep，近似 NFS/SMB 的往返延迟）上测试。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_annotation_loader.py
+    python benchmarks/bench_annotation_loader.py --count 5000 --latency-ms 5 --workers 1 4 16 64
+    python benchmarks/bench_annotation_loader.py --annotations-dir D:/data/annotations   # 真实目录
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.annotation_store import FileAnnotationStore
+
+
+class LatencyAnnotationStore(FileAnnotationStore):
+    """每次打开文件前等待固定时间，模拟高延迟文件系统"""
+
+    latency = 0.0
+
+    @classmethod
+    def _load_file(cls, annotation_file):
+        time.sleep(cls.latency)
+        return FileAnnotationStore._load_file(annotation_file)
+
+
+def generate_annotations(directory, count):
+    """生成与默认字段配置结构相近的标注文件"""
+    categories = ["缺失元素", "偏移问题", "物理缺陷", "打印质量", "整体布局"]
+    for index in range(count):
+        data = {
+            "image_name": f"img_{index:06d}.jpg",
+            "image_path": f"images/img_{index:06d}.jpg",
+            "overall_status": random.choice(["PASS", "FAIL"]),
+            "defect_categories": [
+                {
+                    "number": number + 1,
+                    "category": category,
+                    "compliance": random.random() > 0.2,
+                    "result": "检测结果描述" * random.randint(1, 5),
+                    "details": []
+                }
+                for number, category in enumerate(categories)
+            ],
+            "updated_at": "2025-01-01T00:00:00"
+        }
+        with open(Path(directory) / f"img_{index:06d}.json", 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def run(store, workers, ordered, repeat):
+    """返回 (最佳吞吐量 文件/秒, 文件数)"""
+    best = 0.0
+    count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = sum(1 for _ in store.iter_all(ordered=ordered, workers=workers))
+        elapsed = time.perf_counter() - started
+        best = max(best, count / elapsed if elapsed else 0.0)
+    return best, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量读取标注基准测试")
+    parser.add_argument('--annotations-dir', help="使用真实标注目录（默认生成测试数据）")
+    parser.add_argument('--count', type=int, default=2000, help="生成的标注文件数")
+    parser.add_argument('--latency-ms', type=float, default=2.0, help="模拟的每次打开延迟（毫秒）")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.annotations_dir
+        if not directory:
+            print(f"生成 {args.count} 个标注文件...")
+            generate_annotations(tmp, args.count)
+            directory = tmp
+
+        scenarios = [
+            ("本地磁盘", 0.0, args.repeat),
+            (f"模拟延迟 {args.latency_ms:g}ms", args.latency_ms / 1000, 1),
+        ]
+        print(f"\n{'场景':<16}{'线程数':>6}{'有序(文件/秒)':>16}{'无序(文件/秒)':>16}{'加速比':>8}")
+        print("-" * 64)
+        for label, latency, repeat in scenarios:
+            LatencyAnnotationStore.latency = latency
+            store = LatencyAnnotationStore(directory, cache_size=0)
+            baseline = None
+            for workers in args.workers:
+                ordered_rate, count = run(store, workers, True, repeat)
+                unordered_rate, _ = run(store, workers, False, repeat)
+                baseline = baseline or ordered_rate
+                speedup = ordered_rate / baseline if baseline else 0.0
+                print(f"{label:<16}{workers:>6}{ordered_rate:>16.0f}{unordered_rate:>16.0f}{speedup:>7.1f}x")
+            print(f"（共 {count} 个文件）\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+标注字段结构基准测试
+
+比较默认标注生成（每次解释 json_fields 配置 vs 复制编译好的模板）和保存时校验的吞吐量（次/秒）。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_annotation_schema.py
+    python benchmarks/bench_annotation_schema.py --number 200000
+"""
+import sys
+import copy
+import time
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config
+from services.annotation_schema import AnnotationSchema
+
+
+def interpret_default(json_fields, image_name):
+    """编译前的实现：每次遍历 json_fields 配置生成默认标注"""
+    def build(configs):
+        obj = {}
+        for field_config in configs:
+            field_name = field_config['name']
+            field_type = field_config['type']
+            default_value = field_config.get('defaultValue', '')
+            if field_type == 'string':
+                obj[field_name] = default_value if default_value else ''
+            elif field_type == 'number':
+                obj[field_name] = float(default_value) if default_value else 0
+            elif field_type == 'boolean':
+                obj[field_name] = default_value == 'true' or default_value == True
+            elif field_type == 'array':
+                obj[field_name] = []
+            elif field_type == 'object':
+                obj[field_name] = build(field_config.get('children', []))
+            else:
+                obj[field_name] = default_value
+        return obj
+
+    data = {
+        "image_name": image_name,
+        "image_path": f"images/{image_name}",
+        "created_at": datetime.now().isoformat(),
+        "updated_at": datetime.now().isoformat()
+    }
+    data.update(build(json_fields))
+    return data
+
+
+def sample_annotation():
+    """与默认字段配置对应的完整标注"""
+    categories = ["缺失元素", "偏移问题", "物理缺陷", "打印质量", "整体布局"]
+    return {
+        "image_name": "img_000001.jpg",
+        "image_path": "images/img_000001.jpg",
+        "overall_status": "FAIL",
+        "defect_categories": [
+            {"number": i + 1, "category": c, "compliance": i != 2, "result": "检测结果描述", "details": []}
+            for i, c in enumerate(categories)
+        ],
+        "confidence_score": 0.95,
+        "processing_info": {}
+    }
+
+
+def measure(func, number):
+    """返回每秒执行次数"""
+    started = time.perf_counter()
+    for _ in range(number):
+        func()
+    elapsed = time.perf_counter() - started
+    return number / elapsed if elapsed else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="标注字段结构基准测试")
+    parser.add_argument('--number', type=int, default=100000, help="每项测试的执行次数")
+    args = parser.parse_args()
+
+    json_fields = Config().get('json_fields', [])
+    schema = AnnotationSchema(json_fields)
+    template = interpret_default(json_fields, "img.jpg")
+    annotation = sample_annotation()
+
+    assert schema.default("img.jpg").keys() == template.keys()
+    assert schema.validate(annotation) == []
+
+    results = [
+        ("默认标注：解释配置", measure(lambda: interpret_default(json_fields, "img.jpg"), args.number)),
+        ("默认标注：deepcopy 模板", measure(lambda: copy.deepcopy(template), args.number)),
+        ("默认标注：编译模板", measure(lambda: schema.default("img.jpg"), args.number)),
+        ("校验完整标注", measure(lambda: schema.validate(annotation), args.number)),
+        ("校验默认标注（必填项为空）", measure(lambda: schema.validate(template), args.number)),
+        ("编译 json_fields", measure(lambda: AnnotationSchema(json_fields), max(args.number // 10, 1))),
+    ]
+
+    print(f"\n{'测试':<24}{'次/秒':>14}")
+    print("-" * 40)
+    for label, rate in results:
+        print(f"{label:<24}{rate:>14,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+文件发送基准测试
+
+比较由 Python 发送文件（static_offload = off）与只返回 X-Accel-Redirect 头（x-accel）时，
+应用每秒能处理的图片请求数和经过 Python 的数据量。x-accel 模式下文件内容由 nginx 发送，
+这里只测量 worker 被占用的部分。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_file_offload.py
+    python benchmarks/bench_file_offload.py --size-mb 20 --threads 8 --number 200
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask import Flask
+
+from utils import FileSender
+
+
+def create_bench_app(directory, mode):
+    app = Flask(__name__)
+    sender = FileSender(mode, root=directory)
+
+    @app.route('/files/<name>')
+    def serve(name):
+        return sender.send(Path(directory) / name, etag=name)
+
+    return app
+
+
+def measure(app, name, threads, number):
+    """
+    并发请求同一文件
+
+    Returns:
+        tuple: (请求/秒, 经过 Python 的 MB/秒)
+    """
+    transferred = [0]
+    lock = threading.Lock()
+
+    def worker(count):
+        client = app.test_client()
+        total = 0
+        for _ in range(count):
+            response = client.get(f'/files/{name}')
+            total += sum(len(chunk) for chunk in response.response)
+            response.close()
+        with lock:
+            transferred[0] += total
+
+    per_thread = max(1, number // threads)
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(per_thread,)) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return per_thread * threads / elapsed, transferred[0] / 1024 / 1024 / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文件发送基准测试")
+    parser.add_argument('--size-mb', type=float, default=8, help="测试文件大小（MB，相当于一张大图原图）")
+    parser.add_argument('--threads', type=int, default=4, help="并发请求线程数")
+    parser.add_argument('--number', type=int, default=400, help="总请求数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        name = 'large.jpg'
+        with open(Path(tmp) / name, 'wb') as f:
+            f.write(os.urandom(int(args.size_mb * 1024 * 1024)))
+
+        print(f"\n{'发送方式':<12}{'请求/秒':>12}{'Python 发送(MB/s)':>20}")
+        print("-" * 44)
+        for mode in FileSender.MODES:
+            rate, throughput = measure(create_bench_app(tmp, mode), name, args.threads, args.number)
+            print(f"{mode:<12}{rate:>12,.0f}{throughput:>20,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+JSON 响应体积与序列化耗时基准测试
+
+生成合成标注数据（默认字段配置，中文检测结果），模拟 /api/annotations 返回的全部标注，比较：
+- 序列化方式：Flask 默认 jsonify（调试模式缩进 / 非调试模式）、紧凑 JSON（标准库 / orjson）
+- 压缩方式：紧凑 JSON 再经 gzip / brotli（已安装时）压缩
+- 完整请求：Flask 默认 jsonify 与 CompactJSONProvider + ResponseCompressor（Accept-Encoding: gzip, br）
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_json_payload.py
+    python benchmarks/bench_json_payload.py --count 100000 --repeat 5
+"""
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+from utils import CompactJSONProvider, ResponseCompressor
+from utils import json_response
+
+CATEGORIES = ["缺失元素", "偏移问题", "物理缺陷", "打印质量", "整体布局"]
+RESULTS = [
+    "标签完整，未发现缺失元素",
+    "标签整体向左偏移约 2mm，字符位置正常",
+    "标签右下角存在气泡和轻微皱褶",
+    "二维码打印不完整，部分字符模糊",
+    "元素排版正常",
+]
+DETAILS = ["左上角", "二维码区域", "批次号字符", "右侧边缘"]
+
+
+def generate_annotations(count, seed=0):
+    """生成 count 条合成标注，结构与 /api/annotations 的返回一致"""
+    rng = random.Random(seed)
+    annotations = []
+    for i in range(count):
+        categories = []
+        for number, category in enumerate(CATEGORIES, 1):
+            compliance = rng.random() < 0.8
+            categories.append({
+                "number": number,
+                "category": category,
+                "compliance": compliance,
+                "result": RESULTS[0] if compliance else rng.choice(RESULTS[1:]),
+                "details": [] if compliance else rng.sample(DETAILS, rng.randint(1, 2)),
+            })
+        annotations.append({
+            "image_name": f"IMG_{i:06d}",
+            "annotation": {
+                "overall_status": "PASS" if all(c["compliance"] for c in categories) else "FAIL",
+                "defect_categories": categories,
+                "confidence_score": round(rng.uniform(0.5, 1.0), 3),
+            }
+        })
+    return {"annotations": annotations}
+
+
+def best_time(func, repeat):
+    """多次执行取最短耗时（秒），返回 (耗时, 最后一次的结果)"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def create_bench_app(payload, compact, debug=False):
+    app = Flask(__name__)
+    app.debug = debug
+    if compact:
+        app.json = CompactJSONProvider(app)
+        compressor = ResponseCompressor()
+
+        @app.after_request
+        def compress_response(response):
+            return compressor.apply(response)
+
+    @app.route('/api/annotations')
+    def annotations():
+        return jsonify(payload)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 响应体积与序列化耗时基准测试")
+    parser.add_argument('--count', type=int, default=50000, help="合成标注数")
+    parser.add_argument('--repeat', type=int, default=3, help="每项重复次数（取最短耗时）")
+    args = parser.parse_args()
+
+    payload = generate_annotations(args.count)
+    print(f"合成标注 {args.count} 条，orjson {'已安装' if json_response.orjson else '未安装'}，"
+          f"brotli {'已安装' if json_response.brotli else '未安装'}")
+
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    serializers = [
+        ("jsonify 调试模式（缩进）", lambda: default_provider.dumps(payload, indent=2).encode('utf-8')),
+        ("jsonify 非调试模式", lambda: default_provider.dumps(payload, separators=(',', ':')).encode('utf-8')),
+        ("紧凑 JSON（标准库）", lambda: json_response.dumps(payload, fast=False)),
+    ]
+    if json_response.orjson is not None:
+        serializers.append(("紧凑 JSON（orjson）", lambda: json_response.dumps(payload)))
+
+    print(f"\n{'序列化':<24}{'耗时(ms)':>10}{'大小(KB)':>12}")
+    print("-" * 46)
+    for label, func in serializers:
+        elapsed, data = best_time(func, args.repeat)
+        print(f"{label:<24}{elapsed * 1000:>10.1f}{len(data) / 1024:>12,.0f}")
+    compact = json_response.dumps(payload)
+
+    compressions = [(f"gzip level {level}", ResponseCompressor(gzip_level=level), 'gzip') for level in (1, 6, 9)]
+    if json_response.brotli is not None:
+        compressions += [(f"brotli quality {quality}", ResponseCompressor(brotli_quality=quality), 'br')
+                         for quality in (3, 5, 7)]
+    print(f"\n{'压缩（紧凑 JSON）':<24}{'耗时(ms)':>10}{'大小(KB)':>12}{'压缩比':>8}")
+    print("-" * 54)
+    for label, compressor, encoding in compressions:
+        elapsed, data = best_time(lambda: compressor.compress(compact, encoding), args.repeat)
+        print(f"{label:<24}{elapsed * 1000:>10.1f}{len(data) / 1024:>12,.0f}{len(compact) / len(data):>8.1f}")
+
+    requests = [
+        ("Flask 默认（调试模式）", create_bench_app(payload, compact=False, debug=True)),
+        ("Flask 默认", create_bench_app(payload, compact=False)),
+        ("紧凑 + 压缩", create_bench_app(payload, compact=True)),
+    ]
+    print(f"\n{'完整请求':<24}{'耗时(ms)':>10}{'传输(KB)':>12}{'编码':>8}")
+    print("-" * 54)
+    for label, bench_app in requests:
+        client = bench_app.test_client()
+        headers = {'Accept-Encoding': 'gzip, deflate, br'}
+        elapsed, response = best_time(lambda: client.get('/api/annotations', headers=headers), args.repeat)
+        encoding = response.headers.get('Content-Encoding', '-')
+        print(f"{label:<24}{elapsed * 1000:>10.1f}{len(response.data) / 1024:>12,.0f}{encoding:>8}")
+
+
+if __name__ == '__main__':
+    main()
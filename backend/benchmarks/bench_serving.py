@@ -0,0 +1,250 @@
+"""
+服务吞吐量基准测试
+
+启动开发服务器（python app.py）、gunicorn 多 worker 服务或 ASGI 服务（uvicorn asgi:app），
+模拟多个标注人员并发浏览：每个客户端循环请求缩略图、原图、标注和图片列表，
+统计总吞吐量（请求/秒）及各类请求的延迟分位数。--sse-clients 在压测期间保持若干个
+图片变更订阅（/api/images/events）连接，相当于打开着的标注页面。
+使用 config.json 中的图片和标注目录，测试前先预热缩略图缓存。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_serving.py --server dev
+    python benchmarks/bench_serving.py --server gunicorn --workers 4 --threads 16
+    python benchmarks/bench_serving.py --server gunicorn --workers 1 --sse-clients 15
+    python benchmarks/bench_serving.py --server asgi --workers 1 --sse-clients 15
+    python benchmarks/bench_serving.py --url http://localhost:5000     # 测试已运行的服务
+"""
+import os
+import sys
+import json
+import time
+import signal
+import random
+import argparse
+import threading
+import subprocess
+import http.client
+from pathlib import Path
+from urllib.parse import urlsplit, quote
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# 各类请求的权重（浏览图片列表时以缩略图为主）
+REQUEST_MIX = [
+    ("thumbnail", 6),
+    ("annotation", 2),
+    ("image", 1),
+    ("list", 1),
+]
+
+
+def start_server(kind, port, workers, threads):
+    """启动被测服务，返回子进程"""
+    env = dict(os.environ)
+    if kind == 'dev':
+        command = [sys.executable, 'app.py']
+    elif kind == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+                   '--workers', str(workers), '--no-access-log']
+        env["VLM_WEB_WORKERS"] = str(workers)
+    else:
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+        env.update({
+            "VLM_BIND": f"127.0.0.1:{port}",
+            "VLM_WEB_WORKERS": str(workers),
+            "VLM_THREADS": str(threads),
+        })
+    return subprocess.Popen(
+        command, cwd=BACKEND_DIR, env=env, start_new_session=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def wait_ready(host, port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=5)
+            conn.request('GET', '/api/config')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("服务启动超时")
+
+
+def fetch(conn, path):
+    conn.request('GET', path)
+    response = conn.getresponse()
+    body = response.read()
+    return response.status, body
+
+
+def list_images(host, port):
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    status, body = fetch(conn, '/api/images')
+    if status != 200:
+        raise RuntimeError(f"获取图片列表失败: HTTP {status}")
+    return [image["name"] for image in json.loads(body)["images"]]
+
+
+def warm_up(host, port, names):
+    """逐个请求缩略图，确保测试期间命中衍生图缓存"""
+    conn = http.client.HTTPConnection(host, port, timeout=120)
+    for name in names:
+        fetch(conn, f'/api/thumbnails/{quote(name)}')
+
+
+def open_subscriptions(host, port, count):
+    """
+    打开 count 个图片变更订阅并在后台读取，返回停止函数
+    
+    订阅由服务端长期保持：gthread worker 中每个订阅占用一个线程，ASGI 入口中只是一个协程。
+    """
+    stopped = threading.Event()
+    connections = []
+    
+    def subscriber():
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        connections.append(conn)
+        try:
+            conn.request('GET', '/api/images/events')
+            response = conn.getresponse()
+            while not stopped.is_set() and response.read1(4096):
+                pass
+        except (OSError, http.client.HTTPException, AttributeError):
+            pass
+    
+    threads = [threading.Thread(target=subscriber, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    time.sleep(1 if count else 0)
+    
+    def stop():
+        stopped.set()
+        for conn in connections:
+            conn.close()
+    
+    return stop
+
+
+def run_load(host, port, names, clients, duration):
+    """
+    并发压测
+
+    Returns:
+        dict: 请求类型 -> [延迟(秒)]，以及错误数
+    """
+    kinds = [kind for kind, weight in REQUEST_MIX for _ in range(weight)]
+    latencies = {kind: [] for kind, _weight in REQUEST_MIX}
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        local = {kind: [] for kind in latencies}
+        failed = 0
+        while time.perf_counter() < deadline:
+            kind = rng.choice(kinds)
+            name = quote(rng.choice(names))
+            path = {
+                "thumbnail": f'/api/thumbnails/{name}',
+                "annotation": f'/api/annotations/{name}',
+                "image": f'/api/images/{name}',
+                "list": '/api/images',
+            }[kind]
+            started = time.perf_counter()
+            try:
+                status, _body = fetch(conn, path)
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=60)
+                continue
+            if status >= 500:
+                failed += 1
+                continue
+            local[kind].append(time.perf_counter() - started)
+        with lock:
+            for kind, values in local.items():
+                latencies[kind].extend(values)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务吞吐量基准测试")
+    parser.add_argument('--server', choices=['dev', 'gunicorn', 'asgi'], default='dev', help="启动的服务类型")
+    parser.add_argument('--url', help="测试已运行的服务（不启动新服务）")
+    parser.add_argument('--workers', type=int, default=4, help="gunicorn / uvicorn worker 数")
+    parser.add_argument('--threads', type=int, default=16, help="gunicorn 每个 worker 的线程数")
+    parser.add_argument('--clients', type=int, default=15, help="并发客户端数（模拟标注人数）")
+    parser.add_argument('--duration', type=float, default=20, help="压测时长（秒）")
+    parser.add_argument('--sse-clients', type=int, default=0, help="压测期间保持的图片变更订阅数（打开的标注页面）")
+    args = parser.parse_args()
+
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port, process = parts.hostname, parts.port or 80, None
+    else:
+        host, port = '127.0.0.1', 5000
+        process = start_server(args.server, port, args.workers, args.threads)
+    try:
+        wait_ready(host, port)
+        names = list_images(host, port)
+        if not names:
+            raise RuntimeError("图片目录为空")
+        print(f"图片 {len(names)} 张，预热缩略图...")
+        warm_up(host, port, names)
+
+        label = args.url or {
+            'dev': 'dev',
+            'gunicorn': f"gunicorn {args.workers}x{args.threads}",
+            'asgi': f"asgi {args.workers} worker(s)",
+        }[args.server]
+        print(f"压测 {label}：{args.clients} 个并发客户端，{args.sse_clients} 个变更订阅，{args.duration:.0f} 秒")
+        stop_subscriptions = open_subscriptions(host, port, args.sse_clients)
+        try:
+            latencies, errors = run_load(host, port, names, args.clients, args.duration)
+        finally:
+            stop_subscriptions()
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"\n{'请求':<12}{'次数':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    print("-" * 50)
+    for kind, values in latencies.items():
+        print(f"{kind:<12}{len(values):>8}{percentile(values, 0.5) * 1000:>10.1f}"
+              f"{percentile(values, 0.95) * 1000:>10.1f}{percentile(values, 0.99) * 1000:>10.1f}")
+    print("-" * 50)
+    print(f"吞吐量: {total / args.duration:,.0f} 请求/秒，错误 {errors}")
+
+
+if __name__ == '__main__':
+    main()
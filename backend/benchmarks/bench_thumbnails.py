@@ -0,0 +1,177 @@
+"""
+缩略图生成基准测试
+
+比较原有实现（完整解码后 LANCZOS 缩放）与各档位快速实现（JPEG DCT 缩放解码）的
+单张耗时和峰值内存（RSS）。每个 格式 x 实现 组合在独立子进程中运行，峰值内存互不影响。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_thumbnails.py                      # 生成 12MP 测试图
+    python benchmarks/bench_thumbnails.py --images-dir D:/imgs # 使用真实图片
+    python benchmarks/bench_thumbnails.py --width 6000 --height 4000 --repeat 5
+"""
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+
+from services.image_service import ImageService
+from services.thumbnail_renderer import render_thumbnail, THUMBNAIL_PROFILES
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def legacy_thumbnail(image_path, thumbnail_path, size):
+    """原有实现：先完整解码并转换模式，再 LANCZOS 缩放"""
+    with Image.open(image_path) as img:
+        if img.mode in ('RGBA', 'LA', 'P'):
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.thumbnail(size, Image.Resampling.LANCZOS)
+        img.save(thumbnail_path, 'JPEG', quality=90, optimize=True)
+
+
+def peak_rss_mb():
+    """当前进程的峰值 RSS（MB），无法获取时返回 None"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为 KB，macOS 为字节
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+    except Exception:
+        return None
+
+
+def _run_case(method, image_paths, output_dir, repeat, result_queue):
+    """子进程：对一组图片重复生成缩略图，返回平均耗时与峰值内存增量"""
+    size = ImageService.THUMBNAIL_SIZE
+    baseline = peak_rss_mb()
+    timings = []
+    for _ in range(repeat):
+        for index, image_path in enumerate(image_paths):
+            output = Path(output_dir) / f"{method}_{index}.jpg"
+            started = time.perf_counter()
+            if method == 'legacy':
+                legacy_thumbnail(image_path, output, size)
+            else:
+                render_thumbnail(image_path, output, size, profile=method)
+            timings.append((time.perf_counter() - started) * 1000)
+    peak = peak_rss_mb()
+    result_queue.put({
+        "avg_ms": sum(timings) / len(timings),
+        "min_ms": min(timings),
+        "peak_rss_mb": peak,
+        "delta_rss_mb": (peak - baseline) if peak is not None and baseline is not None else None
+    })
+
+
+def _run_in_subprocess(target, *args):
+    """
+    在独立子进程中执行 target(*args, result_queue)
+
+    Linux 上 ru_maxrss 会跨 exec 继承，因此主进程本身也要保持较小的内存峰值
+    （测试图的生成同样放在子进程中）
+    """
+    ctx = multiprocessing.get_context('spawn')
+    result_queue = ctx.Queue()
+    process = ctx.Process(target=target, args=(*args, result_queue))
+    process.start()
+    result = result_queue.get()
+    process.join()
+    return result
+
+
+def run_case(method, image_paths, output_dir, repeat):
+    return _run_in_subprocess(_run_case, method, image_paths, output_dir, repeat)
+
+
+def _generate_samples(directory, width, height, result_queue):
+    result_queue.put(generate_samples(directory, width, height))
+
+
+def generate_samples(directory, width, height):
+    """为每种支持的扩展名生成一张测试图（带渐变和噪声，接近真实照片的压缩率）"""
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    base = Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+
+    samples = {}
+    for ext in ImageService.SUPPORTED_EXTENSIONS:
+        path = Path(directory) / f"sample{ext}"
+        try:
+            if ext in ('.jpg', '.jpeg'):
+                base.save(path, 'JPEG', quality=92)
+            elif ext == '.mpo':
+                base.save(path, 'MPO', quality=92)
+            elif ext == '.gif':
+                base.convert('P', palette=Image.Palette.ADAPTIVE).save(path, 'GIF')
+            elif ext == '.png':
+                base.convert('RGBA').save(path, 'PNG', compress_level=1)
+            elif ext == '.webp':
+                base.save(path, 'WEBP', quality=90)
+            else:
+                base.save(path)
+            samples[ext] = [str(path)]
+        except Exception as e:
+            print(f"[警告] 无法生成 {ext} 测试图: {e}")
+    return samples
+
+
+def collect_samples(directory, limit):
+    """按扩展名收集真实图片"""
+    samples = {}
+    for file in sorted(Path(directory).iterdir()):
+        ext = file.suffix.lower()
+        if ext in ImageService.SUPPORTED_EXTENSIONS and len(samples.setdefault(ext, [])) < limit:
+            samples[ext].append(str(file))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="缩略图生成基准测试")
+    parser.add_argument('--images-dir', help="使用目录中的真实图片（每种扩展名最多 --limit 张）")
+    parser.add_argument('--limit', type=int, default=5)
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    methods = ['legacy'] + list(THUMBNAIL_PROFILES)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images_dir:
+            samples = collect_samples(args.images_dir, args.limit)
+        else:
+            print(f"生成 {args.width}x{args.height} 测试图...")
+            samples = _run_in_subprocess(_generate_samples, tmp, args.width, args.height)
+
+        print(f"\n{'格式':<8}{'实现':<10}{'平均(ms)':>10}{'最快(ms)':>10}{'峰值RSS(MB)':>13}{'RSS增量(MB)':>13}")
+        print("-" * 64)
+        for ext, paths in samples.items():
+            if not paths:
+                continue
+            for method in methods:
+                result = run_case(method, paths, tmp, args.repeat)
+                peak = f"{result['peak_rss_mb']:.1f}" if result['peak_rss_mb'] is not None else "n/a"
+                delta = f"{result['delta_rss_mb']:.1f}" if result['delta_rss_mb'] is not None else "n/a"
+                print(f"{ext:<8}{method:<10}{result['avg_ms']:>10.1f}{result['min_ms']:>10.1f}{peak:>13}{delta:>13}")
+            print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 """
 配置管理模块
 """
+import os
 import json
 from pathlib import Path
 from datetime import datetime
@@ -20,10 +21,31 @@ class Config:
             "annotations_dir": str(self.data_dir / "annotations"),
             "auto_save": True,
             "json_indent": 2,
+            "watch_images": True,
+            "watch_poll_interval": 5,
+            "thumbnail_workers": 0,  # 0 表示自动（CPU 核数 - 1）
+            "thumbnail_prewarm": True,
+            "thumbnail_profile": "balanced",  # quality / balanced / fast
+            "preview_size": 1600,  # 预览图最大边长
+            "derivative_cache_max_mb": 2048,  # 缩略图/预览图缓存容量上限，0 表示不限制
+            "progressive_cache_max_mb": 2048,  # 渐进式原图缓存容量上限（与缩略图分开淘汰），0 表示不限制
+            "fingerprint_full_hash": False,  # 缓存键是否哈希完整文件（默认只哈希头/中/尾）
+            "annotation_cache_size": 2048,  # 内存中缓存的标注数，0 表示不缓存
+            "annotation_load_workers": 8,  # 批量读取标注的并发线程数（网络存储上可适当调大）
+            "annotation_write_workers": 4,  # 批量写入标注的并发线程数
+            "annotation_durability": "atomic",  # atomic / fsync / journal（预写日志，合并 fsync）
+            "annotation_store": "file",  # file（每图一个 JSON）/ sqlite（单个数据库），修改后需重启
+            "annotation_validation": "strict",  # 按 json_fields 校验: strict（拒绝）/ warn（仅记录）/ off；自动保存只检查类型，手动保存和批量写入还检查必填项
+            "static_offload": "off",  # 图片发送方式: off（Python 发送）/ x-accel（nginx）/ x-sendfile，修改后需重启
+            "static_offload_prefix": "/_protected",  # x-accel 模式下 nginx internal location 的前缀（alias 指向数据目录）
+            "json_compress_min_bytes": 1024,  # JSON 响应达到该大小时按 Accept-Encoding 压缩（gzip/brotli），0 表示不压缩，修改后需重启
             "prompt_template": self._get_default_prompt_template(),
             "json_fields": self._get_default_json_fields()
         }
         
+        # 配置文件的修改时间，多 worker 部署时用于发现其他进程保存的配置
+        self._mtime_ns = None
+        
         # 加载配置
         self.config = self.load()
         
@@ -137,6 +159,7 @@ class Config:
     def load(self):
         """加载配置文件"""
         if self.config_file.exists():
+            self._mtime_ns = self.config_file.stat().st_mtime_ns
             with open(self.config_file, 'r', encoding='utf-8') as f:
                 config = json.load(f)
                 # 合并默认配置
@@ -144,11 +167,34 @@ class Config:
         return self.default_config.copy()
     
     def save(self, config=None):
-        """保存配置文件"""
+        """保存配置文件（写入临时文件后替换，其他进程不会读到写了一半的文件）"""
         if config:
             self.config = config
-        with open(self.config_file, 'w', encoding='utf-8') as f:
+        tmp_file = self.config_file.with_name(f".{self.config_file.name}.{os.getpid()}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
             json.dump(self.config, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.config_file)
+        self._mtime_ns = self.config_file.stat().st_mtime_ns
+    
+    def reload_if_changed(self):
+        """
+        配置文件被其他进程（其他 worker）修改时重新加载
+        
+        Returns:
+            bool: 是否重新加载
+        """
+        try:
+            mtime_ns = self.config_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime_ns == self._mtime_ns:
+            return False
+        try:
+            self.config = self.load()
+        except ValueError as e:
+            print(f"[警告] 重新加载配置失败: {e}")
+            return False
+        return True
     
     def update(self, new_config):
         """更新配置"""
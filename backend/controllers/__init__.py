@@ -3,12 +3,22 @@
 """
 from .config_controller import ConfigController
 from .image_controller import ImageController
+from .async_image_controller import AsyncImageController
 from .annotation_controller import AnnotationController
 from .folder_controller import FolderController
+from .export_controller import ExportController
+from .job_controller import JobController
+from .stats_controller import StatsController
+from .search_controller import SearchController
 
 __all__ = [
     'ConfigController',
     'ImageController', 
+    'AsyncImageController',
     'AnnotationController',
-    'FolderController'
+    'FolderController',
+    'ExportController',
+    'JobController',
+    'StatsController',
+    'SearchController'
 ]
@@ -3,20 +3,35 @@
 """
 from flask import Blueprint, request, jsonify
 
+from utils import HttpCacheHelper
+from services import AnnotationValidationError, FieldMigration
+
 annotation_bp = Blueprint('annotations', __name__, url_prefix='/api')
 
 
 class AnnotationController:
     """标注管理控制器类"""
     
-    def __init__(self, annotation_service):
+    # 批量写入时可用的过滤条件 -> ImageService.query_images 参数名
+    BULK_FILTERS = {'annotated': 'annotated', 'prefix': 'prefix', 'q': 'search', 'status': 'status'}
+    
+    SUMMARY_BATCH_MAX = 200     # 批量摘要单次最多的图片数
+    
+    def __init__(self, annotation_service, image_service=None, job_manager=None):
         self.annotation_service = annotation_service
+        self.image_service = image_service
+        self.job_manager = job_manager
     
     def get_annotation(self, image_name):
-        """获取指定图片的标注数据"""
+        """获取指定图片的标注数据（支持 ETag / Last-Modified 条件请求）"""
         try:
+            etag, last_modified = self.annotation_service.get_annotation_version(image_name)
+            if etag and HttpCacheHelper.is_not_modified(etag, last_modified):
+                return HttpCacheHelper.not_modified(etag, last_modified, HttpCacheHelper.PRIVATE)
+            
             data = self.annotation_service.get_annotation(image_name)
-            return jsonify(data)
+            # 未标注时返回的默认标注包含当前时间，不设置 ETag
+            return HttpCacheHelper.apply(jsonify(data), etag, last_modified, HttpCacheHelper.PRIVATE)
         except Exception as e:
             print(f"[错误] 获取标注失败: {str(e)}")
             import traceback
@@ -24,14 +39,114 @@ class AnnotationController:
             return jsonify({"error": str(e)}), 500
     
     def save_annotation(self, image_name):
-        """保存标注数据"""
+        """
+        保存标注数据
+        
+        参数 complete=true 表示手动保存完成的标注，同时校验必填字段；
+        否则（切换图片时的自动保存）只校验字段类型，未填完的标注也能保存
+        """
         try:
             data = request.json
-            self.annotation_service.save_annotation(image_name, data)
+            complete = request.args.get('complete', '').lower() in ('1', 'true', 'yes')
+            self.annotation_service.save_annotation(image_name, data, complete)
             return jsonify({"success": True, "message": "标注已保存"})
+        except AnnotationValidationError as e:
+            return jsonify({"error": str(e), "errors": e.errors}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    def save_annotations_bulk(self):
+        """
+        将一份标注模板批量写入多张图片（后台任务）
+        
+        请求体:
+            annotation: 标注模板
+            names / filter / all: 选择图片，三选一
+                names   文件名列表
+                filter  {"annotated", "prefix", "q", "status"}，含义同图片列表查询参数
+                all     true 表示所有图片
+            only_unannotated: true 时跳过已有标注的图片
+        
+        返回 202 及 job_id，通过 /api/jobs/<job_id> 查询进度
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            template = data.get('annotation')
+            if not isinstance(template, dict):
+                return jsonify({"error": "annotation 必须是对象"}), 400
+            self.annotation_service.validate_annotation(template)
+            
+            names = self._select_images(data)
+            only_unannotated = bool(data.get('only_unannotated', False))
+            
+            job = self.job_manager.submit(
+                'bulk_annotation',
+                lambda job: self.annotation_service.save_annotations_bulk(job, names, template, only_unannotated),
+                total=len(names),
+                params={"only_unannotated": only_unannotated}
+            )
+            return jsonify({"success": True, "job_id": job.id, "total": len(names)}), 202
+        except AnnotationValidationError as e:
+            return jsonify({"error": str(e), "errors": e.errors}), 400
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            print(f"[错误] 批量写入标注失败: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+    
+    def migrate_annotations(self):
+        """
+        json_fields 修改后把已有标注迁移为新结构（后台任务）
+        
+        请求体:
+            old_fields: 修改前的字段配置（默认使用本次运行中上一次生效的配置；都没有时只按当前配置补全/转换）
+            renames: {旧字段路径: 新字段名}，如 {"defect_categories.desc": "result"}
+            dry_run: true 时只统计需要改写的标注数和吞吐量，不写入
+        
+        返回 202、job_id 及迁移计划，通过 /api/jobs/<job_id> 查询进度和结果
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            new_fields = self.annotation_service.config.get('json_fields', [])
+            old_fields = data.get('old_fields') or self.annotation_service.previous_fields or new_fields
+            renames = data.get('renames') or {}
+            if not isinstance(old_fields, list) or not isinstance(renames, dict):
+                return jsonify({"error": "old_fields 必须是字段列表，renames 必须是对象"}), 400
+            dry_run = bool(data.get('dry_run', False))
+            
+            migration = FieldMigration(old_fields, new_fields, renames)
+            job = self.job_manager.submit(
+                'schema_migration',
+                lambda job: self.annotation_service.migrate_annotations(job, migration, dry_run),
+                params={"dry_run": dry_run, "migration": migration.id}
+            )
+            return jsonify({"success": True, "job_id": job.id, "migration": migration.id, "plan": migration.plan}), 202
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
+            print(f"[错误] 启动标注迁移失败: {str(e)}")
             return jsonify({"error": str(e)}), 500
     
+    def _select_images(self, data):
+        """按 names / filter / all 解析要写入的图片文件名"""
+        if 'names' in data:
+            names = data['names']
+            if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+                raise ValueError("names 必须是文件名列表")
+            return list(dict.fromkeys(names))
+        if 'filter' in data:
+            filters = data['filter']
+            if not isinstance(filters, dict):
+                raise ValueError("filter 必须是对象")
+            unknown = set(filters) - set(self.BULK_FILTERS)
+            if unknown:
+                raise ValueError(f"不支持的过滤条件: {', '.join(sorted(unknown))}")
+            params = {self.BULK_FILTERS[key]: value for key, value in filters.items() if value not in (None, '')}
+            return [image["name"] for image in self.image_service.query_images(**params)["images"]]
+        if data.get('all'):
+            return [image["name"] for image in self.image_service.get_all_images()]
+        raise ValueError("需要指定 names、filter 或 all")
+    
     def get_all_annotations(self):
         """获取所有标注数据"""
         try:
@@ -41,10 +156,42 @@ class AnnotationController:
             return jsonify({"error": str(e)}), 500
     
     def get_annotation_summary(self, image_name):
-        """获取标注摘要"""
+        """获取标注摘要（支持 ETag 条件请求）"""
         try:
+            etag = self.annotation_service.get_summary_version(image_name)
+            if etag and HttpCacheHelper.is_not_modified(etag):
+                return HttpCacheHelper.not_modified(etag, policy=HttpCacheHelper.PRIVATE)
+            
             summary = self.annotation_service.get_annotation_summary(image_name)
-            return jsonify(summary)
+            return HttpCacheHelper.apply(jsonify(summary), etag, policy=HttpCacheHelper.PRIVATE)
         except Exception as e:
             print(f"[错误] 获取标注摘要失败: {str(e)}")
             return jsonify({"error": str(e)}), 500
+    
+    def get_annotation_summaries(self):
+        """
+        批量获取一页图片的标注摘要
+        
+        请求体: {"names": [文件名, ...]}，单次最多 SUMMARY_BATCH_MAX 个
+        返回: {"summaries": {文件名: {"etag": 摘要版本或 null, "summary": 摘要}}}
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            names = data.get('names')
+            if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+                return jsonify({"error": "names 必须是文件名列表"}), 400
+            if len(names) > self.SUMMARY_BATCH_MAX:
+                return jsonify({"error": f"单次最多 {self.SUMMARY_BATCH_MAX} 张图片"}), 400
+            
+            summaries = self.annotation_service.get_annotation_summaries(list(dict.fromkeys(names)))
+            return jsonify({"summaries": summaries})
+        except Exception as e:
+            print(f"[错误] 批量获取标注摘要失败: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+    
+    def get_cache_stats(self):
+        """标注缓存统计"""
+        try:
+            return jsonify(self.annotation_service.get_cache_stats())
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
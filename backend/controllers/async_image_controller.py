@@ -0,0 +1,74 @@
+"""
+图片变更订阅的协程控制器 - 供 ASGI 入口使用，等待变更期间不占用线程
+"""
+import asyncio
+
+from utils.asgi_bridge import query_params, request_header, send_json
+from .image_controller import ImageController
+
+
+class AsyncImageController:
+    """/api/images/changes 与 /api/images/events 的协程实现，返回内容与 ImageController 相同"""
+
+    # 与 Flask 应用中 CORS(app) 的默认设置一致
+    CORS_HEADERS = [(b'access-control-allow-origin', b'*')]
+
+    def __init__(self, image_service):
+        self.image_service = image_service
+
+    async def get_image_changes(self, scope, receive, send):
+        """长轮询获取图片列表变更（参数同 ImageController.get_image_changes）"""
+        try:
+            args = query_params(scope)
+            since = self._parse_number(args.get('since'), int, None)
+            if since is None:
+                # 首次调用只返回当前序号，作为后续订阅的起点
+                await send_json(send, {"events": [], "last_seq": self.image_service.changes.last_seq, "reset": False},
+                                headers=self.CORS_HEADERS)
+                return
+            timeout = min(max(self._parse_number(args.get('timeout'), float, 0), 0), ImageController.LONG_POLL_MAX)
+            await send_json(send, await self.image_service.get_changes_async(since, timeout), headers=self.CORS_HEADERS)
+        except Exception as e:
+            await send_json(send, {"error": str(e)}, status=500, headers=self.CORS_HEADERS)
+
+    async def stream_image_events(self, scope, receive, send):
+        """以 Server-Sent Events 推送图片列表变更，客户端断开时结束"""
+        changes = self.image_service.changes
+        seq = ImageController.sse_start_seq(
+            changes, request_header(scope, 'Last-Event-ID') or query_params(scope).get('since')
+        )
+        headers = [(b'content-type', b'text/event-stream; charset=utf-8')]
+        headers += [(name.lower().encode(), value.encode()) for name, value in ImageController.SSE_HEADERS.items()]
+        headers += self.CORS_HEADERS
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            message = ImageController.sse_ready(seq)
+            while not disconnected.done():
+                await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+                waiting = asyncio.ensure_future(changes.wait_async(seq, ImageController.SSE_KEEPALIVE))
+                await asyncio.wait({waiting, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not waiting.done():
+                    waiting.cancel()
+                    break
+                events, truncated = waiting.result()
+                message, seq = ImageController.format_sse(events, truncated, seq)
+        except OSError:
+            # 客户端已断开，发送失败
+            pass
+        finally:
+            disconnected.cancel()
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    @staticmethod
+    def _parse_number(value, kind, default):
+        """与 Flask request.args.get(..., type=...) 一致：无法解析时使用默认值"""
+        try:
+            return kind(value)
+        except (TypeError, ValueError):
+            return default
@@ -36,17 +36,20 @@ class ConfigController:
         try:
             new_config = request.json
             self.config_manager.update(new_config)
-            
-            # 重新初始化服务以使用新配置
-            image_service.__init__(
-                self.config_manager.images_dir,
-                self.config_manager.annotations_dir
-            )
-            annotation_service.__init__(
-                self.config_manager.annotations_dir,
-                self.config_manager.config
-            )
+            self.apply_config(image_service, annotation_service)
             
             return jsonify({"success": True, "config": self.config_manager.config})
         except Exception as e:
             return jsonify({"error": str(e)}), 500
+    
+    def apply_config(self, image_service, annotation_service):
+        """重新初始化服务以使用新配置（本进程更新配置，或发现其他 worker 保存了配置时调用）"""
+        # 先切换标注存储，图片索引随后按新目录同步标注状态
+        annotation_service.reconfigure(
+            self.config_manager.annotations_dir,
+            self.config_manager.config
+        )
+        image_service.reconfigure(
+            self.config_manager.images_dir,
+            self.config_manager.annotations_dir
+        )
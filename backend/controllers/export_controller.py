@@ -0,0 +1,40 @@
+"""
+导出控制器
+"""
+from datetime import datetime
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+
+export_bp = Blueprint('export', __name__, url_prefix='/api')
+
+
+class ExportController:
+    """导出控制器类"""
+    
+    MIMETYPES = {
+        'jsonl': 'application/x-ndjson',
+        'json': 'application/json'
+    }
+    
+    def __init__(self, export_service):
+        self.export_service = export_service
+    
+    def export_vlm(self):
+        """
+        流式导出所有标注为 VLM 训练数据
+        
+        参数 format: jsonl（默认，每行一条）或 json（JSON 数组，缩进同 json_indent）
+        """
+        try:
+            fmt = request.args.get('format', 'jsonl')
+            if fmt not in self.export_service.FORMATS:
+                return jsonify({"error": f"不支持的导出格式: {fmt}"}), 400
+            
+            chunks = self.export_service.iter_export(fmt)
+            filename = f"all_annotations_vlm_{datetime.now().strftime('%Y-%m-%d')}.{fmt}"
+            response = Response(stream_with_context(chunks), mimetype=self.MIMETYPES[fmt])
+            response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+        except Exception as e:
+            print(f"[错误] 导出失败: {str(e)}")
+            return jsonify({"error": str(e)}), 500
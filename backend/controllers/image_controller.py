@@ -1,7 +1,11 @@
 """
 图片管理控制器
 """
-from flask import Blueprint, request, jsonify, send_from_directory
+import json
+from datetime import datetime
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+
+from utils import HttpCacheHelper, FileSender
 
 image_bp = Blueprint('images', __name__, url_prefix='/api')
 
@@ -9,44 +13,274 @@ image_bp = Blueprint('images', __name__, url_prefix='/api')
 class ImageController:
     """图片管理控制器类"""
     
-    def __init__(self, image_service):
+    SSE_KEEPALIVE = 15      # SSE 心跳间隔（秒）
+    LONG_POLL_MAX = 60      # 长轮询最长等待（秒）
+    BATCH_MAX = 200         # 批量缩略图单次最多图片数
+    
+    def __init__(self, image_service, file_sender=None):
         self.image_service = image_service
+        # 图片/缩略图的发送方式（可交给 nginx 通过 X-Accel-Redirect 发送）
+        self.file_sender = file_sender or FileSender()
+    
+    # 出现以下任一参数时走分页/过滤查询
+    QUERY_PARAMS = ('limit', 'offset', 'cursor', 'annotated', 'prefix', 'q',
+                    'modified_since', 'status', 'sort', 'order')
     
     def get_images(self):
-        """获取所有图片列表"""
+        """
+        获取图片列表
+        
+        不带查询参数时返回全部图片；带分页/过滤参数时返回一页数据及总数：
+            limit, offset, cursor      分页（cursor 为上一页返回的 next_cursor）
+            annotated=true|false       标注状态
+            prefix, q                  文件名前缀 / 包含
+            modified_since             ISO 时间或 Unix 时间戳
+            status                     overall_status
+            sort=name|modified|size|status, order=asc|desc
+        """
         try:
-            images = self.image_service.get_all_images()
-            return jsonify({"images": images})
+            args = request.args
+            refresh = self._parse_bool(args.get('refresh')) or False
+            
+            if not any(key in args for key in self.QUERY_PARAMS):
+                images = self.image_service.get_all_images(refresh=refresh)
+                return jsonify({"images": images})
+            
+            limit = args.get('limit', type=int)
+            offset = args.get('offset', 0, type=int)
+            if (limit is not None and limit < 0) or offset < 0:
+                raise ValueError("limit/offset 不能为负数")
+            
+            result = self.image_service.query_images(
+                refresh=refresh,
+                annotated=self._parse_bool(args.get('annotated')),
+                prefix=args.get('prefix') or None,
+                search=args.get('q') or None,
+                modified_since=self._parse_datetime(args.get('modified_since')),
+                status=args.get('status') or None,
+                sort=args.get('sort', 'name'),
+                order=args.get('order', 'asc').lower(),
+                offset=offset,
+                limit=limit,
+                cursor=args.get('cursor') or None
+            )
+            result["offset"] = offset
+            result["limit"] = limit
+            return jsonify(result)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
-    def serve_image(self, filename):
-        """提供图片文件"""
+    @staticmethod
+    def _parse_bool(value):
+        """解析布尔查询参数，未提供时返回 None"""
+        if value is None or value == '':
+            return None
+        return value.lower() in ('1', 'true', 'yes')
+    
+    @staticmethod
+    def _parse_datetime(value):
+        """解析 ISO 时间或 Unix 时间戳"""
+        if not value:
+            return None
         try:
-            image_path = self.image_service.get_image_path(filename)
-            return send_from_directory(image_path.parent, image_path.name)
-        except FileNotFoundError as e:
-            return jsonify({"error": str(e)}), 404
+            return datetime.fromtimestamp(float(value))
+        except (ValueError, OverflowError, OSError):
+            # 不是数字，或时间戳超出平台支持的范围（如 1e20、inf）
+            pass
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"无效的时间格式: {value}")
+    
+    def refresh_images(self):
+        """重新扫描图片目录并更新索引"""
+        try:
+            data = request.get_json(silent=True) or {}
+            stats = self.image_service.refresh_images(force=bool(data.get('force', False)))
+            return jsonify({"success": True, **stats})
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    def get_image_changes(self):
+        """
+        长轮询获取图片列表变更
+        
+        参数: since（上次收到的 last_seq）、timeout（最长等待秒数）
+        返回的 reset 为 true 时客户端应重新拉取完整列表
+        """
+        try:
+            since = request.args.get('since', type=int)
+            if since is None:
+                # 首次调用只返回当前序号，作为后续订阅的起点
+                return jsonify({"events": [], "last_seq": self.image_service.changes.last_seq, "reset": False})
+            timeout = min(max(request.args.get('timeout', 0, type=float), 0), self.LONG_POLL_MAX)
+            return jsonify(self.image_service.get_changes(since, timeout))
         except Exception as e:
-            print(f"[错误] 图片服务异常: {str(e)}")
             return jsonify({"error": str(e)}), 500
     
+    def stream_image_events(self):
+        """以 Server-Sent Events 推送图片列表变更"""
+        changes = self.image_service.changes
+        since = self.sse_start_seq(
+            changes, request.headers.get('Last-Event-ID') or request.args.get('since')
+        )
+        
+        def generate():
+            seq = since
+            yield self.sse_ready(seq)
+            while True:
+                events, truncated = changes.wait(seq, self.SSE_KEEPALIVE)
+                message, seq = self.format_sse(events, truncated, seq)
+                yield message
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers=self.SSE_HEADERS
+        )
+    
+    # 以下 SSE 格式化方法与 ASGI 入口（AsyncImageController）共用
+    SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    
+    @staticmethod
+    def sse_start_seq(changes, last_event_id):
+        """订阅起点：客户端重连时带的 Last-Event-ID / since，否则为当前序号"""
+        try:
+            return int(last_event_id) if last_event_id is not None else changes.last_seq
+        except ValueError:
+            return changes.last_seq
+    
+    @staticmethod
+    def sse_ready(seq):
+        return f"retry: 3000\nid: {seq}\nevent: ready\ndata: {{}}\n\n"
+    
+    @staticmethod
+    def format_sse(events, truncated, seq):
+        """
+        格式化一批变更
+        
+        Returns:
+            tuple: (SSE 文本, 新的订阅序号)；没有变更时为心跳注释
+        """
+        if truncated:
+            events = [{"seq": events[-1]["seq"], "action": "reset"}]
+        if not events:
+            return ": keepalive\n\n", seq
+        lines = []
+        for event in events:
+            data = json.dumps(event, ensure_ascii=False)
+            lines.append(f"id: {event['seq']}\nevent: {event['action']}\ndata: {data}\n\n")
+        return ''.join(lines), events[-1]["seq"]
+    
+    def serve_image(self, filename):
+        """
+        提供图片文件
+        
+        参数 size 可选 thumb / preview / progressive / original（默认原图）；
+        progressive 为原图分辨率的渐进式 JPEG，首次请求时先返回原图并在后台生成；
+        原图和衍生图都支持 Range 请求；
+        参数 v 为图片列表中的 version，匹配时响应可被永久缓存
+        """
+        return self._send_image(filename, request.args.get('size', 'original'))
+    
     def serve_thumbnail(self, filename):
         """提供缩略图"""
+        return self._send_image(filename, 'thumb')
+    
+    def _send_image(self, filename, size):
+        """发送图片或衍生图，支持 ETag 条件请求"""
         try:
-            thumbnail_path = self.image_service.get_thumbnail_path(filename)
-            return send_from_directory(thumbnail_path.parent, thumbnail_path.name)
+            size = self.image_service.resolve_size(filename, size)
+            etag, version = self.image_service.get_image_etag(filename, size)
+            # URL 中的版本号与当前内容一致时可永久缓存，否则每次都需要确认
+            versioned = version is not None and request.args.get('v') == version
+            policy = HttpCacheHelper.IMMUTABLE if versioned else HttpCacheHelper.REVALIDATE
+            
+            # 客户端缓存仍有效时直接返回 304，无需生成衍生图
+            if HttpCacheHelper.is_not_modified(etag):
+                return HttpCacheHelper.not_modified(etag, policy=policy)
+            
+            image_path = self.image_service.get_derivative_path(filename, size)
+            response = self.file_sender.send(image_path, etag=etag)
+            return HttpCacheHelper.apply(response, policy=policy)
         except FileNotFoundError as e:
             return jsonify({"error": str(e)}), 404
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
-            print(f"[错误] 缩略图服务异常: {str(e)}")
-            # 如果缩略图失败，尝试返回原图
+            print(f"[错误] 图片服务异常 ({size}): {str(e)}")
+            # 衍生图生成失败时回退到原图
             try:
                 image_path = self.image_service.get_image_path(filename)
-                return send_from_directory(image_path.parent, image_path.name)
-            except:
+                return self.file_sender.send(image_path)
+            except Exception:
                 return jsonify({"error": str(e)}), 500
     
+    def get_thumbnail_batch(self):
+        """
+        批量获取缩略图，一次响应返回一页图片的缩略图
+        
+        请求体: {"names": [...]}
+        响应体（application/octet-stream）:
+            4 字节大端序索引长度 + UTF-8 JSON 索引 + 依次拼接的 JPEG 数据
+        索引格式:
+            {"thumbnails": [{"name", "version", "offset", "length"}], "errors": {name: 错误信息}}
+            offset 相对于 JPEG 数据区起点
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            names = data.get('names')
+            if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+                return jsonify({"error": "names 必须是文件名列表"}), 400
+            if len(names) > self.BATCH_MAX:
+                return jsonify({"error": f"单次最多 {self.BATCH_MAX} 张图片"}), 400
+            
+            entries = []
+            errors = {}
+            chunks = []
+            offset = 0
+            for name, version, result in self.image_service.get_thumbnail_batch(names):
+                if isinstance(result, Exception):
+                    errors[name] = str(result)
+                    continue
+                try:
+                    # 先读入内存，避免发送过程中文件被缓存淘汰
+                    content = result.read_bytes()
+                except OSError as e:
+                    errors[name] = str(e)
+                    continue
+                entries.append({"name": name, "version": version, "offset": offset, "length": len(content)})
+                chunks.append(content)
+                offset += len(content)
+            
+            index = json.dumps({"thumbnails": entries, "errors": errors}, ensure_ascii=False).encode('utf-8')
+            body = b''.join([len(index).to_bytes(4, 'big'), index, *chunks])
+            response = Response(body, mimetype='application/octet-stream')
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+        except Exception as e:
+            print(f"[错误] 批量获取缩略图失败: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+    
+    def get_thumbnail_stats(self):
+        """缩略图池的队列深度和吞吐量"""
+        try:
+            return jsonify(self.image_service.get_thumbnail_stats())
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    def warm_thumbnails(self):
+        """预生成缩略图（可指定 names 列表，默认全部）"""
+        try:
+            data = request.get_json(silent=True) or {}
+            queued = self.image_service.warm_thumbnails(data.get('names'))
+            return jsonify({"success": True, "queued": queued,
+                            "stats": self.image_service.get_thumbnail_stats()})
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
     def delete_image(self, filename):
         """删除图片及相关文件"""
         try:
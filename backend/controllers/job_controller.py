@@ -0,0 +1,33 @@
+"""
+后台任务控制器
+"""
+from flask import Blueprint, jsonify
+
+job_bp = Blueprint('jobs', __name__, url_prefix='/api')
+
+
+class JobController:
+    """后台任务控制器类"""
+    
+    def __init__(self, job_manager):
+        self.job_manager = job_manager
+    
+    def list_jobs(self):
+        """列出最近的后台任务"""
+        try:
+            return jsonify({"jobs": self.job_manager.list_jobs()})
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    def get_job(self, job_id):
+        """查询任务进度"""
+        job = self.job_manager.get(job_id)
+        if job is None:
+            return jsonify({"error": f"任务不存在: {job_id}"}), 404
+        return jsonify(job.to_dict())
+    
+    def cancel_job(self, job_id):
+        """取消任务（已处理的部分不会回滚）"""
+        if not self.job_manager.cancel(job_id):
+            return jsonify({"error": f"任务不存在: {job_id}"}), 404
+        return jsonify({"success": True, "message": "已请求取消任务"})
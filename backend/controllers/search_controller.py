@@ -0,0 +1,60 @@
+"""
+搜索控制器
+"""
+import re
+from flask import Blueprint, request, jsonify
+
+search_bp = Blueprint('search', __name__, url_prefix='/api')
+
+
+class SearchController:
+    """搜索控制器类"""
+    
+    # 字段[分组]运算符取值，如 overall_status=FAIL、defect_categories.result[物理缺陷]~气泡
+    CONDITION_RE = re.compile(r'^(?P<field>[^\[\]=~<>]+)(?:\[(?P<group>[^\]]*)\])?(?P<op>>=|<=|=|~|>|<)(?P<value>.*)$')
+    
+    def __init__(self, search_service):
+        self.search_service = search_service
+    
+    def search(self):
+        """
+        搜索标注内容，返回分页的图片文件名
+        
+        查询参数:
+            q                          在所有文本字段中搜索
+            where（可重复）            字段[分组]运算符取值，多个条件同时满足：
+                                       overall_status=FAIL
+                                       confidence_score>=0.8
+                                       defect_categories.compliance[物理缺陷]=false
+                                       defect_categories.result[物理缺陷]~气泡
+            limit, cursor              分页（cursor 为上一页返回的 next_cursor）
+        """
+        try:
+            args = request.args
+            conditions = [self._parse_condition(value) for value in args.getlist('where')]
+            limit = args.get('limit', 50, type=int)
+            result = self.search_service.search(
+                q=args.get('q') or None,
+                conditions=conditions,
+                limit=limit,
+                cursor=args.get('cursor') or None
+            )
+            return jsonify(result)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            print(f"[错误] 搜索标注失败: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+    
+    def get_index_stats(self):
+        """获取搜索索引统计"""
+        try:
+            return jsonify(self.search_service.get_stats())
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    def _parse_condition(self, value):
+        match = self.CONDITION_RE.match(value)
+        if not match:
+            raise ValueError(f"无效的查询条件: {value}")
+        return match['field'].strip(), match['group'], match['op'], match['value']
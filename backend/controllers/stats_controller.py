@@ -0,0 +1,21 @@
+"""
+统计控制器
+"""
+from flask import Blueprint, jsonify
+
+stats_bp = Blueprint('stats', __name__, url_prefix='/api')
+
+
+class StatsController:
+    """统计控制器类"""
+    
+    def __init__(self, stats_service):
+        self.stats_service = stats_service
+    
+    def get_stats(self):
+        """获取数据集统计（各字段的取值计数、直方图、分组失败率）"""
+        try:
+            return jsonify(self.stats_service.get_stats())
+        except Exception as e:
+            print(f"[错误] 获取数据集统计失败: {str(e)}")
+            return jsonify({"error": str(e)}), 500
@@ -0,0 +1,43 @@
+"""
+命令行导出 VLM 训练数据（与 /api/export/vlm 输出相同）
+
+用法（在 backend 目录下）:
+    python export_vlm.py -o train.jsonl
+    python export_vlm.py -o train.json --format json
+    python export_vlm.py --annotations-dir D:/data/annotations -o -   # 输出到标准输出
+"""
+import sys
+import argparse
+import contextlib
+
+from config import Config
+from services import AnnotationService, ExportService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出所有标注为 VLM 训练数据")
+    parser.add_argument('-o', '--output', required=True, help="输出文件路径，- 表示标准输出")
+    parser.add_argument('--format', choices=ExportService.FORMATS, default='jsonl')
+    parser.add_argument('--indent', type=int, help="json 格式的缩进（默认使用配置的 json_indent）")
+    parser.add_argument('--annotations-dir', help="标注目录（默认使用 config.json 中的配置）")
+    args = parser.parse_args()
+
+    config_manager = Config()
+    annotations_dir = args.annotations_dir or config_manager.annotations_dir
+    annotation_service = AnnotationService(annotations_dir, config_manager.config)
+    export_service = ExportService(annotation_service, config_manager)
+
+    if args.output == '-':
+        output = sys.stdout
+        # 日志输出到标准错误，避免混入导出内容
+        with contextlib.redirect_stdout(sys.stderr):
+            for chunk in export_service.iter_export(args.format, args.indent):
+                output.write(chunk)
+        return
+
+    count = export_service.export_to_file(args.output, args.format, args.indent)
+    print(f"[信息] 已导出 {count} 条标注到 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
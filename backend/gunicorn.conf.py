@@ -0,0 +1,34 @@
+"""
+gunicorn 配置 - 生产环境多 worker 部署
+
+用法（在 backend 目录下）:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+可通过环境变量调整: VLM_BIND / VLM_WEB_WORKERS / VLM_THREADS / VLM_TIMEOUT
+"""
+import os
+import multiprocessing
+
+bind = os.environ.get('VLM_BIND', '0.0.0.0:5000')
+
+# worker 进程数：缩略图渲染已在每个 worker 的进程池中执行，请求本身以 I/O 为主，默认不超过 4 个
+workers = int(os.environ.get('VLM_WEB_WORKERS') or min(4, multiprocessing.cpu_count()))
+
+# 每个 worker 的线程数：图片变更订阅（/api/images/events、/api/images/changes）会长时间占用一个线程，
+# workers * threads 需明显大于同时在线的标注人数
+worker_class = 'gthread'
+threads = int(os.environ.get('VLM_THREADS', 16))
+
+# gthread worker 的心跳与请求处理分离，长时间的流式导出不会触发超时；timeout 只用于发现卡死的 worker
+timeout = int(os.environ.get('VLM_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# 每个 worker 自行调用 create_app()：SQLite 连接、后台线程和缩略图进程池都不能跨 fork 共享
+preload_app = False
+
+# 各 worker 的缩略图进程池平分 CPU（见 ThumbnailPool）
+os.environ['VLM_WEB_WORKERS'] = str(workers)
+
+accesslog = '-'
+errorlog = '-'
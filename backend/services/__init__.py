@@ -3,6 +3,15 @@
 """
 from .image_service import ImageService
 from .annotation_service import AnnotationService
+from .annotation_schema import AnnotationSchema, AnnotationValidationError
+from .schema_migration import FieldMigration
 from .folder_service import FolderService
+from .export_service import ExportService
+from .job_manager import JobManager
+from .stats_service import StatsService
+from .search_service import SearchService
+from .annotation_store import FileAnnotationStore, SqliteAnnotationStore, create_annotation_store
 
-__all__ = ['ImageService', 'AnnotationService', 'FolderService']
+__all__ = ['ImageService', 'AnnotationService', 'AnnotationSchema', 'AnnotationValidationError', 'FieldMigration',
+           'FolderService', 'ExportService', 'JobManager', 'StatsService', 'SearchService',
+           'FileAnnotationStore', 'SqliteAnnotationStore', 'create_annotation_store']
@@ -0,0 +1,99 @@
+"""
+标注缓存 - 按文件路径 + 修改时间缓存解析后的标注 JSON
+"""
+import os
+import threading
+from collections import OrderedDict
+
+
+class AnnotationCache:
+    """
+    有界 LRU 标注缓存
+
+    - 键为文件路径，每条记录附带文件的 (mtime_ns, size)；读取时先 stat，
+      与记录不一致（外部修改、删除）即视为失效并重新解析
+    - 保存标注时直接写入缓存（write-through），下次读取无需重新解析
+    - 返回的对象与缓存共享，调用方不应修改
+    """
+
+    def __init__(self, max_entries=2048):
+        """
+        Args:
+            max_entries: 最多缓存的标注数（0 表示禁用缓存）
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()    # 路径 -> ((mtime_ns, size), 数据)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    @staticmethod
+    def _file_key(path):
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def get(self, path, loader):
+        """
+        读取标注，缓存未命中时调用 loader(path) 解析文件
+
+        Raises:
+            FileNotFoundError: 文件不存在
+        """
+        key = str(path)
+        try:
+            file_key = self._file_key(path)
+        except FileNotFoundError:
+            self.invalidate(path)
+            raise
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == file_key:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+                self._stats["invalidations"] += 1
+            self._stats["misses"] += 1
+
+        data = loader(path)
+        self._store(key, file_key, data)
+        return data
+
+    def put(self, path, data):
+        """写入标注文件后更新缓存"""
+        try:
+            file_key = self._file_key(path)
+        except FileNotFoundError:
+            self.invalidate(path)
+            return
+        self._store(str(path), file_key, data)
+
+    def _store(self, key, file_key, data):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (file_key, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, path):
+        with self._lock:
+            if self._entries.pop(str(path), None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else None
+            }
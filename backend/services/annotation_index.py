@@ -0,0 +1,140 @@
+"""
+标注增量索引基类 - 监听标注存储，按 json_fields 配置维护内存中的派生数据
+"""
+import threading
+
+
+class AnnotationIndex:
+    """
+    增量维护的标注派生数据（统计、搜索索引等）
+
+    每条标注按字段配置提取出一组贡献（facts），并记住每条标注的贡献。标注保存/删除时先撤销旧的贡献
+    再应用新的，查询时无需重新读取标注。启动、标注目录切换或字段配置变化时在后台线程中全量重建。
+
+    子类实现 _reset / _compile / _extract / _apply。
+    """
+
+    name = '索引'     # 日志中的名称
+
+    def __init__(self, annotation_service):
+        """
+        Args:
+            annotation_service: 标注服务（读取字段配置，遍历和监听标注存储）
+        """
+        self.annotation_service = annotation_service
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._fields_version = None
+        self._specs = []
+        self._facts = {}            # stem -> 该标注的贡献
+        self._version = 0           # 每次变化后递增
+        self._building = False
+        self._touched = set()       # 重建期间已由监听器更新的标注
+        self._keys = {}             # 键驻留表，各标注共享相同的键对象以节省内存
+
+        annotation_service.store.add_listener(self.on_annotation_changed)
+        self.rebuild()
+
+    # ============= 子类实现 =============
+
+    def _reset(self):
+        """清空派生数据（调用方需持有锁）"""
+        raise NotImplementedError
+
+    def _compile(self, fields):
+        """把 json_fields 配置编译为提取规则"""
+        raise NotImplementedError
+
+    def _extract(self, specs, stem, data):
+        """提取一条标注的贡献（在锁外调用）"""
+        raise NotImplementedError
+
+    def _apply(self, stem, facts, sign):
+        """应用（sign=1）或撤销（sign=-1）一条标注的贡献（调用方需持有锁）"""
+        raise NotImplementedError
+
+    # ============= 增量更新 =============
+
+    def _intern(self, key):
+        return self._keys.setdefault(key, key)
+
+    def _replace(self, stem, facts):
+        """用新的贡献替换 stem 原有的贡献（调用方需持有锁）"""
+        old = self._facts.pop(stem, None)
+        if old is not None:
+            self._apply(stem, old, -1)
+        if facts is not None:
+            self._apply(stem, facts, 1)
+            self._facts[stem] = facts
+        self._version += 1
+
+    def on_annotation_changed(self, stem, annotation):
+        """标注存储变更回调"""
+        if stem is None:
+            self.rebuild()
+            return
+        specs = self._specs
+        facts = self._extract(specs, stem, annotation) if annotation is not None else None
+        with self._lock:
+            if specs is not self._specs:
+                # 字段配置刚被替换，重建会读到这次的修改
+                return
+            if self._building:
+                self._touched.add(stem)
+            self._replace(stem, facts)
+
+    def check_fields(self):
+        """字段配置已修改时重建"""
+        if self.annotation_service.fields_version != self._fields_version:
+            self.rebuild()
+
+    def rebuild(self):
+        """在后台线程中全量重建"""
+        fields = self.annotation_service.config.get('json_fields', [])
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._fields_version = self.annotation_service.fields_version
+            self._specs = self._compile(fields)
+            self._facts = {}
+            self._keys = {}
+            self._reset()
+            self._version += 1
+            self._building = True
+            self._touched = set()
+
+        thread = threading.Thread(target=self._rebuild, args=(generation,), name=f'{type(self).__name__}-rebuild', daemon=True)
+        thread.start()
+
+    def _rebuild(self, generation):
+        specs = self._specs
+        count = 0
+        try:
+            for stem, data in self.annotation_service.iter_annotations(ordered=False):
+                facts = self._extract(specs, stem, data)
+                with self._lock:
+                    if generation != self._generation:
+                        return
+                    # 遍历期间已保存/删除的标注以监听器的结果为准
+                    if stem not in self._touched:
+                        self._replace(stem, facts)
+                count += 1
+        except Exception as e:
+            print(f"[错误] 重建标注{self.name}失败: {e}")
+        with self._lock:
+            if generation == self._generation:
+                self._building = False
+                self._touched = set()
+        print(f"[信息] 标注{self.name}重建完成，共 {count} 条标注")
+
+    @property
+    def ready(self):
+        return not self._building
+
+
+def array_group_key(children):
+    """数组字段的分组子字段：名为 category 的子字段，没有时取第一个字符串子字段"""
+    group = next((c['name'] for c in children if c.get('name') == 'category'), None)
+    if group is None:
+        group = next((c['name'] for c in children if c.get('type') == 'string'), None)
+    return group
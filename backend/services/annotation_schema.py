@@ -0,0 +1,190 @@
+"""
+标注字段结构 - 把 json_fields 配置编译为默认值模板和校验规则
+"""
+from datetime import datetime
+
+
+class AnnotationValidationError(ValueError):
+    """标注不符合字段配置"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("标注校验失败: " + "；".join(errors[:5]) + ("…" if len(errors) > 5 else ""))
+
+
+class _Field:
+    """编译后的单个字段"""
+
+    __slots__ = ('name', 'type', 'required', 'label', 'children')
+
+    def __init__(self, name, field_type, required, label, children):
+        self.name = name
+        self.type = field_type
+        self.required = required
+        self.label = label
+        self.children = children
+
+
+class AnnotationSchema:
+    """
+    编译后的 json_fields
+
+    - default(): 复制预先生成的默认值模板（只有数组/对象需要新建，其余直接复用）
+    - validate(): 一次遍历检查类型、必填字段和嵌套子字段，规则与前端保存前的必填校验一致；
+      required=False 时只检查类型（自动保存的草稿允许必填项为空）
+    """
+
+    def __init__(self, json_fields):
+        self.fields = self._compile(json_fields)
+        self._template, self._factories = self._compile_defaults(json_fields)
+
+    # ============= 编译 =============
+
+    def _compile(self, configs):
+        fields = []
+        for config in configs:
+            name = config.get('name')
+            if not name:
+                continue
+            fields.append(_Field(
+                name,
+                config.get('type'),
+                bool(config.get('required')),
+                config.get('description') or name,
+                self._compile(config.get('children') or [])
+            ))
+        return fields
+
+    @classmethod
+    def _compile_defaults(cls, configs):
+        """
+        生成默认值模板
+
+        Returns:
+            tuple: (模板 dict, [(字段名, 新建可变默认值的函数)])
+        """
+        template = {}
+        factories = []
+        for config in configs:
+            name = config.get('name')
+            if not name:
+                continue
+            field_type = config.get('type')
+            default_value = config.get('defaultValue', '')
+            if field_type == 'string':
+                template[name] = default_value if default_value else ''
+            elif field_type == 'number':
+                template[name] = cls._number_default(name, default_value)
+            elif field_type == 'boolean':
+                template[name] = default_value == 'true' or default_value == True
+            elif field_type == 'array':
+                template[name] = None
+                factories.append((name, list))
+            elif field_type == 'object':
+                template[name] = None
+                factories.append((name, cls._object_factory(config.get('children', []))))
+            else:
+                template[name] = default_value
+        return template, factories
+
+    @staticmethod
+    def _number_default(name, default_value):
+        """数值字段的默认值；配置的默认值无法解析时使用 0，不影响启动和配置更新"""
+        if not default_value:
+            return 0
+        try:
+            return float(default_value)
+        except (TypeError, ValueError):
+            print(f"[警告] 字段 {name} 的默认值不是数值: {default_value!r}，使用 0")
+            return 0
+
+    @classmethod
+    def _object_factory(cls, children):
+        template, factories = cls._compile_defaults(children)
+
+        def create():
+            obj = template.copy()
+            for name, factory in factories:
+                obj[name] = factory()
+            return obj
+
+        return create
+
+    # ============= 默认值 =============
+
+    def default(self, image_name):
+        """生成图片的默认空标注"""
+        now = datetime.now().isoformat()
+        data = {
+            "image_name": image_name,
+            "image_path": f"images/{image_name}",
+            "created_at": now,
+            "updated_at": now
+        }
+        data.update(self._template)
+        for name, factory in self._factories:
+            data[name] = factory()
+        return data
+
+    # ============= 校验 =============
+
+    def validate(self, data, required=True):
+        """
+        校验标注
+
+        Args:
+            data: 标注数据
+            required: 是否检查必填字段
+
+        Returns:
+            list: 错误信息，为空表示通过
+        """
+        errors = []
+        if not isinstance(data, dict):
+            return ["标注必须是对象"]
+        self._validate_fields(self.fields, data, '', errors, required)
+        return errors
+
+    def _validate_fields(self, fields, data, prefix, errors, required):
+        for field in fields:
+            path = f"{prefix}{field.name}"
+            value = data.get(field.name)
+            field_type = field.type
+            check_required = required and field.required
+
+            if value is None:
+                if check_required:
+                    errors.append(f"{path}（{field.label}）为必填项")
+                continue
+
+            if field_type == 'string':
+                if not isinstance(value, str):
+                    errors.append(f"{path} 应为字符串")
+                elif check_required and not value.strip():
+                    errors.append(f"{path}（{field.label}）为必填项")
+            elif field_type == 'number':
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    # 前端数字输入框清空后可能提交空字符串
+                    if value != '':
+                        errors.append(f"{path} 应为数值")
+                    elif check_required:
+                        errors.append(f"{path}（{field.label}）为必填项")
+            elif field_type == 'boolean':
+                if not isinstance(value, bool):
+                    errors.append(f"{path} 应为布尔值")
+            elif field_type == 'array':
+                if not isinstance(value, list):
+                    errors.append(f"{path} 应为数组")
+                elif check_required and not value:
+                    errors.append(f"{path}（{field.label}）至少需要一项")
+                elif field.children:
+                    for index, item in enumerate(value):
+                        if isinstance(item, dict):
+                            self._validate_fields(field.children, item, f"{path}[{index}].", errors, required)
+                        else:
+                            errors.append(f"{path}[{index}] 应为对象")
+            elif field_type == 'object':
+                if not isinstance(value, dict):
+                    errors.append(f"{path} 应为对象")
+                elif field.children:
+                    self._validate_fields(field.children, value, f"{path}.", errors, required)
@@ -1,34 +1,141 @@
 """
 标注管理服务
 """
+import copy
 import json
+import hashlib
+import time
+import threading
 from pathlib import Path
 from datetime import datetime
+from collections import OrderedDict
+
+from .bulk_loader import iter_parallel
+from .annotation_store import create_annotation_store
+from .annotation_schema import AnnotationSchema, AnnotationValidationError
+from .annotation_writer import atomic_write_text
 
 
 class AnnotationService:
     """标注管理服务类"""
     
+    # 摘要中不展示的内部字段
+    SUMMARY_EXCLUDE_FIELDS = {'image_name', 'image_path', 'created_at', 'updated_at'}
+    
+    # 结构迁移的检查点文件（位于标注目录，不使用 .json 扩展名，不会被当作标注）
+    MIGRATION_CHECKPOINT = '.schema_migration.checkpoint'
+    LEGACY_MIGRATION_CHECKPOINT = '.schema_migration.json'
+    
     def __init__(self, annotations_dir, config):
+        self._listeners = []
+        self._summary_lock = threading.Lock()
+        # 存储后端在启动时按 annotation_store 配置创建，切换后端需要重启
+        self.store = create_annotation_store(annotations_dir, config)
+        self.reconfigure(annotations_dir, config)
+    
+    def reconfigure(self, annotations_dir, config):
+        """应用新的目录和配置（配置更新时调用，保留已注册的监听器）"""
+        if Path(annotations_dir) != self.store.annotations_dir:
+            self.store.reconfigure(annotations_dir)
         self.annotations_dir = Path(annotations_dir)
         self.config = config
+        self.write_workers = int(config.get('annotation_write_workers', 4))
+        self.load_workers = int(config.get('annotation_load_workers', 8))
+        # 字段配置的版本，参与摘要的 ETag（字段描述等变化后摘要也随之变化）
+        fields = json.dumps(config.get('json_fields', []), sort_keys=True, ensure_ascii=False)
+        fields_version = hashlib.sha1(fields.encode('utf-8')).hexdigest()[:12]
+        if getattr(self, 'fields_version', fields_version) != fields_version:
+            # 保留修改前的字段配置，供结构迁移比较（config 字典会被原地更新，需要保存副本）
+            self.previous_fields = self._fields_snapshot
+        elif not hasattr(self, 'previous_fields'):
+            self.previous_fields = None
+        self.fields_version = fields_version
+        self._fields_snapshot = json.loads(fields)
+        
+        # 字段配置编译为默认值模板和校验规则
+        self.schema = AnnotationSchema(config.get('json_fields', []))
+        self.validation = config.get('annotation_validation', 'strict')
+        
+        # 摘要缓存：stem -> (摘要版本, 摘要)，字段配置变化后整体失效
+        self._field_configs = {field['name']: field for field in config.get('json_fields', [])}
+        self._default_summary_fields = None
+        self.summary_cache_size = int(config.get('annotation_cache_size', 2048))
+        with self._summary_lock:
+            self._summaries = OrderedDict()
+    
+    def add_listener(self, listener):
+        """
+        注册标注变更监听器
+        
+        Args:
+            listener: 回调函数 listener(image_name, annotation)，删除时 annotation 为 None
+        """
+        self._listeners.append(listener)
+    
+    def _notify(self, image_name, annotation):
+        """通知所有监听器"""
+        for listener in self._listeners:
+            try:
+                listener(image_name, annotation)
+            except Exception as e:
+                print(f"[错误] 标注变更回调失败 {image_name}: {e}")
     
     def get_annotation(self, image_name):
         """获取指定图片的标注数据"""
-        base_name = Path(image_name).stem
-        annotation_file = self.annotations_dir / f"{base_name}.json"
-        
-        if annotation_file.exists():
-            with open(annotation_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        else:
+        data = self.store.load(Path(image_name).stem)
+        if data is None:
             # 返回默认的空标注
             return self._generate_default_annotation(image_name)
+        return data
+    
+    def get_cache_stats(self):
+        """标注存储（缓存命中率、写入模式等）统计"""
+        return self.store.get_stats()
+    
+    def get_annotation_version(self, image_name):
+        """
+        获取标注的版本（只读取元数据）
+        
+        Args:
+            image_name: 图片文件名
+            
+        Returns:
+            tuple: (etag, 修改时间戳)，尚未标注时为 (None, None)
+        """
+        stat = self.store.stat(Path(image_name).stem)
+        if stat is None:
+            return None, None
+        mtime_ns, size = stat
+        return f"{mtime_ns:x}-{size:x}", mtime_ns / 1e9
+    
+    def validate_annotation(self, data, complete=True):
+        """
+        按字段配置校验标注
+        
+        Args:
+            data: 标注数据
+            complete: True 时同时检查必填字段（手动保存、批量模板）；False 只检查类型（自动保存的草稿）
+        
+        Raises:
+            AnnotationValidationError: annotation_validation 为 strict 且校验未通过
+        """
+        if self.validation == 'off':
+            return
+        errors = self.schema.validate(data, required=complete)
+        if not errors:
+            return
+        if self.validation == 'strict':
+            raise AnnotationValidationError(errors)
+        print(f"[警告] 标注未通过校验: {'；'.join(errors[:5])}")
     
-    def save_annotation(self, image_name, data):
-        """保存标注数据"""
-        base_name = Path(image_name).stem
-        annotation_file = self.annotations_dir / f"{base_name}.json"
+    def save_annotation(self, image_name, data, complete=False):
+        """
+        保存标注数据
+        
+        Args:
+            complete: 是否按完成的标注校验必填字段（见 validate_annotation）
+        """
+        self.validate_annotation(data, complete)
         
         # 添加时间戳
         data['updated_at'] = datetime.now().isoformat()
@@ -36,88 +143,187 @@ class AnnotationService:
         # 使用配置的缩进格式
         indent = self.config.get("json_indent", 2)
         
-        with open(annotation_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=indent)
+        text = json.dumps(data, ensure_ascii=False, indent=indent)
+        self.store.save(Path(image_name).stem, data, text)
         
+        self._notify(image_name, data)
         return True
     
-    def get_all_annotations(self):
-        """获取所有标注数据"""
-        annotations = []
+    def save_annotations_bulk(self, job, image_names, template, only_unannotated=False):
+        """
+        将同一份标注模板批量写入多张图片（在线程池中并发写入）
+        
+        Args:
+            job: 后台任务（Job），用于报告进度和检查取消
+            image_names: 图片文件名列表
+            template: 标注模板；image_name / image_path 会按每张图片重新设置
+            only_unannotated: True 时跳过已有标注的图片
+            
+        Returns:
+            dict: 写入/跳过/失败数量
+        """
+        def write(image_name):
+            if only_unannotated and self.store.exists(Path(image_name).stem):
+                return False
+            data = copy.deepcopy(template)
+            data['image_name'] = image_name
+            data['image_path'] = f"images/{image_name}"
+            self.save_annotation(image_name, data, complete=True)
+            return True
         
-        for file in self.annotations_dir.iterdir():
-            if file.suffix == '.json':
-                with open(file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    annotations.append({
-                        "image_name": file.stem,
-                        "annotation": data
-                    })
+        for image_name, written, error in iter_parallel(image_names, write, self.write_workers, ordered=False):
+            if error is not None:
+                print(f"[错误] 批量写入标注失败 {image_name}: {error}")
+                job.advance(failed=1, name=image_name, error=error)
+            elif written:
+                job.advance(succeeded=1)
+            else:
+                job.advance(skipped=1)
+            if job.cancelled:
+                break
         
-        return annotations
+        return {"written": job.succeeded, "skipped": job.skipped, "failed": job.failed}
     
-    def _generate_default_annotation(self, image_name):
-        """根据配置生成默认的空标注"""
-        default_data = {
-            "image_name": image_name,
-            "image_path": f"images/{image_name}",
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
-        }
+    def migrate_annotations(self, job, migration, dry_run=False, checkpoint_every=500):
+        """
+        按迁移规则改写所有标注（后台任务）
         
-        # 根据json_fields配置动态生成字段
-        json_fields = self.config.get('json_fields', [])
+        读取和写入都在线程池中并发执行，结果按 stem 顺序确认，每 checkpoint_every 条记录一次检查点；
+        任务被取消或进程中断后，用相同的迁移规则再次执行会从检查点继续。
         
-        for field_config in json_fields:
-            field_name = field_config['name']
-            field_type = field_config['type']
-            default_value = field_config.get('defaultValue', '')
+        Args:
+            job: 后台任务（Job）
+            migration: FieldMigration
+            dry_run: True 时只统计需要改写的标注数，不写入
+            checkpoint_every: 检查点间隔（条）
             
-            # 根据类型设置默认值
-            if field_type == 'string':
-                default_data[field_name] = default_value if default_value else ''
-            elif field_type == 'number':
-                default_data[field_name] = float(default_value) if default_value else 0
-            elif field_type == 'boolean':
-                default_data[field_name] = default_value == 'true' or default_value == True
-            elif field_type == 'array':
-                default_data[field_name] = []
-            elif field_type == 'object':
-                default_data[field_name] = self._generate_default_object(field_config.get('children', []))
+        Returns:
+            dict: 改写/未变化/失败数量、耗时和吞吐量
+        """
+        checkpoint_path = self.annotations_dir / self.MIGRATION_CHECKPOINT
+        legacy_path = self.annotations_dir / self.LEGACY_MIGRATION_CHECKPOINT
+        if not dry_run and legacy_path.exists() and not checkpoint_path.exists():
+            legacy_path.replace(checkpoint_path)
+        after = None
+        if not dry_run:
+            checkpoint = self._read_migration_checkpoint(checkpoint_path)
+            if checkpoint and checkpoint.get("migration") == migration.id:
+                after = checkpoint.get("last")
+                print(f"[信息] 从检查点继续迁移标注: {after}")
+        
+        job.total = sum(1 for stem in self.store.versions() if after is None or stem > after)
+        indent = self.config.get("json_indent", 2)
+        samples = []
+        
+        def migrate(item):
+            stem, data = item
+            new_data = migration.apply(data)
+            if new_data == data:
+                return False
+            if not dry_run:
+                text = json.dumps(new_data, ensure_ascii=False, indent=indent)
+                self.store.save(stem, new_data, text)
+                image_name = new_data.get('image_name')
+                self._notify(image_name if isinstance(image_name, str) else f"{stem}.json", new_data)
+            return True
+        
+        started = time.perf_counter()
+        last = after
+        pending_checkpoint = 0
+        items = self.store.iter_all(ordered=True, after=after)
+        for (stem, _data), changed, error in iter_parallel(items, migrate, self.write_workers, ordered=True):
+            if error is not None:
+                print(f"[错误] 迁移标注失败 {stem}: {error}")
+                job.advance(failed=1, name=stem, error=error)
+            elif changed:
+                job.advance(succeeded=1)
+                if len(samples) < 20:
+                    samples.append(stem)
             else:
-                default_data[field_name] = default_value
+                job.advance(skipped=1)
+            
+            last = stem
+            pending_checkpoint += 1
+            if not dry_run and pending_checkpoint >= checkpoint_every:
+                self._write_migration_checkpoint(checkpoint_path, migration, last)
+                pending_checkpoint = 0
+            if job.cancelled:
+                break
         
-        return default_data
+        elapsed = time.perf_counter() - started
+        if not dry_run:
+            if job.cancelled:
+                self._write_migration_checkpoint(checkpoint_path, migration, last)
+            elif checkpoint_path.exists():
+                checkpoint_path.unlink()
+        
+        return {
+            "dry_run": dry_run,
+            "migration": migration.id,
+            "plan": migration.plan,
+            "resumed_after": after,
+            "changed": job.succeeded,
+            "unchanged": job.skipped,
+            "failed": job.failed,
+            "changed_samples": samples,
+            "elapsed_seconds": round(elapsed, 3),
+            "files_per_second": round(job.processed / elapsed, 1) if elapsed else None
+        }
+    
+    @staticmethod
+    def _read_migration_checkpoint(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            print(f"[警告] 忽略无法解析的迁移检查点: {e}")
+            return None
     
-    def _generate_default_object(self, children_configs):
-        """递归生成默认对象"""
-        obj = {}
+    @staticmethod
+    def _write_migration_checkpoint(path, migration, last):
+        checkpoint = {"migration": migration.id, "last": last, "updated_at": datetime.now().isoformat()}
+        atomic_write_text(path, json.dumps(checkpoint, ensure_ascii=False))
+    
+    def get_all_annotations(self):
+        """获取所有标注数据"""
+        return [
+            {"image_name": stem, "annotation": data}
+            for stem, data in self.iter_annotations(ordered=False)
+        ]
+    
+    def iter_annotations(self, ordered=True, workers=None):
+        """
+        批量读取所有标注（不经过缓存，避免批量读取挤出常用条目）
         
-        for child_config in children_configs:
-            field_name = child_config['name']
-            field_type = child_config['type']
-            default_value = child_config.get('defaultValue', '')
-            
-            if field_type == 'string':
-                obj[field_name] = default_value if default_value else ''
-            elif field_type == 'number':
-                obj[field_name] = float(default_value) if default_value else 0
-            elif field_type == 'boolean':
-                obj[field_name] = default_value == 'true' or default_value == True
-            elif field_type == 'array':
-                obj[field_name] = []
-            elif field_type == 'object':
-                obj[field_name] = self._generate_default_object(child_config.get('children', []))
-            else:
-                obj[field_name] = default_value
+        文件存储时，文件的打开和解析在线程池中并发执行，适合网络文件系统等单次打开延迟较高的场景。
         
-        return obj
+        Args:
+            ordered: True 按文件名顺序产出；False 按读取完成顺序产出
+            workers: 并发线程数，默认使用配置 annotation_load_workers
+            
+        Yields:
+            tuple: (文件名主干, 标注数据)；无法解析的标注会被跳过
+        """
+        return self.store.iter_all(ordered, workers)
+    
+    def _generate_default_annotation(self, image_name):
+        """根据配置生成默认的空标注（复制编译好的默认值模板）"""
+        return self.schema.default(image_name)
+    
+    def get_summary_version(self, image_name):
+        """摘要的版本：标注版本 + 字段配置版本，尚未标注时为 None"""
+        etag, _ = self.get_annotation_version(image_name)
+        return f"{etag}-{self.fields_version}" if etag else None
     
     def get_annotation_summary(self, image_name):
         """
         获取标注摘要信息
         动态提取所有顶级字段，统一处理数组展示
         
+        摘要按（标注版本, 字段配置版本）缓存，标注或字段配置变化前不会重复计算。
+        
         Args:
             image_name: 图片文件名
             
@@ -125,73 +331,105 @@ class AnnotationService:
             dict: 摘要信息
         """
         try:
-            annotation = self.get_annotation(image_name)
-            
-            # 基础摘要信息
-            summary = {
-                "image_path": annotation.get("image_path", f"images/{image_name}"),
-                "fields": {}  # 存储所有顶级字段
-            }
-            
-            # 获取配置的字段列表
-            json_fields = self.config.get('json_fields', [])
-            field_names = {field['name'] for field in json_fields}
-            
-            # 遍历所有顶级字段（排除内部字段）
-            exclude_fields = {'image_name', 'image_path', 'created_at', 'updated_at'}
-            
-            for key, value in annotation.items():
-                if key not in exclude_fields and key in field_names:
-                    # 获取字段配置
-                    field_config = next((f for f in json_fields if f['name'] == key), None)
-                    
-                    # 获取描述，如果为空则使用字段名
-                    description = key  # 默认使用字段名
-                    if field_config:
-                        config_desc = field_config.get('description', '')
-                        if config_desc and config_desc.strip():  # 确保不是空字符串
-                            description = config_desc
-                    
-                    field_type = field_config['type'] if field_config else type(value).__name__
-                    
-                    # 统一处理数组类型 - 提取详细信息
-                    if field_type == 'array' and isinstance(value, list):
-                        # 提取数组项的详细信息
-                        array_items = []
-                        for idx, item in enumerate(value):
-                            if isinstance(item, dict):
-                                # 字典项：提取所有键值对
-                                array_items.append({
-                                    "index": idx + 1,
-                                    "data": item
-                                })
-                            else:
-                                # 基本类型项：直接存储
-                                array_items.append({
-                                    "index": idx + 1,
-                                    "data": item
-                                })
-                        
-                        summary["fields"][key] = {
-                            "value": value,
-                            "type": field_type,
-                            "description": description,
-                            "array_items": array_items,  # 新增：数组详细信息
-                            "children_config": field_config.get('children', []) if field_config else []  # 子字段配置
-                        }
-                    else:
-                        # 非数组类型：保持原样
-                        summary["fields"][key] = {
-                            "value": value,
-                            "type": field_type,
-                            "description": description
-                        }
-            
-            return summary
-            
+            version = self.get_summary_version(image_name)
+            return self._get_summary(image_name, version, self.store.load)
         except Exception as e:
             print(f"[错误] 获取标注摘要失败 {image_name}: {e}")
             return {
                 "image_path": f"images/{image_name}",
                 "fields": {}
             }
+    
+    def get_annotation_summaries(self, image_names):
+        """
+        批量获取摘要（未缓存的标注在线程池中并发读取）
+        
+        Args:
+            image_names: 图片文件名列表
+            
+        Returns:
+            dict: {文件名: {"etag": 摘要版本（未标注时为 None）, "summary": 摘要}}
+        """
+        versions = {name: self.get_summary_version(name) for name in image_names}
+        
+        def load(image_name):
+            return self._get_summary(image_name, versions[image_name], self.store.load)
+        
+        result = {}
+        for image_name, summary, error in iter_parallel(image_names, load, self.load_workers, ordered=False):
+            if error is not None:
+                print(f"[错误] 获取标注摘要失败 {image_name}: {error}")
+                summary = {"image_path": f"images/{image_name}", "fields": {}}
+            result[image_name] = {"etag": versions[image_name], "summary": summary}
+        return result
+    
+    def _get_summary(self, image_name, version, loader):
+        """按版本读取缓存的摘要，未命中时读取标注并计算"""
+        if version is None:
+            return self._default_summary(image_name)
+        
+        stem = Path(image_name).stem
+        with self._summary_lock:
+            cached = self._summaries.get(stem)
+            if cached is not None and cached[0] == version:
+                self._summaries.move_to_end(stem)
+                return cached[1]
+        
+        annotation = loader(stem)
+        if annotation is None:
+            # 读取版本后标注被删除
+            return self._default_summary(image_name)
+        summary = self._project_summary(image_name, annotation)
+        
+        if self.summary_cache_size > 0:
+            with self._summary_lock:
+                self._summaries[stem] = (version, summary)
+                self._summaries.move_to_end(stem)
+                while len(self._summaries) > self.summary_cache_size:
+                    self._summaries.popitem(last=False)
+        return summary
+    
+    def _default_summary(self, image_name):
+        """未标注图片的摘要（字段部分按字段配置只计算一次）"""
+        fields = self._default_summary_fields
+        if fields is None:
+            fields = self._project_summary(image_name, self._generate_default_annotation(image_name))["fields"]
+            self._default_summary_fields = fields
+        return {"image_path": f"images/{image_name}", "fields": fields}
+    
+    def _project_summary(self, image_name, annotation):
+        """由标注计算摘要：只保留字段配置中的顶级字段，附带描述和类型"""
+        summary = {
+            "image_path": annotation.get("image_path", f"images/{image_name}"),
+            "fields": {}  # 存储所有顶级字段
+        }
+        
+        for key, value in annotation.items():
+            field_config = self._field_configs.get(key)
+            if field_config is None or key in self.SUMMARY_EXCLUDE_FIELDS:
+                continue
+            
+            # 获取描述，如果为空则使用字段名
+            description = field_config.get('description', '')
+            if not (description and description.strip()):
+                description = key
+            
+            field_type = field_config['type']
+            
+            # 统一处理数组类型 - 附带每一项的序号，便于前端展示
+            if field_type == 'array' and isinstance(value, list):
+                summary["fields"][key] = {
+                    "value": value,
+                    "type": field_type,
+                    "description": description,
+                    "array_items": [{"index": idx + 1, "data": item} for idx, item in enumerate(value)],
+                    "children_config": field_config.get('children', [])  # 子字段配置
+                }
+            else:
+                summary["fields"][key] = {
+                    "value": value,
+                    "type": field_type,
+                    "description": description
+                }
+        
+        return summary
@@ -0,0 +1,443 @@
+"""
+标注存储后端 - 每图一个 JSON 文件（默认）或单个 SQLite 数据库
+"""
+import os
+import json
+import bisect
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+from .annotation_cache import AnnotationCache
+from .annotation_writer import AnnotationWriter
+from .bulk_loader import iter_parallel
+
+
+class AnnotationStore:
+    """
+    标注存储后端接口
+
+    标注以文件名主干（stem）为键；每条标注带有一个版本时间戳 mtime_ns，
+    标注变化时随之变化，用于 ETag 和图片索引的增量同步。
+    """
+
+    name = None
+
+    def __init__(self):
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """
+        注册标注变更监听器
+
+        Args:
+            listener: 回调函数 listener(stem, 标注数据)，删除时标注数据为 None；
+                      stem 为 None 表示所有标注都可能已变化，需要重新加载
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, stem, data):
+        for listener in self._listeners:
+            try:
+                listener(stem, data)
+            except Exception as e:
+                print(f"[错误] 标注变更回调失败 {stem}: {e}")
+
+    def refresh(self, stems=None):
+        """
+        标注在存储之外被修改（如直接编辑文件）后重新读取，并通知监听器
+
+        Args:
+            stems: 变化的标注，None 表示全部
+        """
+        if not self._listeners:
+            return
+        if stems is None:
+            self._notify(None, None)
+            return
+        for stem in stems:
+            self._notify(stem, self.load(stem))
+
+    def sync_external(self):
+        """
+        发现其他进程（多 worker 部署时的其他 worker）写入的标注并通知监听器
+
+        文件存储的修改由目录监听发现，默认不需要处理。
+
+        Returns:
+            list: 变化的 stem
+        """
+        return []
+
+    def reconfigure(self, annotations_dir):
+        """切换标注目录"""
+        raise NotImplementedError
+
+    def load(self, stem):
+        """读取标注，不存在时返回 None"""
+        raise NotImplementedError
+
+    def stat(self, stem):
+        """返回 (mtime_ns, 大小)，不存在时返回 None"""
+        raise NotImplementedError
+
+    def exists(self, stem):
+        return self.stat(stem) is not None
+
+    def versions(self):
+        """返回所有标注的 {stem: mtime_ns}"""
+        raise NotImplementedError
+
+    def save(self, stem, data, text):
+        """
+        保存标注
+
+        Args:
+            stem: 文件名主干
+            data: 标注数据
+            text: 序列化后的 JSON 文本
+        """
+        raise NotImplementedError
+
+    def save_many(self, records):
+        """批量保存 [(stem, data, text, mtime_ns)]，mtime_ns 为 None 时使用当前时间"""
+        for stem, data, text, _mtime_ns in records:
+            self.save(stem, data, text)
+
+    def delete(self, stem):
+        """删除标注，返回是否存在"""
+        raise NotImplementedError
+
+    def iter_all(self, ordered=True, workers=None, after=None):
+        """
+        遍历所有标注
+
+        Args:
+            ordered: True 按 stem 顺序产出
+            workers: 并发读取的线程数（文件存储）
+            after: 只遍历 stem 大于该值的标注（用于从检查点继续）
+
+        Yields:
+            tuple: (stem, 标注数据)
+        """
+        raise NotImplementedError
+
+    def get_stats(self):
+        return {"backend": self.name}
+
+    def close(self):
+        pass
+
+
+class FileAnnotationStore(AnnotationStore):
+    """每张图片一个 {stem}.json 文件（默认后端）"""
+
+    name = 'file'
+
+    def __init__(self, annotations_dir, cache_size=2048, durability='atomic', load_workers=8):
+        """
+        Args:
+            annotations_dir: 标注目录
+            cache_size: 内存中缓存的标注数（0 表示不缓存）
+            durability: 写入模式，见 AnnotationWriter
+            load_workers: 批量读取的并发线程数
+        """
+        super().__init__()
+        self.cache = AnnotationCache(cache_size)
+        self.durability = durability
+        self.load_workers = load_workers
+        self.writer = None
+        self.reconfigure(annotations_dir)
+
+    def reconfigure(self, annotations_dir):
+        self.annotations_dir = Path(annotations_dir)
+        self.cache.clear()
+        if self.writer is not None:
+            self.writer.close()
+        self.writer = AnnotationWriter(self.annotations_dir, self.durability)
+        self._notify(None, None)
+
+    def path_for(self, stem):
+        return self.annotations_dir / f"{stem}.json"
+
+    @staticmethod
+    def _load_file(annotation_file):
+        with open(annotation_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def load(self, stem):
+        try:
+            return self.cache.get(self.path_for(stem), self._load_file)
+        except FileNotFoundError:
+            return None
+
+    def stat(self, stem):
+        try:
+            st = self.path_for(stem).stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    @staticmethod
+    def is_annotation_file(name):
+        """标注目录中的标注文件；点开头的文件（检查点、日志等）不是标注"""
+        return name.endswith('.json') and not name.startswith('.')
+
+    def versions(self):
+        versions = {}
+        if self.annotations_dir.exists():
+            with os.scandir(self.annotations_dir) as entries:
+                for entry in entries:
+                    if self.is_annotation_file(entry.name) and entry.is_file():
+                        versions[entry.name[:-len('.json')]] = entry.stat().st_mtime_ns
+        return versions
+
+    def save(self, stem, data, text):
+        annotation_file = self.path_for(stem)
+        # 原子替换写入，同一文件的并发保存依次执行，不会留下写了一半的 JSON
+
+        def on_written():
+            self.cache.put(annotation_file, data)
+            self._notify(stem, data)
+
+        self.writer.write(annotation_file, text, on_written=on_written)
+
+    def save_many(self, records):
+        for stem, data, text, mtime_ns in records:
+            self.save(stem, data, text)
+            if mtime_ns is not None:
+                os.utime(self.path_for(stem), ns=(mtime_ns, mtime_ns))
+
+    def delete(self, stem):
+        annotation_file = self.path_for(stem)
+        with self.writer.lock_for(annotation_file):
+            self.cache.invalidate(annotation_file)
+            # journal 模式下先写删除记录，重启重放日志时不会恢复已删除的标注
+            if not self.writer.delete(annotation_file):
+                return False
+            self._notify(stem, None)
+            return True
+
+    def iter_all(self, ordered=True, workers=None, after=None):
+        """文件的打开和解析在线程池中并发执行；不经过缓存，避免批量读取挤出常用条目"""
+        # 按 stem（而不是文件名）排序，与检查点的比较方式一致
+        stems = sorted(
+            entry.name[:-len('.json')] for entry in os.scandir(self.annotations_dir)
+            if self.is_annotation_file(entry.name) and entry.is_file()
+        )
+        if after is not None:
+            stems = stems[bisect.bisect_right(stems, after):]
+        paths = (self.path_for(stem) for stem in stems)
+        workers = self.load_workers if workers is None else workers
+        for path, data, error in iter_parallel(paths, self._load_file, workers, ordered):
+            if error is None:
+                yield path.stem, data
+            elif not isinstance(error, FileNotFoundError):
+                print(f"[警告] 跳过无法读取的标注文件 {path.name}: {error}")
+
+    def get_stats(self):
+        return {**self.cache.get_stats(), "backend": self.name, "writer": self.writer.get_stats()}
+
+    def close(self):
+        self.writer.close()
+
+
+class SqliteAnnotationStore(AnnotationStore):
+    """
+    所有标注保存在标注目录下的一个 SQLite 数据库中
+
+    完整标注存为 JSON 文本，overall_status / confidence_score / updated_at 另存为带索引的列，
+    列表、统计、导出等聚合操作无需逐个打开文件。
+    """
+
+    name = 'sqlite'
+    DB_NAME = 'annotations.db'
+    SCHEMA_VERSION = 1
+    PAGE_SIZE = 500     # 遍历时每次读取的行数
+
+    _UPSERT_SQL = """
+        INSERT INTO annotations (stem, data, overall_status, confidence_score, updated_at, mtime_ns)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(stem) DO UPDATE SET
+            data = excluded.data,
+            overall_status = excluded.overall_status,
+            confidence_score = excluded.confidence_score,
+            updated_at = excluded.updated_at,
+            mtime_ns = excluded.mtime_ns
+    """
+
+    def __init__(self, annotations_dir, durability='atomic'):
+        """
+        Args:
+            annotations_dir: 标注目录（数据库文件所在目录）
+            durability: 'atomic' 使用 synchronous=NORMAL，'fsync' / 'journal' 使用 synchronous=FULL
+        """
+        super().__init__()
+        self.durability = durability
+        self._lock = threading.RLock()
+        self._conn = None
+        # 其他连接（其他进程）提交后 PRAGMA data_version 会变化，此时与已知的各标注版本比对
+        self._data_version = None
+        self._versions = {}
+        self.reconfigure(annotations_dir)
+
+    def reconfigure(self, annotations_dir):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self.annotations_dir = Path(annotations_dir)
+            self.annotations_dir.mkdir(parents=True, exist_ok=True)
+            self.db_path = self.annotations_dir / self.DB_NAME
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._init_schema()
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            self._versions = self.versions()
+        self._notify(None, None)
+
+    def _init_schema(self):
+        conn = self._conn
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={'NORMAL' if self.durability == 'atomic' else 'FULL'}")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, self.SCHEMA_VERSION):
+            raise RuntimeError(f"标注数据库版本不受支持: {version}（{self.db_path}）")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS annotations (
+                stem TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                overall_status TEXT,
+                confidence_score REAL,
+                updated_at TEXT,
+                mtime_ns INTEGER NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_annotations_status ON annotations(overall_status)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_annotations_confidence ON annotations(confidence_score)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_annotations_updated ON annotations(updated_at)")
+        conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        conn.commit()
+
+    @staticmethod
+    def _extract_fields(data):
+        """提取带索引的字段"""
+        status = data.get('overall_status')
+        score = data.get('confidence_score')
+        updated_at = data.get('updated_at')
+        return (
+            status if isinstance(status, str) else None,
+            float(score) if isinstance(score, (int, float)) and not isinstance(score, bool) else None,
+            updated_at if isinstance(updated_at, str) else None
+        )
+
+    def load(self, stem):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM annotations WHERE stem = ?", (stem,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def stat(self, stem):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns, length(CAST(data AS BLOB)) FROM annotations WHERE stem = ?", (stem,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def versions(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT stem, mtime_ns FROM annotations"))
+
+    def save(self, stem, data, text):
+        self.save_many([(stem, data, text, None)])
+
+    def save_many(self, records):
+        rows = []
+        for stem, data, text, mtime_ns in records:
+            rows.append((stem, text, *self._extract_fields(data), mtime_ns or time.time_ns()))
+        with self._lock:
+            self._conn.executemany(self._UPSERT_SQL, rows)
+            self._conn.commit()
+            self._versions.update((row[0], row[-1]) for row in rows)
+        for stem, data, _text, _mtime_ns in records:
+            self._notify(stem, data)
+
+    def delete(self, stem):
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM annotations WHERE stem = ?", (stem,))
+            self._conn.commit()
+            self._versions.pop(stem, None)
+        if cursor.rowcount > 0:
+            self._notify(stem, None)
+            return True
+        return False
+
+    def sync_external(self):
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return []
+            self._data_version = data_version
+            known, self._versions = self._versions, self.versions()
+            current = self._versions
+        changed = [stem for stem, mtime_ns in current.items() if known.get(stem) != mtime_ns]
+        changed += [stem for stem in known if stem not in current]
+        if changed:
+            self.refresh(changed)
+        return changed
+
+    def iter_all(self, ordered=True, workers=None, after=None):
+        """按 stem 顺序分页读取（每页单独加锁，遍历期间不阻塞其他读写）"""
+        last = after or ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT stem, data FROM annotations WHERE stem > ? ORDER BY stem LIMIT ?",
+                    (last, self.PAGE_SIZE)
+                ).fetchall()
+            if not rows:
+                return
+            for stem, text in rows:
+                try:
+                    yield stem, json.loads(text)
+                except ValueError as e:
+                    print(f"[警告] 跳过无法解析的标注 {stem}: {e}")
+            last = rows[-1][0]
+
+    def get_stats(self):
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM annotations").fetchone()[0]
+            by_status = dict(self._conn.execute(
+                "SELECT COALESCE(overall_status, ''), COUNT(*) FROM annotations GROUP BY overall_status"
+            ))
+        return {"backend": self.name, "entries": total, "by_status": by_status, "db_path": str(self.db_path)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+STORES = {
+    FileAnnotationStore.name: FileAnnotationStore,
+    SqliteAnnotationStore.name: SqliteAnnotationStore,
+}
+
+
+def create_annotation_store(annotations_dir, config):
+    """
+    按配置创建标注存储后端
+
+    Args:
+        annotations_dir: 标注目录
+        config: 配置字典（annotation_store / annotation_durability / annotation_cache_size / annotation_load_workers）
+    """
+    backend = config.get('annotation_store', FileAnnotationStore.name)
+    durability = config.get('annotation_durability', 'atomic')
+    if backend == SqliteAnnotationStore.name:
+        return SqliteAnnotationStore(annotations_dir, durability)
+    if backend != FileAnnotationStore.name:
+        print(f"[警告] 未知的标注存储后端 {backend}，使用 file")
+    return FileAnnotationStore(
+        annotations_dir,
+        cache_size=int(config.get('annotation_cache_size', 2048)),
+        durability=durability,
+        load_workers=int(config.get('annotation_load_workers', 8))
+    )
@@ -0,0 +1,372 @@
+"""
+标注写入 - 原子替换、按文件加锁及可选的预写日志（group commit）
+"""
+import os
+import json
+import time
+import zlib
+import atexit
+import threading
+from pathlib import Path
+
+from utils.process_lock import ProcessLock
+
+
+def fsync_directory(directory):
+    """同步目录项，使 rename 在掉电后仍然有效（Windows 不支持，忽略）"""
+    if os.name == 'nt':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_text(path, text, fsync=False):
+    """
+    写入临时文件后 os.replace 到目标路径，读者只会看到旧内容或完整的新内容
+
+    Args:
+        path: 目标路径
+        text: 文件内容
+        fsync: 是否在替换前后同步到磁盘
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise
+    if fsync:
+        fsync_directory(path.parent)
+
+
+class AnnotationJournal:
+    """
+    仅追加的预写日志
+
+    写入标注前先把完整内容追加到日志；并发的写入合并为一次 fsync（group commit），
+    之后再原子替换标注文件（不单独 fsync）。删除同样先写入一条删除记录。
+    崩溃后启动时重放日志即可恢复已确认的写入，磁盘上比记录新的文件（其他进程之后写入的）保持不变。
+    日志超过 checkpoint_bytes、距上次检查点超过 checkpoint_interval 秒以及进程退出时，
+    同步所有写过的标注文件并清空日志。
+
+    日志只能由一个进程使用（重放和检查点会清空日志），多 worker 部署时由第一个打开的进程独占。
+    """
+
+    def __init__(self, journal_path, commit_delay=0.0, checkpoint_bytes=8 * 1024 * 1024, checkpoint_interval=30):
+        """
+        Args:
+            journal_path: 日志文件路径
+            commit_delay: 提交前额外等待合并其他写入的时间（秒）；默认不等待，
+                          刷盘期间到达的写入自然合并到下一批
+            checkpoint_bytes: 日志达到该大小后执行检查点
+            checkpoint_interval: 日志非空时定期执行检查点的间隔（秒），0 表示不定期执行
+        """
+        self.journal_path = Path(journal_path)
+        self.commit_delay = commit_delay
+        self.checkpoint_bytes = checkpoint_bytes
+        self.checkpoint_interval = checkpoint_interval
+
+        self._cond = threading.Condition()
+        self._buffer = []           # 待提交的日志行
+        self._appended = 0          # 已追加的记录序号
+        self._synced = 0            # 已 fsync 的记录序号
+        self._flushing = False
+        self._in_flight = 0         # 已写日志、尚未替换标注文件的写入数
+        self._checkpointing = False
+        self._dirty = set()         # 上次检查点之后写过的标注文件
+        self._stats = {"records": 0, "commits": 0, "checkpoints": 0, "replayed": 0}
+
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        self._owner = ProcessLock(self.journal_path.with_name(self.journal_path.name + '.lock'))
+        if not self._owner.acquire():
+            raise BlockingIOError(f"标注日志已被其他进程使用: {self.journal_path}")
+        self._stats["replayed"] = self.replay()
+        self._file = open(self.journal_path, 'ab')
+        self._size = self._file.tell()
+
+        # 定期检查点，并在进程正常退出时清空日志，避免下次启动重放旧内容
+        self._closed = threading.Event()
+        if checkpoint_interval:
+            threading.Thread(target=self._checkpoint_loop, daemon=True, name="journal-checkpoint").start()
+        atexit.register(self.close)
+
+    # ============= 写入 =============
+
+    def write(self, path, text):
+        """先写日志（等待 group commit 完成）再原子替换标注文件"""
+        self._commit(self._encode(path, text))
+        try:
+            atomic_write_text(path, text)
+        finally:
+            self._written(path)
+
+    def delete(self, path):
+        """
+        先写删除记录再删除标注文件
+
+        Returns:
+            bool: 文件是否存在
+        """
+        self._commit(self._encode(path, None))
+        try:
+            Path(path).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+        finally:
+            self._written(path)
+
+    def _written(self, path):
+        with self._cond:
+            self._in_flight -= 1
+            self._dirty.add(str(path))
+            need_checkpoint = self._size >= self.checkpoint_bytes
+            self._cond.notify_all()
+        if need_checkpoint:
+            self.checkpoint()
+
+    @staticmethod
+    def _encode(path, text):
+        """日志记录；text 为 None 表示删除。time_ns 用于重放时与磁盘上文件的修改时间比较"""
+        record = {"path": str(path), "time_ns": time.time_ns()}
+        if text is None:
+            record["deleted"] = True
+        else:
+            record.update(content=text, crc=zlib.crc32(text.encode('utf-8')))
+        return (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+    def _commit(self, line):
+        """追加一条记录并阻塞到它被 fsync；同一时刻只有一个线程负责刷盘，其余线程的记录随之一起提交"""
+        with self._cond:
+            while self._checkpointing:
+                self._cond.wait()
+            self._in_flight += 1
+            self._buffer.append(line)
+            self._appended += 1
+            seq = self._appended
+
+            while self._synced < seq:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                self._flushing = True
+                # 稍等片刻，让并发的写入进入同一批
+                if self.commit_delay:
+                    self._cond.wait(self.commit_delay)
+                batch, self._buffer = self._buffer, []
+                upto = self._appended
+
+                self._cond.release()
+                try:
+                    self._file.write(b''.join(batch))
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                except BaseException:
+                    self._cond.acquire()
+                    # 放回缓冲区由下一个线程重试
+                    self._buffer = batch + self._buffer
+                    self._flushing = False
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+                    raise
+                self._cond.acquire()
+
+                self._size += sum(len(item) for item in batch)
+                self._synced = upto
+                self._flushing = False
+                self._stats["records"] += len(batch)
+                self._stats["commits"] += 1
+                self._cond.notify_all()
+
+    # ============= 检查点与恢复 =============
+
+    def _checkpoint_loop(self):
+        while not self._closed.wait(self.checkpoint_interval):
+            if self._size:
+                try:
+                    self.checkpoint()
+                except Exception as e:
+                    print(f"[错误] 标注日志检查点失败: {e}")
+
+    def checkpoint(self):
+        """同步所有写过的标注文件后清空日志"""
+        with self._cond:
+            if self._checkpointing:
+                return
+            self._checkpointing = True
+            try:
+                while self._in_flight or self._flushing:
+                    self._cond.wait()
+                dirty, self._dirty = self._dirty, set()
+                for path in dirty:
+                    try:
+                        with open(path, 'rb+') as f:
+                            os.fsync(f.fileno())
+                    except FileNotFoundError:
+                        pass
+                for directory in {os.path.dirname(path) for path in dirty}:
+                    fsync_directory(directory)
+                self._file.truncate(0)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._size = 0
+                self._stats["checkpoints"] += 1
+            finally:
+                self._checkpointing = False
+                self._cond.notify_all()
+
+    def replay(self):
+        """
+        重放日志中的写入和删除（每个文件取最后一条完整记录），然后清空日志
+
+        磁盘上的文件修改时间不早于记录时间时跳过该记录：写入已经完成，
+        或文件之后又被其他进程（多 worker 时以 fsync 模式写入的 worker）修改过。
+
+        Returns:
+            int: 恢复的文件数
+        """
+        if not self.journal_path.exists():
+            return 0
+        latest = {}
+        with open(self.journal_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if not record.get("deleted") and zlib.crc32(record["content"].encode('utf-8')) != record["crc"]:
+                        continue
+                    latest[record["path"]] = record
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    # 崩溃时写了一半的最后一行
+                    continue
+
+        restored = 0
+        for path, record in latest.items():
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                mtime_ns = None
+            # 旧版本的记录没有 time_ns，照常重放
+            if mtime_ns is not None and mtime_ns >= record.get("time_ns", mtime_ns + 1):
+                continue
+            try:
+                if record.get("deleted"):
+                    if mtime_ns is None:
+                        continue
+                    os.unlink(path)
+                    fsync_directory(os.path.dirname(path))
+                else:
+                    atomic_write_text(path, record["content"], fsync=True)
+            except OSError as e:
+                print(f"[错误] 重放标注日志失败 {path}: {e}")
+                raise
+            restored += 1
+        with open(self.journal_path, 'wb') as f:
+            os.fsync(f.fileno())
+        if restored:
+            print(f"[信息] 已从标注日志恢复 {restored} 个文件")
+        return restored
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._closed.set()
+        atexit.unregister(self.close)
+        self.checkpoint()
+        self._file.close()
+        self._owner.release()
+
+    def get_stats(self):
+        with self._cond:
+            return {**self._stats, "journal_bytes": self._size, "dirty_files": len(self._dirty)}
+
+
+class AnnotationWriter:
+    """
+    标注文件写入器
+
+    durability:
+        'atomic'   临时文件 + 原子替换（默认，不 fsync）
+        'fsync'    每次写入都 fsync，最安全也最慢
+        'journal'  预写日志 + group commit，并发保存时合并 fsync
+    """
+
+    MODES = ('atomic', 'fsync', 'journal')
+    LOCK_STRIPES = 64
+    JOURNAL_NAME = '.annotations.journal'
+
+    def __init__(self, annotations_dir, durability='atomic'):
+        if durability not in self.MODES:
+            print(f"[警告] 未知的标注写入模式 {durability}，使用 atomic")
+            durability = 'atomic'
+        self.annotations_dir = Path(annotations_dir)
+        self.durability = durability
+        # 同一文件的并发保存按顺序执行（按路径哈希分段加锁，锁的数量固定）
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self.journal = None
+        if durability == 'journal':
+            try:
+                self.journal = AnnotationJournal(self.annotations_dir / self.JOURNAL_NAME)
+            except BlockingIOError as e:
+                # 多 worker 部署时只有一个进程能使用日志，其余进程逐个 fsync，持久性相同
+                print(f"[警告] {e}，本进程改用 fsync 模式")
+                self.durability = 'fsync'
+
+
+    def lock_for(self, path):
+        return self._locks[hash(str(path)) % self.LOCK_STRIPES]
+
+    def delete(self, path):
+        """
+        删除标注文件（调用方持有该文件的锁，见 lock_for）
+
+        Returns:
+            bool: 文件是否存在
+        """
+        if self.journal is not None:
+            return self.journal.delete(path)
+        try:
+            Path(path).unlink()
+        except FileNotFoundError:
+            return False
+        if self.durability == 'fsync':
+            fsync_directory(Path(path).parent)
+        return True
+
+    def write(self, path, text, on_written=None):
+        """
+        写入标注文件
+
+        Args:
+            path: 标注文件路径
+            text: 文件内容
+            on_written: 写入后、释放该文件的锁之前调用（用于按写入顺序更新缓存）
+        """
+        with self.lock_for(path):
+            if self.journal is not None:
+                self.journal.write(path, text)
+            else:
+                atomic_write_text(path, text, fsync=self.durability == 'fsync')
+            if on_written is not None:
+                on_written()
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    def get_stats(self):
+        return {
+            "durability": self.durability,
+            "journal": self.journal.get_stats() if self.journal is not None else None
+        }
@@ -0,0 +1,96 @@
+"""
+变更通知服务 - 记录图片列表的增量变化供前端订阅
+"""
+import asyncio
+import threading
+from collections import deque
+
+
+class ChangeFeed:
+    """
+    带序号的内存变更队列
+
+    每条变更形如 {"seq": 12, "action": "upsert", "image": {...}} 或
+    {"seq": 13, "action": "delete", "name": "a.jpg"}；
+    action 为 "reset" 时表示客户端应重新拉取完整列表。
+    只保留最近 max_events 条，订阅方落后太多、或其序号大于当前序号（服务重启、多 worker 时重连到
+    另一个进程）时同样需要重新拉取，此时返回一条 reset。
+
+    wait() 阻塞调用线程；wait_async() 供 ASGI 入口使用，等待期间不占用线程。
+    """
+
+    def __init__(self, max_events=10000):
+        self._events = deque(maxlen=max_events)
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._async_waiters = set()     # {(事件循环, Future)}
+
+    @property
+    def last_seq(self):
+        with self._condition:
+            return self._seq
+
+    def publish(self, events):
+        """追加一批变更并唤醒等待中的订阅者"""
+        if not events:
+            return
+        with self._condition:
+            for event in events:
+                self._seq += 1
+                self._events.append({"seq": self._seq, **event})
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, set()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def since(self, seq):
+        """
+        获取序号大于 seq 的变更
+
+        Returns:
+            tuple: (变更列表, 是否已丢失部分变更)
+        """
+        with self._condition:
+            return self._collect(seq)
+
+    def wait(self, seq, timeout):
+        """阻塞等待序号大于 seq 的变更，超时返回空列表"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq != seq, timeout=timeout)
+            return self._collect(seq)
+
+    async def wait_async(self, seq, timeout):
+        """wait() 的协程版本"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self._condition:
+            if self._seq != seq:
+                return self._collect(seq)
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                self._async_waiters.discard(waiter)
+        return self.since(seq)
+
+    def _collect(self, seq):
+        if seq == self._seq:
+            return [], False
+        if seq > self._seq:
+            # 订阅方的序号比当前还大：服务重启过，或重连到了另一个 worker，无法判断漏掉了哪些变更
+            return [{"seq": self._seq, "action": "reset"}], True
+        oldest = self._events[0]["seq"] if self._events else self._seq + 1
+        truncated = seq + 1 < oldest
+        events = [event for event in self._events if event["seq"] > seq]
+        if truncated and not events:
+            return [{"seq": self._seq, "action": "reset"}], True
+        return events, truncated
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,311 @@
+"""
+衍生图缓存 - 多尺寸（缩略图 / 预览图）缓存及容量控制
+"""
+import os
+import time
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+from .thumbnail_pool import ThumbnailPool
+
+
+class DerivativeCache:
+    """
+    多尺寸衍生图缓存
+
+    - 每种尺寸（variant）一个子目录，文件名由 源图内容指纹 + 尺寸 + 档位 哈希得到：
+      {cache_dir}/{variant}/{key[:2]}/{key}.jpg
+    - 内容相同的图片（重命名、不同目录下的副本）共用同一份衍生图；
+      内容或尺寸配置变化后键随之变化，旧文件不再被命中，由 LRU 自然淘汰
+    - 总容量超过 max_bytes 时按最近访问时间淘汰，直到降到低水位
+    - budgets 中列出的尺寸（如原图分辨率的渐进式 JPEG）有独立的容量和 LRU，
+      不会挤出缩略图/预览图；其余尺寸共用 max_bytes
+    """
+
+    # 名称 -> (最大宽高, 渲染档位)；档位为 None 时使用缩略图档位配置
+    DEFAULT_VARIANTS = {
+        "thumb": ((400, 400), None),
+        "preview": ((1600, 1600), "quality"),
+    }
+    ORIGINAL = "original"
+    SHARED = "shared"            # 未单独设置容量的尺寸共用的分区
+    LOW_WATERMARK = 0.9          # 淘汰到容量上限的 90%
+    TOUCH_INTERVAL = 300         # 命中时最多每 5 分钟更新一次文件时间（持久化 LRU 顺序）
+    TIMEOUT = 30                 # 等待生成的最长时间（秒）
+
+    def __init__(self, cache_dir, pool, max_bytes, thumbnail_profile, fingerprint, variants=None, budgets=None):
+        """
+        Args:
+            cache_dir: 缓存目录
+            pool: ThumbnailPool
+            max_bytes: 共用分区的容量上限（0 表示不限制）
+            thumbnail_profile: 未指定档位的尺寸使用的渲染档位
+            fingerprint: 计算源图内容指纹的函数 fingerprint(image_path) -> str
+            variants: 尺寸配置，默认 DEFAULT_VARIANTS
+            budgets: {尺寸名称: 容量上限（0 表示不限制）}，这些尺寸单独淘汰
+        """
+        self.cache_dir = Path(cache_dir)
+        self.fingerprint = fingerprint
+        self.pool = pool
+        self.max_bytes = max_bytes
+        self.variants = {}
+        for name, (size, profile) in (variants or self.DEFAULT_VARIANTS).items():
+            self.variants[name] = (tuple(size), profile or thumbnail_profile)
+        budgets = {name: limit for name, limit in (budgets or {}).items() if name in self.variants}
+        self._budgets = {self.SHARED: max_bytes, **budgets}
+        self._partition_of = {name: name if name in budgets else self.SHARED for name in self.variants}
+
+        self._entries = None         # {分区: OrderedDict(路径 -> (大小, 最近一次写入文件时间))}
+        self._total_bytes = {}       # {分区: 总字节数}
+        self._lock = threading.RLock()
+        self._stats = {"hits": 0, "misses": 0, "evicted": 0, "evicted_bytes": 0}
+
+    # ============= 键与路径 =============
+
+    def derivative_key(self, fingerprint, variant):
+        """衍生图键：内容指纹 + 输出尺寸 + 渲染档位"""
+        (width, height), profile = self.variants[variant]
+        raw = f"{fingerprint}|{width}x{height}|{profile}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def path_for(self, variant, key):
+        return self.cache_dir / variant / key[:2] / f"{key}.jpg"
+
+    # ============= 读取与生成 =============
+
+    def get(self, image_path, variant):
+        """
+        获取衍生图路径，不存在时生成（同一文件的并发请求只生成一次）
+
+        Args:
+            image_path: 原始图片路径
+            variant: 尺寸名称，见 variants
+
+        Returns:
+            Path: 衍生图路径
+        """
+        if variant not in self.variants:
+            raise ValueError(f"不支持的尺寸: {variant}，可选: {', '.join([*self.variants, self.ORIGINAL])}")
+
+        path = self.path_for(variant, self.derivative_key(self.fingerprint(image_path), variant))
+        if self._hit(path, variant):
+            return path
+
+        with self._lock:
+            self._stats["misses"] += 1
+        future = self._submit(image_path, variant, path, ThumbnailPool.PRIORITY_REQUEST)
+        return Path(future.result(timeout=self.TIMEOUT))
+
+    def get_many(self, image_paths, variant):
+        """
+        批量获取衍生图：先提交所有缺失项再统一等待，缺失项在进程池中并行生成
+        
+        Args:
+            image_paths: 原始图片路径列表
+            variant: 尺寸名称
+            
+        Returns:
+            list: 与 image_paths 一一对应的衍生图路径或异常对象
+        """
+        if variant not in self.variants:
+            raise ValueError(f"不支持的尺寸: {variant}，可选: {', '.join([*self.variants, self.ORIGINAL])}")
+        
+        results = []
+        for image_path in image_paths:
+            try:
+                path = self.path_for(variant, self.derivative_key(self.fingerprint(image_path), variant))
+            except Exception as e:
+                results.append(e)
+                continue
+            if self._hit(path, variant):
+                results.append(path)
+                continue
+            with self._lock:
+                self._stats["misses"] += 1
+            results.append(self._submit(image_path, variant, path, ThumbnailPool.PRIORITY_REQUEST))
+        
+        deadline = time.monotonic() + self.TIMEOUT
+        for index, item in enumerate(results):
+            if isinstance(item, (Path, Exception)):
+                continue
+            try:
+                results[index] = Path(item.result(timeout=max(0, deadline - time.monotonic())))
+            except Exception as e:
+                results[index] = e
+        return results
+    
+    def peek(self, image_path, variant):
+        """
+        已生成时返回衍生图路径；否则加入后台生成队列并返回 None，不等待
+
+        Returns:
+            Path | None
+        """
+        path = self.path_for(variant, self.derivative_key(self.fingerprint(image_path), variant))
+        if self._hit(path, variant):
+            return path
+        self._submit(image_path, variant, path, ThumbnailPool.PRIORITY_WARM)
+        return None
+
+    def warm(self, image_paths, variant):
+        """
+        后台预生成衍生图
+
+        Returns:
+            int: 加入队列的任务数
+        """
+        count = 0
+        for image_path in image_paths:
+            try:
+                path = self.path_for(variant, self.derivative_key(self.fingerprint(image_path), variant))
+            except FileNotFoundError:
+                continue
+            if path.exists():
+                continue
+            self._submit(image_path, variant, path, ThumbnailPool.PRIORITY_WARM)
+            count += 1
+        return count
+
+    def _submit(self, image_path, variant, path, priority):
+        size, profile = self.variants[variant]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        future = self.pool.submit(image_path, path, size, profile, priority=priority)
+
+        def on_done(done):
+            if done.exception() is None:
+                self._record(path, variant)
+
+        future.add_done_callback(on_done)
+        return future
+
+    def _hit(self, path, variant):
+        """命中时更新 LRU 顺序"""
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return False
+
+        with self._lock:
+            self._ensure_loaded()
+            self._stats["hits"] += 1
+            partition = self._partition_of[variant]
+            entries = self._entries[partition]
+            key = str(path)
+            entry = entries.get(key)
+            if entry is None:
+                self._add_entry(partition, key, st.st_size, st.st_mtime)
+                entry = entries[key]
+            entries.move_to_end(key)
+            # 偶尔刷新文件时间，使重启后仍能按最近访问排序
+            now = time.time()
+            if now - entry[1] > self.TOUCH_INTERVAL:
+                try:
+                    os.utime(path, (now, now))
+                    entries[key] = (entry[0], now)
+                except OSError:
+                    pass
+        return True
+
+    def remove_fingerprint(self, fingerprint):
+        """删除某个内容指纹的所有衍生图（调用方需确认没有其他图片共用该内容）"""
+        for variant in self.variants:
+            self._discard(self.path_for(variant, self.derivative_key(fingerprint, variant)), variant)
+
+    # ============= 容量控制 =============
+
+    def _ensure_loaded(self):
+        """首次使用时扫描缓存目录，按文件时间建立 LRU 顺序（调用方需持有锁）"""
+        if self._entries is not None:
+            return
+        files = []
+        for variant in self.variants:
+            variant_dir = self.cache_dir / variant
+            if not variant_dir.exists():
+                continue
+            partition = self._partition_of[variant]
+            for root, _dirs, names in os.walk(variant_dir):
+                for name in names:
+                    if not name.endswith('.jpg'):
+                        continue
+                    full = os.path.join(root, name)
+                    try:
+                        st = os.stat(full)
+                    except FileNotFoundError:
+                        continue
+                    files.append((st.st_mtime, full, st.st_size, partition))
+        files.sort()
+        self._entries = {partition: OrderedDict() for partition in self._budgets}
+        self._total_bytes = {partition: 0 for partition in self._budgets}
+        for mtime, full, size, partition in files:
+            self._add_entry(partition, full, size, mtime)
+
+    def _add_entry(self, partition, key, size, mtime):
+        entries = self._entries[partition]
+        previous = entries.pop(key, None)
+        if previous:
+            self._total_bytes[partition] -= previous[0]
+        entries[key] = (size, mtime)
+        self._total_bytes[partition] += size
+
+    def _record(self, path, variant):
+        """登记新生成的文件，所在分区超出容量时淘汰"""
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            partition = self._partition_of[variant]
+            self._add_entry(partition, str(path), st.st_size, st.st_mtime)
+            limit = self._budgets[partition]
+            if limit and self._total_bytes[partition] > limit:
+                self._evict(partition, int(limit * self.LOW_WATERMARK))
+
+    def _evict(self, partition, target_bytes):
+        """淘汰分区中最久未访问的文件直到其总大小不超过 target_bytes（调用方需持有锁）"""
+        entries = self._entries[partition]
+        while entries and self._total_bytes[partition] > target_bytes:
+            key, (size, _mtime) = entries.popitem(last=False)
+            self._total_bytes[partition] -= size
+            try:
+                os.remove(key)
+                self._stats["evicted"] += 1
+                self._stats["evicted_bytes"] += size
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # Windows 上文件正在被发送时无法删除，留待下次淘汰
+                print(f"[警告] 无法淘汰缓存文件 {key}: {e}")
+
+    def _discard(self, path, variant):
+        with self._lock:
+            if self._entries is not None:
+                partition = self._partition_of[variant]
+                entry = self._entries[partition].pop(str(path), None)
+                if entry:
+                    self._total_bytes[partition] -= entry[0]
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def get_stats(self):
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                **self._stats,
+                "entries": sum(len(entries) for entries in self._entries.values()),
+                "total_bytes": sum(self._total_bytes.values()),
+                "max_bytes": self.max_bytes,
+                "variants": {name: list(size) for name, (size, _profile) in self.variants.items()},
+                "partitions": {
+                    partition: {
+                        "entries": len(self._entries[partition]),
+                        "total_bytes": self._total_bytes[partition],
+                        "max_bytes": limit
+                    }
+                    for partition, limit in self._budgets.items()
+                }
+            }
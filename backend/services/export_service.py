@@ -0,0 +1,138 @@
+"""
+导出服务 - 将标注流式转换为 VLM 训练数据
+"""
+import json
+import textwrap
+
+
+class ExportService:
+    """
+    VLM 格式导出服务
+
+    逐条读取标注文件并生成 VLM（ShareGPT 风格）记录，内存占用与标注总数无关：
+        {"images": [图片路径], "messages": [{"content": "<image> ...", "role": "user"},
+                                          {"content": 标注JSON, "role": "assistant"}]}
+    """
+
+    FORMATS = ('jsonl', 'json')
+    INTERNAL_FIELDS = {'image_name', 'image_path', 'created_at', 'updated_at'}
+
+    def __init__(self, annotation_service, config_manager):
+        self.annotation_service = annotation_service
+        self.config_manager = config_manager
+
+    def to_vlm_record(self, image_name, annotation):
+        """
+        将单条标注转换为 VLM 格式
+
+        结构（提示词、字段顺序、排除的内部字段）与前端 convertToVLMFormat 相同，图片路径有两处不同，
+        见 relative_image_path 和 iter_records。
+
+        Args:
+            image_name: 图片文件名
+            annotation: 标注数据
+
+        Returns:
+            dict: VLM 记录
+        """
+        user_content = '<image>'
+        prompt = self.config_manager.get('prompt_template', '')
+        if prompt:
+            user_content += ' \n' + prompt
+
+        # 按字段配置顺序输出，其余非内部字段追加在后
+        ordered = {}
+        for field in self.config_manager.get('json_fields', []):
+            if field['name'] in annotation:
+                ordered[field['name']] = annotation[field['name']]
+        for key, value in annotation.items():
+            if key not in ordered and key not in self.INTERNAL_FIELDS:
+                ordered[key] = value
+
+        return {
+            "images": [self.relative_image_path(image_name)],
+            "messages": [
+                {"content": user_content, "role": "user"},
+                {"content": json.dumps(ordered, ensure_ascii=False, indent=2), "role": "assistant"}
+            ]
+        }
+
+    def relative_image_path(self, image_name):
+        """
+        图片相对于 data 目录的路径（找不到 data 目录时只返回文件名）
+
+        与前端 getRelativeImagePath 不同，Windows 目录中的反斜杠统一转换为正斜杠，
+        末尾的分隔符去掉，同一数据在不同系统上导出的路径相同。
+        """
+        images_dir = str(self.config_manager.images_dir).replace('\\', '/')
+        index = images_dir.lower().find('/data/')
+        if index == -1:
+            return image_name
+        return f"{images_dir[index + len('/data/'):].rstrip('/')}/{image_name}"
+
+    def iter_records(self):
+        """
+        逐条生成 VLM 记录
+
+        文件名取标注中保存的 image_name（真实扩展名），不再像前端的"导出全部"那样固定为 文件名 + '.jpeg'，
+        因此 .jpg/.png 图片导出的路径与旧版本不同。
+        """
+        for stem, annotation in self.annotation_service.iter_annotations():
+            # 旧数据没有 image_name 时沿用前端导出的 .jpeg 约定
+            image_name = annotation.get('image_name') or f"{stem}.jpeg"
+            yield self.to_vlm_record(image_name, annotation)
+
+    def iter_export(self, fmt='jsonl', indent=None, records=None):
+        """
+        生成导出内容的文本片段
+
+        Args:
+            fmt: 'jsonl'（每行一条记录）或 'json'（JSON 数组）
+            indent: json 格式的缩进，默认使用配置的 json_indent
+            records: 要导出的记录，默认为全部标注
+
+        Yields:
+            str: 文本片段
+        """
+        if fmt not in self.FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}，可选: {', '.join(self.FORMATS)}")
+        if records is None:
+            records = self.iter_records()
+
+        if fmt == 'jsonl':
+            for record in records:
+                yield json.dumps(record, ensure_ascii=False) + '\n'
+            return
+
+        if indent is None:
+            indent = self.config_manager.get('json_indent', 2)
+        # 与 JSON.stringify(list, null, indent) 的输出保持一致
+        first = True
+        for record in records:
+            if indent:
+                text = textwrap.indent(json.dumps(record, ensure_ascii=False, indent=indent), ' ' * indent)
+                yield ('[\n' if first else ',\n') + text
+            else:
+                yield ('[' if first else ',') + json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+            first = False
+        yield '[]' if first else ('\n]' if indent else ']')
+
+    def export_to_file(self, output_path, fmt='jsonl', indent=None):
+        """
+        导出到文件
+
+        Returns:
+            int: 导出的记录数
+        """
+        count = 0
+
+        def counted():
+            nonlocal count
+            for record in self.iter_records():
+                count += 1
+                yield record
+
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for chunk in self.iter_export(fmt, indent, counted()):
+                f.write(chunk)
+        return count
@@ -0,0 +1,226 @@
+"""
+文件监听服务 - 监听图片/标注目录的变化
+"""
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from pathlib import Path
+
+
+class _InotifyBackend:
+    """Linux inotify 实现（通过 ctypes 调用 libc，无额外依赖）"""
+
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0x00000800
+    IN_CLOEXEC = 0x00080000
+
+    WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                  IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+    REMOVE_MASK = IN_MOVED_FROM | IN_DELETE
+    EVENT_HEADER = struct.Struct('iIII')
+
+    name = 'inotify'
+    needs_debounce = True
+
+    def __init__(self, directories):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+
+        self._watches = {}
+        for kind, directory in directories.items():
+            wd = self._libc.inotify_add_watch(self._fd, str(directory).encode(), self.WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                os.close(self._fd)
+                raise OSError(err, f"无法监听目录: {directory}")
+            self._watches[wd] = kind
+
+    @classmethod
+    def is_supported(cls):
+        return sys.platform.startswith('linux')
+
+    def poll(self, timeout):
+        """
+        等待并读取事件
+
+        Returns:
+            tuple: ([(kind, name, removed)], overflow)
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return [], False
+
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return [], False
+            raise
+
+        events = []
+        overflow = False
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(buffer):
+            wd, mask, _cookie, length = self.EVENT_HEADER.unpack_from(buffer, offset)
+            offset += self.EVENT_HEADER.size
+            name = buffer[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW or mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                overflow = True
+                continue
+            if mask & self.IN_ISDIR or not name or wd not in self._watches:
+                continue
+            events.append((self._watches[wd], name, bool(mask & self.REMOVE_MASK)))
+        return events, overflow
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _PollingBackend:
+    """轮询实现：定期扫描目录并与上一次快照比较"""
+
+    name = 'polling'
+    needs_debounce = False  # 每次轮询已是完整的差异
+
+    def __init__(self, directories, interval):
+        self._directories = directories
+        self._interval = interval
+        self._snapshots = {kind: self._snapshot(path) for kind, path in directories.items()}
+        self._stopped = threading.Event()
+
+    @staticmethod
+    def _snapshot(directory):
+        snapshot = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        st = entry.stat()
+                        snapshot[entry.name] = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        return snapshot
+
+    def poll(self, timeout):
+        if self._stopped.wait(max(timeout, self._interval)):
+            return [], False
+
+        events = []
+        for kind, directory in self._directories.items():
+            previous = self._snapshots[kind]
+            current = self._snapshot(directory)
+            for name, fingerprint in current.items():
+                if previous.get(name) != fingerprint:
+                    events.append((kind, name, False))
+            for name in previous.keys() - current.keys():
+                events.append((kind, name, True))
+            self._snapshots[kind] = current
+        return events, False
+
+    def close(self):
+        self._stopped.set()
+
+
+class FileWatcher:
+    """
+    目录监听器
+
+    在后台线程中监听图片目录和标注目录，将短时间内的事件合并去重后批量回调：
+        on_changes(image_names, annotation_stems, overflow)
+    overflow 为 True 表示事件丢失（队列溢出或目录被移动），调用方应做一次全量刷新。
+    Linux 上优先使用 inotify，其他平台或 inotify 不可用时退回到轮询。
+    """
+
+    def __init__(self, images_dir, annotations_dir, on_changes,
+                 poll_interval=5.0, debounce=0.3, use_inotify=True):
+        self.images_dir = Path(images_dir)
+        self.annotations_dir = Path(annotations_dir)
+        self.on_changes = on_changes
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.use_inotify = use_inotify
+
+        self._backend = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def backend_name(self):
+        return self._backend.name if self._backend else None
+
+    def start(self):
+        """启动监听线程"""
+        directories = {'image': self.images_dir, 'annotation': self.annotations_dir}
+
+        if self.use_inotify and _InotifyBackend.is_supported():
+            try:
+                self._backend = _InotifyBackend(directories)
+            except (OSError, AttributeError) as e:
+                print(f"[警告] inotify 不可用，改用轮询监听: {e}")
+        if self._backend is None:
+            self._backend = _PollingBackend(directories, self.poll_interval)
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='file-watcher', daemon=True)
+        self._thread.start()
+        print(f"[信息] 目录监听已启动 ({self._backend.name}): {self.images_dir}")
+
+    def stop(self):
+        """停止监听线程"""
+        self._stop_event.set()
+        backend = self._backend
+        if isinstance(backend, _PollingBackend):
+            backend.close()  # 唤醒正在等待的轮询
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        if isinstance(backend, _InotifyBackend):
+            backend.close()
+        self._backend = None
+        self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                events, overflow = self._backend.poll(1.0)
+                if not events and not overflow:
+                    continue
+
+                # 合并 debounce 窗口内的后续事件（例如大批量拷贝）
+                deadline = time.monotonic() + self.debounce
+                while (self._backend.needs_debounce and time.monotonic() < deadline
+                       and not self._stop_event.is_set()):
+                    more, more_overflow = self._backend.poll(max(deadline - time.monotonic(), 0))
+                    events.extend(more)
+                    overflow = overflow or more_overflow
+
+                image_names = {name for kind, name, _ in events if kind == 'image'}
+                annotation_stems = {
+                    name[:-5] for kind, name, _ in events
+                    if kind == 'annotation' and name.endswith('.json') and not name.startswith('.')
+                }
+                if image_names or annotation_stems or overflow:
+                    self.on_changes(image_names, annotation_stems, overflow)
+            except Exception as e:
+                if self._stop_event.is_set():
+                    break
+                print(f"[错误] 目录监听异常: {e}")
+                time.sleep(1)
@@ -0,0 +1,48 @@
+"""
+内容指纹 - 用于缓存键的廉价文件内容标识
+"""
+import os
+import hashlib
+
+
+PARTIAL_CHUNK = 64 * 1024  # 部分哈希时头/中/尾各读取的字节数
+
+
+def content_fingerprint(file_path, full_hash=False):
+    """
+    计算文件内容指纹
+
+    默认只哈希文件大小及头、中、尾各 64KB（部分哈希，前缀 "p"）；
+    小文件或 full_hash=True 时哈希全部内容（前缀 "f"）。
+    指纹只取决于内容，与文件名和修改时间无关，因此重命名或复制的文件得到相同指纹。
+
+    Args:
+        file_path: 文件路径
+        full_hash: 是否哈希完整内容
+
+    Returns:
+        str: 形如 "p1a2b3-<32位十六进制>" 的指纹
+    """
+    size = os.path.getsize(file_path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(size).encode('ascii'))
+
+    with open(file_path, 'rb') as f:
+        if full_hash or size <= PARTIAL_CHUNK * 3:
+            prefix = 'f'
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        else:
+            prefix = 'p'
+            digest.update(f.read(PARTIAL_CHUNK))
+            f.seek(size // 2 - PARTIAL_CHUNK // 2)
+            digest.update(f.read(PARTIAL_CHUNK))
+            f.seek(-PARTIAL_CHUNK, os.SEEK_END)
+            digest.update(f.read(PARTIAL_CHUNK))
+
+    return f"{prefix}{size:x}-{digest.hexdigest()}"
+
+
+def is_acceptable(fingerprint, full_hash):
+    """已缓存的指纹是否满足当前的哈希模式（完整哈希模式不接受部分哈希）"""
+    return bool(fingerprint) and (not full_hash or fingerprint.startswith('f'))
@@ -0,0 +1,601 @@
+"""
+图片索引服务 - 持久化的图片目录缓存
+"""
+import os
+import json
+import base64
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from datetime import datetime
+from PIL import Image
+
+from .fingerprint import content_fingerprint, is_acceptable
+
+
+class ImageCatalog:
+    """
+    基于 SQLite 的图片索引
+
+    以 文件名 + 文件大小 + 修改时间 为键缓存图片的校验结果、尺寸和标注状态，
+    只有新增或发生变化的文件才会被重新校验。
+    """
+
+    SCHEMA_VERSION = 3
+    MIN_IMAGE_SIZE = 100  # 小于该字节数的文件视为无效图片
+    # 可排序字段: 请求参数 -> 列名
+    SORT_KEYS = {
+        'name': 'name',
+        'modified': 'mtime_ns',
+        'size': 'size',
+        'status': 'overall_status'
+    }
+
+    _UPSERT_SQL = """
+        INSERT INTO images (name, stem, size, mtime_ns, valid, width, height, format, fingerprint)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            size = excluded.size,
+            mtime_ns = excluded.mtime_ns,
+            valid = excluded.valid,
+            width = excluded.width,
+            height = excluded.height,
+            format = excluded.format,
+            fingerprint = excluded.fingerprint
+    """
+
+    def __init__(self, db_path, images_dir, annotation_store, extensions, full_hash=False):
+        """
+        Args:
+            db_path: 索引数据库路径
+            images_dir: 图片目录
+            annotation_store: 标注存储后端（AnnotationStore），用于同步标注状态
+            extensions: 支持的图片扩展名
+            full_hash: 内容指纹是否哈希完整文件
+        """
+        self.db_path = Path(db_path)
+        self.full_hash = full_hash
+        self.images_dir = Path(images_dir)
+        self.annotation_store = annotation_store
+        self.extensions = {ext.lower() for ext in extensions}
+
+        self._lock = threading.RLock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_schema()
+
+    # ============= 表结构 =============
+
+    def _init_schema(self):
+        """创建表结构，版本不一致或图片目录变化时重建索引"""
+        with self._lock:
+            conn = self._conn
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS images")
+                conn.execute("DROP TABLE IF EXISTS meta")
+
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS images (
+                    name TEXT PRIMARY KEY,
+                    stem TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    valid INTEGER NOT NULL,
+                    width INTEGER,
+                    height INTEGER,
+                    format TEXT,
+                    annotated INTEGER NOT NULL DEFAULT 0,
+                    annotation_mtime_ns INTEGER,
+                    overall_status TEXT,
+                    fingerprint TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_images_fingerprint ON images(fingerprint)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_images_stem ON images(stem)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_images_mtime ON images(valid, mtime_ns, name)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_images_size ON images(valid, size, name)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_images_status ON images(valid, overall_status, name)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_images_annotated ON images(valid, annotated, name)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+            conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+            # 图片目录被切换后，旧索引全部作废
+            if self._get_meta('images_dir') != str(self.images_dir):
+                conn.execute("DELETE FROM images")
+                conn.execute("DELETE FROM meta")
+                self._set_meta('images_dir', str(self.images_dir))
+            conn.commit()
+
+    def _get_meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, None if value is None else str(value))
+        )
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    # ============= 扫描与刷新 =============
+
+    def _dir_mtime_ns(self):
+        try:
+            return self.images_dir.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def is_stale(self):
+        """
+        判断索引是否需要刷新
+
+        从未扫描过，或图片目录自身的修改时间变化（有文件新增/删除/重命名）时返回 True。
+        原地覆盖写入的文件不会改变目录时间，需要调用 refresh() 显式刷新。
+        """
+        with self._lock:
+            last_scan = self._get_meta('last_scan')
+            dir_mtime = self._get_meta('dir_mtime_ns')
+        if last_scan is None:
+            return True
+        return dir_mtime != str(self._dir_mtime_ns())
+
+    def refresh(self, force=False):
+        """
+        增量刷新索引
+
+        Args:
+            force: 为 True 时忽略缓存，重新校验所有文件
+
+        Returns:
+            dict: 本次扫描的统计信息
+        """
+        started = time.perf_counter()
+        stats = {"scanned": 0, "added": 0, "updated": 0, "removed": 0, "invalid": 0}
+        dir_mtime = self._dir_mtime_ns()
+
+        with self._lock:
+            known = {
+                row['name']: (row['size'], row['mtime_ns'])
+                for row in self._conn.execute("SELECT name, size, mtime_ns FROM images")
+            }
+
+        seen = set()
+        changed_rows = []
+        if self.images_dir.exists():
+            with os.scandir(self.images_dir) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    if os.path.splitext(entry.name)[1].lower() not in self.extensions:
+                        continue
+
+                    stats["scanned"] += 1
+                    seen.add(entry.name)
+                    st = entry.stat()
+                    fingerprint = (st.st_size, st.st_mtime_ns)
+
+                    previous = known.get(entry.name)
+                    if not force and previous == fingerprint:
+                        continue
+
+                    valid, width, height, fmt, fingerprint = self._probe_image(Path(entry.path), st.st_size)
+                    if not valid:
+                        stats["invalid"] += 1
+                    stats["updated" if previous else "added"] += 1
+                    changed_rows.append((
+                        entry.name, os.path.splitext(entry.name)[0],
+                        st.st_size, st.st_mtime_ns, int(valid), width, height, fmt, fingerprint
+                    ))
+
+        removed = [(name,) for name in known if name not in seen]
+        stats["removed"] = len(removed)
+
+        with self._lock:
+            conn = self._conn
+            conn.executemany(self._UPSERT_SQL, changed_rows)
+            conn.executemany("DELETE FROM images WHERE name = ?", removed)
+            self._sync_annotated()
+            self._set_meta('last_scan', datetime.now().isoformat())
+            self._set_meta('dir_mtime_ns', dir_mtime)
+            conn.commit()
+
+        stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if changed_rows or removed:
+            print(f"[信息] 图片索引已刷新: 新增 {stats['added']}，更新 {stats['updated']}，"
+                  f"删除 {stats['removed']}，耗时 {stats['elapsed_ms']}ms")
+        return stats
+
+    def _sync_annotated(self):
+        """根据标注存储同步标注状态和 overall_status（调用方需持有锁）"""
+        annotation_mtimes = self.annotation_store.versions()
+
+        updates = []
+        status_cache = {}
+        for row in self._conn.execute("SELECT name, stem, annotation_mtime_ns FROM images"):
+            mtime_ns = annotation_mtimes.get(row['stem'])
+            if mtime_ns == row['annotation_mtime_ns']:
+                continue
+            if mtime_ns is None:
+                updates.append((0, None, None, row['name']))
+                continue
+            # 只解析发生变化的标注
+            if row['stem'] not in status_cache:
+                status_cache[row['stem']] = self._read_overall_status(row['stem'])
+            updates.append((1, mtime_ns, status_cache[row['stem']], row['name']))
+
+        self._conn.executemany("""
+            UPDATE images SET annotated = ?, annotation_mtime_ns = ?, overall_status = ?
+            WHERE name = ?
+        """, updates)
+
+    def _read_overall_status(self, stem):
+        """从标注中读取 overall_status"""
+        try:
+            return self._extract_status(self.annotation_store.load(stem))
+        except Exception as e:
+            print(f"[错误] 读取标注状态失败 {stem}: {e}")
+            return None
+
+    @staticmethod
+    def _extract_status(annotation):
+        status = annotation.get('overall_status') if isinstance(annotation, dict) else None
+        return status if isinstance(status, str) else None
+
+    # ============= 增量更新 =============
+
+    def update_images(self, names):
+        """
+        按文件名增量更新索引（供目录监听使用）
+
+        Returns:
+            list: 变更事件，见 ChangeFeed
+        """
+        events = []
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() not in self.extensions:
+                continue
+
+            path = self.images_dir / name
+            try:
+                st = path.stat()
+                is_file = path.is_file()
+            except FileNotFoundError:
+                st, is_file = None, False
+
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT size, mtime_ns, valid FROM images WHERE name = ?", (name,)
+                ).fetchone()
+
+            if not is_file:
+                if row:
+                    self.remove(name)
+                    if row['valid']:
+                        events.append({"action": "delete", "name": name})
+                continue
+
+            if row and (row['size'], row['mtime_ns']) == (st.st_size, st.st_mtime_ns):
+                continue
+
+            valid, width, height, fmt, fingerprint = self._probe_image(path, st.st_size)
+            stem = os.path.splitext(name)[0]
+            with self._lock:
+                self._conn.execute(self._UPSERT_SQL, (
+                    name, stem, st.st_size, st.st_mtime_ns, int(valid), width, height, fmt, fingerprint
+                ))
+                self._refresh_annotation(stem)
+                self._conn.commit()
+
+            if valid:
+                events.append({"action": "upsert", "image": self.get_image(name)})
+            elif row and row['valid']:
+                events.append({"action": "delete", "name": name})
+        return events
+
+    def update_annotations(self, stems):
+        """
+        按标注文件名增量更新标注状态（供目录监听使用）
+
+        Returns:
+            list: 变更事件
+        """
+        events = []
+        for stem in sorted(stems):
+            with self._lock:
+                changed = self._refresh_annotation(stem)
+                self._conn.commit()
+            if changed:
+                events.extend({"action": "upsert", "image": image} for image in self.get_images_by_stem(stem))
+        return events
+
+    def _refresh_annotation(self, stem):
+        """重新读取单个标注的状态，返回是否有变化（调用方需持有锁）"""
+        stat = self.annotation_store.stat(stem)
+        mtime_ns = stat[0] if stat else None
+
+        rows = self._conn.execute(
+            "SELECT annotation_mtime_ns FROM images WHERE stem = ?", (stem,)
+        ).fetchall()
+        if not rows or all(row['annotation_mtime_ns'] == mtime_ns for row in rows):
+            return False
+
+        status = self._read_overall_status(stem) if mtime_ns is not None else None
+        self._conn.execute("""
+            UPDATE images SET annotated = ?, annotation_mtime_ns = ?, overall_status = ?
+            WHERE stem = ?
+        """, (int(mtime_ns is not None), mtime_ns, status, stem))
+        return True
+
+    def mark_dir_scanned(self):
+        """记录当前目录修改时间（增量事件已处理完毕，无需再全量扫描）"""
+        with self._lock:
+            if self._get_meta('last_scan') is None:
+                return
+            self._set_meta('dir_mtime_ns', self._dir_mtime_ns())
+            self._conn.commit()
+
+    def _probe_image(self, file_path, file_size):
+        """
+        校验图片，读取尺寸并计算内容指纹
+
+        Returns:
+            tuple: (是否有效, 宽, 高, 格式, 指纹)
+        """
+        # 检查文件大小（太小的文件很可能不是真正的图片）
+        if file_size < self.MIN_IMAGE_SIZE:
+            print(f"[警告] 跳过无效图片文件: {file_path.name}")
+            return False, None, None, None, None
+
+        try:
+            # 使用 PIL 尝试打开图片来验证
+            with Image.open(file_path) as img:
+                width, height = img.size
+                fmt = img.format
+                img.verify()  # 验证图片完整性
+            return True, width, height, fmt, content_fingerprint(file_path, self.full_hash)
+        except Exception as e:
+            print(f"[错误] 检查图片文件失败 {file_path.name}: {e}")
+            return False, None, None, None, None
+
+    # ============= 查询与更新 =============
+
+    def list_images(self):
+        """返回所有有效图片（按名称排序）"""
+        return self.query_images()["images"]
+
+    def query_images(self, annotated=None, prefix=None, search=None, modified_since=None,
+                     status=None, sort='name', order='asc', offset=0, limit=None, cursor=None):
+        """
+        分页查询图片
+
+        Args:
+            annotated: True/False 按标注状态过滤，None 不过滤
+            prefix: 文件名前缀
+            search: 文件名包含的子串（不区分大小写）
+            modified_since: 只返回修改时间晚于该时间的图片（datetime）
+            status: overall_status 取值
+            sort: 排序字段，见 SORT_KEYS
+            order: 'asc' 或 'desc'
+            offset: 偏移量分页
+            limit: 每页数量，None 表示不分页
+            cursor: 游标分页（上一页返回的 next_cursor），优先于 offset
+
+        Returns:
+            dict: images / total / counts / next_cursor
+        """
+        if sort not in self.SORT_KEYS:
+            raise ValueError(f"不支持的排序字段: {sort}，可选: {', '.join(self.SORT_KEYS)}")
+        if order not in ('asc', 'desc'):
+            raise ValueError(f"不支持的排序方向: {order}")
+        column = self.SORT_KEYS[sort]
+
+        where = ["valid = 1"]
+        params = []
+        if annotated is not None:
+            where.append("annotated = ?")
+            params.append(int(annotated))
+        if prefix:
+            # 使用范围条件以便命中主键索引
+            where.append("name >= ? AND name < ?")
+            params.extend([prefix, prefix + '\U0010ffff'])
+        if search:
+            escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            where.append("name LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        if modified_since is not None:
+            where.append("mtime_ns > ?")
+            params.append(int(modified_since.timestamp() * 1e9))
+        if status:
+            where.append("overall_status = ?")
+            params.append(status)
+        filter_sql = " AND ".join(where)
+
+        page_where = list(where)
+        page_params = list(params)
+        if cursor:
+            last_value, last_name = self._decode_cursor(cursor)
+            op = '>' if order == 'asc' else '<'
+            # NULL 排在最前（升序）/ 最后（降序），用 COALESCE 保证比较有效
+            key = f"COALESCE({column}, '')" if column == 'overall_status' else column
+            page_where.append(f"({key} {op} ? OR ({key} = ? AND name {op} ?))")
+            page_params.extend([last_value, last_value, last_name])
+            offset = 0
+
+        direction = 'ASC' if order == 'asc' else 'DESC'
+        order_key = f"COALESCE({column}, '')" if column == 'overall_status' else column
+        sql = (f"SELECT name, size, mtime_ns, width, height, annotated, overall_status, fingerprint "
+               f"FROM images WHERE {' AND '.join(page_where)} "
+               f"ORDER BY {order_key} {direction}, name {direction}")
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            page_params.extend([int(limit), int(offset)])
+        elif offset:
+            sql += " LIMIT -1 OFFSET ?"
+            page_params.append(int(offset))
+
+        with self._lock:
+            rows = self._conn.execute(sql, page_params).fetchall()
+            total = self._conn.execute(
+                f"SELECT COUNT(*) FROM images WHERE {filter_sql}", params
+            ).fetchone()[0]
+            count_row = self._conn.execute("""
+                SELECT COUNT(*) AS total, COALESCE(SUM(annotated), 0) AS annotated
+                FROM images WHERE valid = 1
+            """).fetchone()
+
+        next_cursor = None
+        if limit is not None and len(rows) == int(limit) and rows:
+            last = rows[-1]
+            last_value = last[column]
+            if column == 'overall_status' and last_value is None:
+                last_value = ''
+            next_cursor = self._encode_cursor(last_value, last['name'])
+
+        return {
+            "images": [self._row_to_dict(row) for row in rows],
+            "total": total,
+            "counts": {
+                "all": count_row['total'],
+                "annotated": count_row['annotated'],
+                "unannotated": count_row['total'] - count_row['annotated']
+            },
+            "next_cursor": next_cursor
+        }
+
+    @staticmethod
+    def _encode_cursor(value, name):
+        raw = json.dumps([value, name], ensure_ascii=False).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        try:
+            value, name = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return value, name
+        except Exception:
+            raise ValueError("无效的分页游标")
+
+    def _row_to_dict(self, row):
+        return {
+            "name": row['name'],
+            "path": str((self.images_dir / row['name']).relative_to(self.images_dir.parent)),
+            "annotated": bool(row['annotated']),
+            "size": row['size'],
+            "modified": datetime.fromtimestamp(row['mtime_ns'] / 1e9).isoformat(),
+            "width": row['width'],
+            "height": row['height'],
+            "overall_status": row['overall_status'],
+            # 内容版本号，可附加在图片 URL 上实现永久缓存
+            "version": self.version_of(row['fingerprint'])
+        }
+
+    @staticmethod
+    def version_of(fingerprint):
+        """由内容指纹得到较短的版本号"""
+        return fingerprint[-16:] if fingerprint else None
+
+    def get_image(self, name):
+        """获取单张有效图片的信息，不存在时返回 None"""
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT name, size, mtime_ns, width, height, annotated, overall_status, fingerprint
+                FROM images WHERE name = ? AND valid = 1
+            """, (name,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def get_images_by_stem(self, stem):
+        """获取共用同一标注文件的所有有效图片"""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT name, size, mtime_ns, width, height, annotated, overall_status, fingerprint
+                FROM images WHERE stem = ? AND valid = 1 ORDER BY name
+            """, (stem,)).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def get_fingerprint(self, name, size, mtime_ns):
+        """
+        读取已缓存的内容指纹
+
+        仅当索引中的大小和修改时间与传入值一致、且满足当前哈希模式时返回，否则返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, fingerprint FROM images WHERE name = ?", (name,)
+            ).fetchone()
+        if row and (row['size'], row['mtime_ns']) == (size, mtime_ns) \
+                and is_acceptable(row['fingerprint'], self.full_hash):
+            return row['fingerprint']
+        return None
+
+    def set_fingerprint(self, name, size, mtime_ns, fingerprint):
+        """回写按需计算的指纹（文件在此期间未变化时才生效）"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE images SET fingerprint = ? WHERE name = ? AND size = ? AND mtime_ns = ?",
+                (fingerprint, name, size, mtime_ns)
+            )
+            self._conn.commit()
+
+    def count_fingerprint(self, fingerprint, exclude_name=None):
+        """内容相同的其他图片数量"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM images WHERE fingerprint = ? AND name != ?",
+                (fingerprint, exclude_name or '')
+            ).fetchone()[0]
+
+    def set_annotated(self, stem, annotation):
+        """
+        更新某个标注文件对应图片的标注状态
+
+        Args:
+            stem: 标注文件名（不含扩展名）
+            annotation: 标注数据，None 表示标注已删除
+        """
+        stat = self.annotation_store.stat(stem) if annotation is not None else None
+        mtime_ns = stat[0] if stat else None
+        with self._lock:
+            self._conn.execute("""
+                UPDATE images SET annotated = ?, annotation_mtime_ns = ?, overall_status = ?
+                WHERE stem = ?
+            """, (int(annotation is not None), mtime_ns, self._extract_status(annotation), stem))
+            self._conn.commit()
+
+    def remove(self, name):
+        """从索引中移除图片"""
+        with self._lock:
+            self._conn.execute("DELETE FROM images WHERE name = ?", (name,))
+            self._conn.commit()
+
+    def get_stats(self):
+        """索引概况"""
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT COUNT(*) AS total,
+                       COALESCE(SUM(valid), 0) AS valid,
+                       COALESCE(SUM(CASE WHEN valid = 1 THEN annotated ELSE 0 END), 0) AS annotated
+                FROM images
+            """).fetchone()
+            last_scan = self._get_meta('last_scan')
+        return {
+            "total": row['total'],
+            "valid": row['valid'],
+            "invalid": row['total'] - row['valid'],
+            "annotated": row['annotated'],
+            "last_scan": last_scan
+        }
@@ -2,10 +2,18 @@
 图片管理服务
 """
 import os
+import threading
 from pathlib import Path
-from datetime import datetime
-from PIL import Image
-import hashlib
+
+from .image_catalog import ImageCatalog
+from .change_feed import ChangeFeed
+from .file_watcher import FileWatcher
+from .thumbnail_pool import ThumbnailPool
+from .thumbnail_renderer import THUMBNAIL_PROFILES, DEFAULT_PROFILE
+from .derivative_cache import DerivativeCache
+from .fingerprint import content_fingerprint
+from .annotation_store import FileAnnotationStore
+from utils.process_lock import ProcessLock
 
 
 class ImageService:
@@ -13,60 +21,291 @@ class ImageService:
     
     SUPPORTED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.mpo']
     THUMBNAIL_SIZE = (400, 400)  # 缩略图尺寸（提升质量）
+    PROGRESSIVE = 'progressive'  # 原图分辨率的渐进式 JPEG
+    PROGRESSIVE_SIZE = (65500, 65500)  # 不缩小（JPEG 最大边长 65535）
+    
+    def __init__(self, images_dir, annotations_dir, thumbnail_workers=None, prewarm_thumbnails=False,
+                 thumbnail_profile=DEFAULT_PROFILE, preview_size=1600, cache_max_mb=2048,
+                 full_hash=False, annotation_store=None, progressive_cache_max_mb=2048):
+        # 缩略图生成池（跨目录切换复用）
+        self.thumbnail_pool = ThumbnailPool(thumbnail_workers)
+        # 缩略图质量/速度档位（quality / balanced / fast）
+        self.thumbnail_profile = thumbnail_profile if thumbnail_profile in THUMBNAIL_PROFILES else DEFAULT_PROFILE
+        # 衍生图尺寸及缓存容量上限（0 表示不限制）
+        self.variants = {
+            "thumb": (self.THUMBNAIL_SIZE, None),
+            "preview": ((preview_size, preview_size), "quality"),
+            self.PROGRESSIVE: (self.PROGRESSIVE_SIZE, "progressive")
+        }
+        self.cache_max_bytes = int(cache_max_mb or 0) * 1024 * 1024
+        # 原图分辨率的渐进式 JPEG 单独计算容量，放大浏览大量原图时不会挤出缩略图
+        self.cache_budgets = {self.PROGRESSIVE: int(progressive_cache_max_mb or 0) * 1024 * 1024}
+        # 内容指纹是否哈希完整文件（默认只哈希头/中/尾）
+        self.full_hash = full_hash
+        # 新增/变化的图片是否在后台预生成缩略图
+        self._prewarm_enabled = prewarm_thumbnails
+        self._prewarm_lock = None
+        self.catalog = None
+        self.watcher = None
+        self._watch_options = None
+        # 图片列表的增量变更（供前端订阅）
+        self.changes = ChangeFeed()
+        # 标注存储后端（通常与 AnnotationService 共用）；未提供时直接读取标注目录中的 JSON 文件
+        self._owns_annotation_store = annotation_store is None
+        self.annotation_store = annotation_store or FileAnnotationStore(annotations_dir, cache_size=0)
+        self.reconfigure(images_dir, annotations_dir)
+    
+    @property
+    def prewarm_thumbnails(self):
+        """
+        本进程是否负责预生成缩略图
+        
+        多 worker 部署时由持有缩略图目录锁的一个进程预生成，其余进程只在请求时生成；
+        持有锁的进程退出后由下一个检查的进程接替。
+        """
+        return self._prewarm_enabled and self._prewarm_lock.acquire()
     
-    def __init__(self, images_dir, annotations_dir):
+    def reconfigure(self, images_dir, annotations_dir):
+        """切换图片/标注目录（配置更新时调用）"""
+        reconfiguring = self.catalog is not None
+        watching = self.watcher is not None
+        if watching:
+            self.stop_watcher()
+        if reconfiguring:
+            self.catalog.close()
+        
         self.images_dir = Path(images_dir)
         self.annotations_dir = Path(annotations_dir)
-        # 缩略图目录
+        if self._owns_annotation_store and self.annotation_store.annotations_dir != self.annotations_dir:
+            self.annotation_store.reconfigure(self.annotations_dir)
+        # 缩略图目录（衍生图缓存）
         self.thumbnails_dir = self.images_dir.parent / 'thumbnails'
         self.thumbnails_dir.mkdir(parents=True, exist_ok=True)
+        if self._prewarm_lock is not None:
+            self._prewarm_lock.release()
+        self._prewarm_lock = ProcessLock(self.thumbnails_dir / '.prewarm.lock')
+        self._purge_legacy_thumbnails()
+        self.derivatives = DerivativeCache(
+            self.thumbnails_dir,
+            self.thumbnail_pool,
+            self.cache_max_bytes,
+            self.thumbnail_profile,
+            self.fingerprint,
+            variants=self.variants,
+            budgets=self.cache_budgets
+        )
+        # 图片索引（与缩略图目录同级）
+        self.catalog = ImageCatalog(
+            self.images_dir.parent / 'image_catalog.db',
+            self.images_dir,
+            self.annotation_store,
+            self.SUPPORTED_EXTENSIONS,
+            full_hash=self.full_hash
+        )
+        
+        if watching:
+            self.start_watcher(**self._watch_options)
+        if reconfiguring:
+            # 目录已切换，订阅方需要重新拉取列表
+            self.changes.publish([{"action": "reset"}])
     
-    def get_all_images(self):
-        """获取所有图片列表"""
-        images = []
-        
-        for file in self.images_dir.iterdir():
-            if file.is_file() and file.suffix.lower() in self.SUPPORTED_EXTENSIONS:
-                # 验证是否为真正的图片文件
-                is_valid_image = self._is_valid_image_file(file)
-                
-                if not is_valid_image:
-                    print(f"[警告] 跳过无效图片文件: {file.name}")
-                    continue
-                
-                # 检查是否有对应的标注文件
-                annotation_file = self.annotations_dir / f"{file.stem}.json"
-                
-                images.append({
-                    "name": file.name,
-                    "path": str(file.relative_to(self.images_dir.parent)),
-                    "annotated": annotation_file.exists(),
-                    "size": file.stat().st_size,
-                    "modified": datetime.fromtimestamp(file.stat().st_mtime).isoformat()
-                })
-        
-        # 按名称排序
-        images.sort(key=lambda x: x['name'])
-        return images
-    
-    def _is_valid_image_file(self, file_path):
-        """检查文件是否为有效的图片"""
-        try:
-            # 检查文件大小（太小的文件很可能不是真正的图片）
-            if file_path.stat().st_size < 100:
-                return False
-            
-            # 使用 PIL 尝试打开图片来验证
-            with Image.open(file_path) as img:
-                img.verify()  # 验证图片完整性
-            return True
-        except Exception as e:
-            print(f"[错误] 检查图片文件失败 {file_path.name}: {e}")
-            return False
+    def start_watcher(self, poll_interval=5.0, use_inotify=True):
+        """启动后台目录监听，增量更新索引并发布变更"""
+        self._watch_options = {"poll_interval": poll_interval, "use_inotify": use_inotify}
+        # 先完成一次扫描，之后只处理增量事件
+        self._refresh_catalog()
+        self.watcher = FileWatcher(
+            self.images_dir,
+            self.annotations_dir,
+            self._on_files_changed,
+            poll_interval=poll_interval,
+            use_inotify=use_inotify
+        )
+        self.watcher.start()
+    
+    def stop_watcher(self):
+        """停止后台目录监听"""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+    
+    def _on_files_changed(self, image_names, annotation_stems, overflow):
+        """目录监听回调"""
+        if overflow:
+            print("[警告] 目录事件丢失，执行全量刷新")
+            self._refresh_catalog()
+            self.annotation_store.refresh()
+            return
+        
+        # 标注文件被直接修改/删除时通知标注存储的监听器（如数据集统计）
+        self.annotation_store.refresh(annotation_stems)
+        events = self.catalog.update_images(image_names)
+        events += self.catalog.update_annotations(annotation_stems)
+        self.catalog.mark_dir_scanned()
+        self.changes.publish(events)
+        
+        if self.prewarm_thumbnails:
+            self.warm_thumbnails(
+                event["image"]["name"] for event in events
+                if event["action"] == "upsert" and event["image"]["name"] in image_names
+            )
+    
+    def sync_annotations(self, stems):
+        """标注在其他进程中被修改后（SQLite 存储的多 worker 部署）同步索引中的标注状态"""
+        if stems:
+            self.changes.publish(self.catalog.update_annotations(stems))
+    
+    def _refresh_catalog(self, force=False):
+        """扫描目录更新索引，有变化时通知订阅方重新拉取"""
+        stats = self.catalog.refresh(force=force)
+        if stats["added"] or stats["updated"] or stats["removed"]:
+            self.changes.publish([{"action": "reset"}])
+        if self.prewarm_thumbnails and (stats["added"] or stats["updated"]):
+            self.warm_thumbnails_async()
+        return stats
+    
+    def get_all_images(self, refresh=False):
+        """
+        获取所有图片列表（从索引读取）
+        
+        Args:
+            refresh: 是否先强制扫描图片目录
+        """
+        # 索引为空或目录有新增/删除文件时增量刷新，其余情况直接读索引
+        if refresh or self.catalog.is_stale():
+            self._refresh_catalog()
+        return self.catalog.list_images()
+    
+    def query_images(self, refresh=False, **filters):
+        """
+        分页/过滤/排序查询图片列表
+        
+        Args:
+            refresh: 是否先强制扫描图片目录
+            **filters: 透传给 ImageCatalog.query_images 的过滤与分页参数
+            
+        Returns:
+            dict: images / total / counts / next_cursor
+        """
+        if refresh or self.catalog.is_stale():
+            self._refresh_catalog()
+        return self.catalog.query_images(**filters)
+    
+    def refresh_images(self, force=False):
+        """
+        重新扫描图片目录，更新索引
+        
+        Args:
+            force: 为 True 时重新校验所有文件，否则只校验变化的文件
+            
+        Returns:
+            dict: 扫描统计信息
+        """
+        stats = self._refresh_catalog(force=force)
+        stats["catalog"] = self.catalog.get_stats()
+        return stats
+    
+    def on_annotation_changed(self, image_name, annotation):
+        """标注保存/删除后同步索引中的标注状态"""
+        stem = Path(image_name).stem
+        self.catalog.set_annotated(stem, annotation)
+        self.changes.publish([
+            {"action": "upsert", "image": image} for image in self.catalog.get_images_by_stem(stem)
+        ])
+    
+    def get_changes(self, since, timeout=0):
+        """
+        获取序号大于 since 的图片列表变更
+        
+        Args:
+            since: 客户端已收到的最后一个序号
+            timeout: 没有新变更时最长等待秒数（长轮询）
+            
+        Returns:
+            dict: events / last_seq / reset
+        """
+        if timeout > 0:
+            events, truncated = self.changes.wait(since, timeout)
+        else:
+            events, truncated = self.changes.since(since)
+        return self._changes_result(since, events, truncated)
+    
+    async def get_changes_async(self, since, timeout=0):
+        """get_changes 的协程版本，长轮询等待期间不占用线程（ASGI 入口使用）"""
+        if timeout > 0:
+            events, truncated = await self.changes.wait_async(since, timeout)
+        else:
+            events, truncated = self.changes.since(since)
+        return self._changes_result(since, events, truncated)
+    
+    @staticmethod
+    def _changes_result(since, events, truncated):
+        return {
+            "events": events,
+            "last_seq": events[-1]["seq"] if events else max(since, 0),
+            "reset": truncated or any(event["action"] == "reset" for event in events)
+        }
+    
+    def fingerprint(self, image_path):
+        """
+        获取图片内容指纹（优先使用索引中缓存的值）
+        
+        Args:
+            image_path: 图片路径
+            
+        Returns:
+            str: 内容指纹
+        """
+        image_path = Path(image_path)
+        st = image_path.stat()
+        in_catalog = image_path.parent == self.images_dir
+        if in_catalog:
+            cached = self.catalog.get_fingerprint(image_path.name, st.st_size, st.st_mtime_ns)
+            if cached:
+                return cached
+        
+        fingerprint = content_fingerprint(image_path, self.full_hash)
+        if in_catalog:
+            self.catalog.set_fingerprint(image_path.name, st.st_size, st.st_mtime_ns, fingerprint)
+        return fingerprint
+    
+    def get_image_etag(self, filename, size=DerivativeCache.ORIGINAL):
+        """
+        获取图片（或衍生图）的 ETag 与内容版本号，无需读取或生成图片本身
+        
+        Args:
+            filename: 原始图片文件名
+            size: 'thumb' / 'preview' / 'original'
+            
+        Returns:
+            tuple: (etag, version)
+        """
+        image_path = self.get_image_path(filename)
+        fingerprint = self.fingerprint(image_path)
+        if size == DerivativeCache.ORIGINAL:
+            etag = fingerprint
+        elif size in self.derivatives.variants:
+            etag = self.derivatives.derivative_key(fingerprint, size)
+        else:
+            raise ValueError(f"不支持的尺寸: {size}")
+        return etag, ImageCatalog.version_of(fingerprint)
+    
+    def resolve_size(self, filename, size):
+        """
+        实际发送的尺寸
+        
+        progressive 尚未生成时先发送原图（支持 Range），同时在后台生成，之后的请求即可渐进显示；
+        其余尺寸原样返回
+        """
+        if size != self.PROGRESSIVE:
+            return size
+        if self.derivatives.peek(self.get_image_path(filename), size) is None:
+            return DerivativeCache.ORIGINAL
+        return size
     
     def generate_thumbnail(self, image_path):
         """
-        生成缩略图
+        生成缩略图（通过衍生图缓存，同一文件的并发请求只生成一次）
         
         Args:
             image_path: 原始图片路径
@@ -74,40 +313,9 @@ class ImageService:
         Returns:
             Path: 缩略图路径，失败返回 None
         """
+        image_path = Path(image_path)
         try:
-            image_path = Path(image_path)
-            
-            # 缩略图文件名：使用原文件名
-            thumbnail_path = self.thumbnails_dir / f"{image_path.stem}_thumb{image_path.suffix}"
-            
-            # 检查缩略图是否已存在且是最新的
-            if thumbnail_path.exists():
-                # 比较修改时间，如果缩略图比原图新，直接返回
-                if thumbnail_path.stat().st_mtime >= image_path.stat().st_mtime:
-                    return thumbnail_path
-            
-            # 生成新缩略图
-            with Image.open(image_path) as img:
-                # 转换RGBA到RGB（处理PNG透明背景）
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # 生成缩略图（保持宽高比）
-                img.thumbnail(self.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-                
-                # 保存为JPEG格式（提升质量）
-                thumbnail_path = self.thumbnails_dir / f"{image_path.stem}_thumb.jpg"
-                img.save(thumbnail_path, 'JPEG', quality=90, optimize=True)
-                
-                print(f"[信息] 已生成缩略图: {thumbnail_path.name}")
-                return thumbnail_path
-                
+            return self.derivatives.get(image_path, 'thumb')
         except Exception as e:
             print(f"[错误] 生成缩略图失败 {image_path.name}: {e}")
             return None
@@ -127,22 +335,100 @@ class ImageService:
         if not image_path.exists():
             raise FileNotFoundError(f"原始图片不存在: {filename}")
         
-        # 缩略图统一使用 .jpg 格式
-        # 从原文件名中提取basename（不含扩展名）
-        basename = Path(filename).stem
-        thumbnail_filename = f"{basename}_thumb.jpg"
-        thumbnail_path = self.thumbnails_dir / thumbnail_filename
-        
-        # 如果缩略图不存在或过期，生成新的
-        if not thumbnail_path.exists() or thumbnail_path.stat().st_mtime < image_path.stat().st_mtime:
-            thumbnail_path = self.generate_thumbnail(image_path)
+        thumbnail_path = self.generate_thumbnail(image_path)
         
         # 如果生成失败，返回原图
         return thumbnail_path if thumbnail_path else image_path
     
+    def get_derivative_path(self, filename, size):
+        """
+        获取指定尺寸的图片路径
+        
+        Args:
+            filename: 原始图片文件名
+            size: 'thumb' / 'preview' / 'original'
+            
+        Returns:
+            Path: 衍生图路径（original 返回原图）
+        """
+        image_path = self.get_image_path(filename)
+        if size == DerivativeCache.ORIGINAL:
+            return image_path
+        return self.derivatives.get(image_path, size)
+    
+    def get_thumbnail_batch(self, names):
+        """
+        批量获取缩略图
+        
+        Args:
+            names: 图片文件名列表
+            
+        Returns:
+            list: [(文件名, 内容版本号, 缩略图路径或异常对象)]
+        """
+        image_paths = []
+        versions = []
+        for name in names:
+            try:
+                image_path = self.get_image_path(name)
+                versions.append(ImageCatalog.version_of(self.fingerprint(image_path)))
+                image_paths.append(image_path)
+            except Exception as e:
+                versions.append(e)
+                image_paths.append(None)
+        
+        valid = [path for path in image_paths if path is not None]
+        thumbnails = iter(self.derivatives.get_many(valid, 'thumb'))
+        return [
+            (name, None, version) if isinstance(version, Exception) else (name, version, next(thumbnails))
+            for name, version in zip(names, versions)
+        ]
+    
+    def warm_thumbnails(self, names=None):
+        """
+        在后台预生成缩略图
+        
+        Args:
+            names: 图片文件名列表，None 表示索引中的所有图片
+            
+        Returns:
+            int: 加入队列的任务数
+        """
+        if names is None:
+            names = [image["name"] for image in self.catalog.list_images()]
+        return self.derivatives.warm((self.images_dir / name for name in names), 'thumb')
+    
+    def warm_thumbnails_async(self):
+        """在后台线程中检查并预热所有缺失的缩略图（避免阻塞启动）"""
+        threading.Thread(target=self.warm_thumbnails, name='thumbnail-warmup', daemon=True).start()
+    
+    def get_thumbnail_stats(self):
+        """缩略图池及衍生图缓存统计"""
+        return {
+            **self.thumbnail_pool.get_stats(),
+            "profile": self.thumbnail_profile,
+            "cache": self.derivatives.get_stats()
+        }
+    
+    def _purge_legacy_thumbnails(self):
+        """清理旧版本遗留的 {stem}_thumb.jpg 缩略图（已由衍生图缓存取代）"""
+        removed = 0
+        for file in self.thumbnails_dir.glob('*_thumb.*'):
+            if file.is_file():
+                try:
+                    file.unlink()
+                    removed += 1
+                except OSError:
+                    pass
+        if removed:
+            print(f"[信息] 已清理旧缩略图 {removed} 个")
+    
     def get_image_path(self, filename):
-        """获取图片的完整路径"""
-        image_path = self.images_dir / filename
+        """获取图片的完整路径（只允许图片目录内的文件）"""
+        relative = Path(filename)
+        if relative.is_absolute() or '..' in relative.parts:
+            raise ValueError(f"非法的文件路径: {filename}")
+        image_path = self.images_dir / relative
         
         if not image_path.exists():
             raise FileNotFoundError(f"文件不存在: {filename}")
@@ -175,25 +461,25 @@ class ImageService:
             tuple: (成功标志, 消息)
         """
         try:
-            # 1. 删除原始图片
+            # 1. 删除衍生图（内容相同的其他图片仍在使用时保留）
             image_path = self.images_dir / filename
-            if image_path.exists():
-                image_path.unlink()
-                print(f"[信息] 已删除图片: {filename}")
-            else:
+            if not image_path.exists():
                 return False, f"图片不存在: {filename}"
+            fingerprint = self.fingerprint(image_path)
+            if not self.catalog.count_fingerprint(fingerprint, exclude_name=filename):
+                self.derivatives.remove_fingerprint(fingerprint)
+            
+            # 2. 删除原始图片
+            image_path.unlink()
+            print(f"[信息] 已删除图片: {filename}")
+            
+            # 3. 删除标注
+            if self.annotation_store.delete(image_path.stem):
+                print(f"[信息] 已删除标注: {image_path.stem}")
             
-            # 2. 删除标注JSON文件
-            annotation_path = self.annotations_dir / f"{image_path.stem}.json"
-            if annotation_path.exists():
-                annotation_path.unlink()
-                print(f"[信息] 已删除标注文件: {annotation_path.name}")
-            
-            # 3. 删除缩略图
-            thumbnail_path = self.thumbnails_dir / f"{image_path.stem}_thumb.jpg"
-            if thumbnail_path.exists():
-                thumbnail_path.unlink()
-                print(f"[信息] 已删除缩略图: {thumbnail_path.name}")
+            # 4. 从索引中移除
+            self.catalog.remove(filename)
+            self.changes.publish([{"action": "delete", "name": filename}])
             
             return True, f"成功删除图片及相关文件: {filename}"
             
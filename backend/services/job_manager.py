@@ -0,0 +1,275 @@
+"""
+后台任务管理 - 批量操作的任务 ID 与进度查询
+"""
+import os
+import json
+import time
+import uuid
+import threading
+from pathlib import Path
+from datetime import datetime
+from collections import OrderedDict
+
+from .annotation_writer import atomic_write_text
+
+
+class Job:
+    """一个后台任务的状态与进度"""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    MAX_ERRORS = 100    # 最多记录的失败明细数
+
+    def __init__(self, kind, total=0, params=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.status = self.PENDING
+        self.total = total
+        self.processed = 0
+        self.succeeded = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors = []
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status in (self.COMPLETED, self.FAILED, self.CANCELLED)
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def advance(self, succeeded=0, skipped=0, failed=0, name=None, error=None):
+        """记录处理进度（线程安全）"""
+        with self._lock:
+            self.processed += succeeded + skipped + failed
+            self.succeeded += succeeded
+            self.skipped += skipped
+            self.failed += failed
+            if error is not None and len(self.errors) < self.MAX_ERRORS:
+                self.errors.append({"name": name, "error": str(error)})
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "params": self.params,
+                "status": self.status,
+                "total": self.total,
+                "processed": self.processed,
+                "succeeded": self.succeeded,
+                "skipped": self.skipped,
+                "failed": self.failed,
+                "progress": round(self.processed / self.total, 4) if self.total else (1.0 if self.finished else 0.0),
+                "errors": list(self.errors),
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at.isoformat(),
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None
+            }
+
+
+class SharedJob:
+    """其他进程（其他 worker）中的任务，只读的进度快照"""
+
+    def __init__(self, data):
+        self.id = data["id"]
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class JobManager:
+    """
+    在后台线程中运行任务，并保留最近的任务记录供查询
+
+    指定 state_dir 时，任务进度定期写入该目录下的快照，多 worker 部署时任意 worker
+    都能查询和取消其他 worker 中运行的任务（取消请求以标记文件传递给任务所在的进程）。
+    """
+
+    MAX_FINISHED = 50   # 保留的已结束任务数
+    SYNC_INTERVAL = 0.5 # 写入进度快照、检查取消标记的间隔（秒）
+    STALE_AFTER = 10    # 未结束任务的快照超过该时间（秒）未更新，视为所在进程已退出
+
+    def __init__(self, state_dir=None):
+        """
+        Args:
+            state_dir: 各进程共享的任务快照目录，None 表示任务只在本进程内可见
+        """
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self.state_dir = Path(state_dir) if state_dir else None
+        if self.state_dir is not None:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            threading.Thread(target=self._sync_loop, name='job-sync', daemon=True).start()
+
+    def submit(self, kind, target, total=0, params=None):
+        """
+        创建并启动任务
+
+        Args:
+            kind: 任务类型
+            target: 任务函数 target(job)，可通过 job.advance 报告进度、job.cancelled 检查取消；
+                    返回值保存在 job.result
+            total: 待处理总数
+            params: 任务参数（仅用于展示）
+
+        Returns:
+            Job: 新建的任务
+        """
+        job = Job(kind, total, params)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._write_snapshot(job)
+        self._prune_snapshots()
+
+        thread = threading.Thread(target=self._run, args=(job, target), name=f'job-{kind}', daemon=True)
+        thread.start()
+        return job
+
+    def _run(self, job, target):
+        job.status = Job.RUNNING
+        job.started_at = datetime.now()
+        try:
+            job.result = target(job)
+            job.status = Job.CANCELLED if job.cancelled else Job.COMPLETED
+        except Exception as e:
+            print(f"[错误] 后台任务失败 {job.kind} ({job.id}): {e}")
+            job.error = str(e)
+            job.status = Job.FAILED
+        finally:
+            job.finished_at = datetime.now()
+            print(f"[信息] 后台任务结束 {job.kind} ({job.id}): {job.status}，"
+                  f"成功 {job.succeeded}，跳过 {job.skipped}，失败 {job.failed}")
+            self._write_snapshot(job)
+
+    def _prune(self):
+        """只保留最近 MAX_FINISHED 个已结束任务（调用方需持有锁）"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.MAX_FINISHED)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """
+        Returns:
+            Job | SharedJob | None: 本进程的任务，或其他进程中任务的快照
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        data = self._read_snapshot(job_id)
+        return SharedJob(data) if data is not None else None
+
+    def list_jobs(self):
+        with self._lock:
+            jobs = [job.to_dict() for job in reversed(self._jobs.values())]
+        if self.state_dir is None:
+            return jobs
+        local = {job["id"] for job in jobs}
+        for path in self.state_dir.glob('*.json'):
+            if path.stem not in local:
+                data = self._read_snapshot(path.stem)
+                if data is not None:
+                    jobs.append(data)
+        jobs.sort(key=lambda job: job["created_at"], reverse=True)
+        return jobs
+
+    def cancel(self, job_id):
+        """请求取消任务，返回任务是否存在"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+            return True
+        data = self._read_snapshot(job_id)
+        if data is None:
+            return False
+        if data["status"] in (Job.PENDING, Job.RUNNING):
+            self._cancel_path(job_id).touch()
+        return True
+
+    # ============= 多进程共享 =============
+
+    def _snapshot_path(self, job_id):
+        return self.state_dir / f"{job_id}.json"
+
+    def _cancel_path(self, job_id):
+        return self.state_dir / f"{job_id}.cancel"
+
+    def _write_snapshot(self, job):
+        if self.state_dir is None:
+            return
+        # 串行写入，避免同步线程的旧进度覆盖任务结束时的最终状态
+        with self._snapshot_lock:
+            data = job.to_dict()
+            data["pid"] = os.getpid()
+            try:
+                atomic_write_text(self._snapshot_path(job.id), json.dumps(data, ensure_ascii=False))
+                if job.finished:
+                    self._cancel_path(job.id).unlink(missing_ok=True)
+            except OSError as e:
+                print(f"[警告] 写入任务快照失败 {job.id}: {e}")
+
+    def _read_snapshot(self, job_id):
+        """读取任务快照，长时间未更新的未结束任务标记为失败"""
+        if self.state_dir is None or not job_id.isalnum():
+            return None
+        path = self._snapshot_path(job_id)
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+            age = time.time() - path.stat().st_mtime
+        except (OSError, ValueError):
+            return None
+        if data.get("status") in (Job.PENDING, Job.RUNNING) and age > self.STALE_AFTER:
+            data["status"] = Job.FAILED
+            data["error"] = data.get("error") or "任务所在的进程已退出"
+        return data
+
+    def _prune_snapshots(self):
+        """只保留最近 MAX_FINISHED 个快照（仍在更新的快照不删除）"""
+        if self.state_dir is None:
+            return
+        snapshots = []
+        for path in self.state_dir.glob('*.json'):
+            try:
+                snapshots.append((path.stat().st_mtime, path))
+            except OSError:
+                pass
+        snapshots.sort(reverse=True)
+        now = time.time()
+        for mtime, path in snapshots[self.MAX_FINISHED:]:
+            if now - mtime > self.STALE_AFTER:
+                path.unlink(missing_ok=True)
+                self._cancel_path(path.stem).unlink(missing_ok=True)
+
+    def _sync_loop(self):
+        """定期写入本进程未结束任务的进度，并检查其他进程发来的取消请求"""
+        while True:
+            time.sleep(self.SYNC_INTERVAL)
+            with self._lock:
+                running = [job for job in self._jobs.values() if not job.finished]
+            for job in running:
+                if self._cancel_path(job.id).exists():
+                    job.cancel()
+                self._write_snapshot(job)
@@ -0,0 +1,187 @@
+"""
+标注结构迁移 - 比较新旧 json_fields，把已有标注改写为新结构
+"""
+import json
+import hashlib
+
+from .annotation_schema import AnnotationSchema
+
+
+class _Level:
+    """同一层级（顶层、对象字段或数组项）的迁移规则"""
+
+    __slots__ = ('fields', 'sources', 'drop', 'defaults', 'factories')
+
+    def __init__(self):
+        self.fields = []        # [(新字段名, 旧字段名或 None, 新类型, 子层级或 None)]
+        self.sources = {}       # 旧字段名 -> 新字段名（改名）
+        self.drop = set()       # 删除的旧字段
+        self.defaults = {}
+        self.factories = {}
+
+
+class FieldMigration:
+    """
+    由新旧字段配置生成的迁移规则
+
+    - 新增字段：补默认值（与未标注图片的默认值相同）
+    - 删除字段：从标注中移除
+    - 改名：由 renames 指定 {旧字段路径: 新字段名}，如 {"defect_categories.desc": "result"}
+    - 类型变化：尽量转换（如 "0.9" -> 0.9、"true" -> True、单个值 -> [值]），无法转换时使用默认值
+
+    对象字段和数组项按子字段配置递归迁移；配置之外的字段（image_name、updated_at 等）保持不变。
+    迁移是幂等的：对已迁移的标注再次执行不会产生变化，因此中断后可以安全地从检查点继续。
+    """
+
+    def __init__(self, old_fields, new_fields, renames=None):
+        """
+        Args:
+            old_fields: 修改前的 json_fields
+            new_fields: 修改后的 json_fields
+            renames: {旧字段路径: 新字段名}
+        """
+        self.renames = dict(renames or {})
+        self.plan = {"added": [], "removed": [], "renamed": {}, "retyped": {}}
+        self._root = self._compile(old_fields, new_fields, '')
+
+        unknown = set(self.renames) - set(self.plan["renamed"])
+        if unknown:
+            raise ValueError(f"改名的字段不存在: {', '.join(sorted(unknown))}")
+
+        signature = json.dumps([old_fields, new_fields, self.renames], sort_keys=True, ensure_ascii=False)
+        self.id = hashlib.sha1(signature.encode('utf-8')).hexdigest()[:12]
+
+    @property
+    def has_changes(self):
+        return any(self.plan.values())
+
+    # ============= 编译 =============
+
+    def _compile(self, old_configs, new_configs, prefix):
+        level = _Level()
+        old_by_name = {c['name']: c for c in old_configs if c.get('name')}
+        new_names = {c['name'] for c in new_configs if c.get('name')}
+        level.defaults, factories = AnnotationSchema._compile_defaults(new_configs)
+        level.factories = dict(factories)
+
+        # 改名：旧字段路径 -> 新字段名
+        renamed_to = {}
+        for old_name in old_by_name:
+            new_name = self.renames.get(f"{prefix}{old_name}")
+            if new_name is not None:
+                if new_name not in new_names:
+                    raise ValueError(f"改名的目标字段不在新配置中: {prefix}{new_name}")
+                renamed_to[new_name] = old_name
+                level.sources[old_name] = new_name
+                self.plan["renamed"][f"{prefix}{old_name}"] = f"{prefix}{new_name}"
+
+        for config in new_configs:
+            name = config.get('name')
+            if not name:
+                continue
+            path = f"{prefix}{name}"
+            new_type = config.get('type')
+            source = renamed_to.get(name)
+            if source is None and name in old_by_name and name not in level.sources:
+                source = name
+            old_config = old_by_name.get(source) if source else None
+
+            if old_config is None:
+                self.plan["added"].append(path)
+            elif old_config.get('type') != new_type:
+                self.plan["retyped"][path] = f"{old_config.get('type')} -> {new_type}"
+
+            children = None
+            if new_type in ('object', 'array') and (config.get('children') or (old_config or {}).get('children')):
+                old_children = old_config.get('children', []) if old_config and old_config.get('type') == new_type else []
+                children = self._compile(old_children, config.get('children') or [], f"{path}.")
+            level.fields.append((name, source, new_type, children))
+
+        for old_name in old_by_name:
+            if old_name not in level.sources and old_name not in new_names:
+                level.drop.add(old_name)
+                self.plan["removed"].append(f"{prefix}{old_name}")
+        return level
+
+    # ============= 迁移 =============
+
+    def apply(self, data):
+        """
+        迁移一条标注
+
+        Returns:
+            dict: 新标注（不修改传入的对象）
+        """
+        return self._migrate(data, self._root)
+
+    def _migrate(self, data, level):
+        result = {}
+        for key, value in data.items():
+            if key in level.drop:
+                continue
+            result[level.sources.get(key, key)] = value
+
+        for name, _source, field_type, children in level.fields:
+            if name not in result:
+                result[name] = self._default(level, name)
+                continue
+            value = self._coerce(result[name], field_type)
+            if value is _INVALID:
+                value = self._default(level, name)
+            elif children is not None:
+                if field_type == 'object':
+                    value = self._migrate(value, children)
+                else:
+                    value = [self._migrate(item, children) if isinstance(item, dict) else item for item in value]
+            result[name] = value
+        return result
+
+    @staticmethod
+    def _default(level, name):
+        factory = level.factories.get(name)
+        return factory() if factory is not None else level.defaults.get(name)
+
+    @staticmethod
+    def _coerce(value, field_type):
+        """转换为新类型，无法转换时返回 _INVALID；None 保持不变"""
+        if value is None:
+            return None
+        if field_type == 'string':
+            if isinstance(value, str):
+                return value
+            if isinstance(value, bool):
+                return 'true' if value else 'false'
+            if isinstance(value, (int, float)):
+                return str(value)
+            return json.dumps(value, ensure_ascii=False)
+        if field_type == 'number':
+            if isinstance(value, bool):
+                return int(value)
+            if isinstance(value, (int, float)):
+                return value
+            if isinstance(value, str):
+                try:
+                    return float(value.strip())
+                except ValueError:
+                    return _INVALID
+            return _INVALID
+        if field_type == 'boolean':
+            if isinstance(value, bool):
+                return value
+            if isinstance(value, (int, float)):
+                return value != 0
+            if isinstance(value, str):
+                lowered = value.strip().lower()
+                if lowered in ('true', '1', 'yes', '是'):
+                    return True
+                if lowered in ('false', '0', 'no', '否', ''):
+                    return False
+            return _INVALID
+        if field_type == 'array':
+            return value if isinstance(value, list) else [value]
+        if field_type == 'object':
+            return value if isinstance(value, dict) else _INVALID
+        return value
+
+
+_INVALID = object()
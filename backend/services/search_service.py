@@ -0,0 +1,373 @@
+"""
+标注搜索服务 - 字段取值索引 + 支持中日韩文字的全文倒排索引
+"""
+import re
+import bisect
+
+from .annotation_index import AnnotationIndex, array_group_key
+
+
+# 中日韩文字：按单字和相邻两字（bigram）建索引；其他文字按单词（小写）建索引
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af'
+_TOKEN_RE = re.compile(f'[{_CJK}]+|[^\\W{_CJK}]+')
+_CJK_RE = re.compile(f'[{_CJK}]')
+
+
+def tokenize(text):
+    """
+    索引用的分词
+
+    Returns:
+        set: 词项；中日韩文字为单字及相邻两字，其他为小写单词
+    """
+    tokens = set()
+    for run in _TOKEN_RE.findall(text):
+        if _CJK_RE.match(run):
+            tokens.update(run)
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.add(run.lower())
+    return tokens
+
+
+def query_tokens(text):
+    """
+    查询用的分词：中日韩文字只取相邻两字（单个字时取单字），所有词项都命中才算匹配
+
+    Returns:
+        set: 词项
+    """
+    tokens = set()
+    for run in _TOKEN_RE.findall(text):
+        if not _CJK_RE.match(run):
+            tokens.add(run.lower())
+        elif len(run) == 1:
+            tokens.add(run)
+        else:
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _iter_strings(value):
+    """递归取出值中的所有字符串"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, list):
+        for item in value:
+            yield from _iter_strings(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _iter_strings(item)
+
+
+class SearchService(AnnotationIndex):
+    """
+    标注内容搜索
+
+    - 取值索引：string / number / boolean 字段的取值 -> 图片，支持等值和数值范围查询
+    - 全文索引：字符串内容的词项 -> 图片，支持"包含"查询
+
+    数组字段（如 defect_categories）中每一项的子字段按分组子字段（如 category）记录分组，
+    同一分组上的多个条件落在同一个缺陷分类上，例如 compliance[物理缺陷]=false 且 result[物理缺陷]~气泡。
+    """
+
+    name = '搜索索引'
+    MAX_VALUE_LENGTH = 100  # 取值索引中字符串截断的长度
+    MAX_LIMIT = 500
+
+    OPERATORS = ('=', '~', '>', '>=', '<', '<=')
+
+    def __init__(self, annotation_service, image_service=None):
+        """
+        Args:
+            annotation_service: 标注服务
+            image_service: 图片服务，结果中的 stem 通过其图片索引解析为实际的图片文件名
+        """
+        self.image_service = image_service
+        super().__init__(annotation_service)
+
+    def _reset(self):
+        self._values = {}   # 字段 -> {取值: {分组: set(stem)}}
+        self._text = {}     # 词项 -> {(字段, 分组): set(stem)}
+
+    # ============= 字段配置 =============
+
+    def _compile(self, fields, prefix=()):
+        """
+        把 json_fields 配置展开为索引规则 [(字段路径, 类型, 数组子字段规则)]，
+        同时记录每个可查询字段的类型
+        """
+        if not prefix:
+            self._types = {}
+        specs = []
+        for field in fields:
+            name = field.get('name')
+            field_type = field.get('type')
+            if not name:
+                continue
+            path = prefix + (name,)
+            label = '.'.join(path)
+            if field_type in ('string', 'number', 'boolean'):
+                specs.append((path, field_type, None))
+                self._types[label] = field_type
+            elif field_type == 'object':
+                specs.extend(self._compile(field.get('children', []), path))
+            elif field_type == 'array':
+                children = field.get('children', [])
+                group_key = array_group_key(children)
+                child_types = {c['name']: c.get('type') for c in children if c.get('name')}
+                specs.append((path, field_type, (group_key, child_types)))
+                self._types[label] = 'text'
+                for child, child_type in child_types.items():
+                    self._types[f'{label}.{child}'] = child_type if child_type in ('string', 'number', 'boolean') else 'text'
+        return specs
+
+    @staticmethod
+    def _lookup(data, path):
+        for key in path:
+            if not isinstance(data, dict):
+                return None
+            data = data.get(key)
+        return data
+
+    @staticmethod
+    def _scalar(value, field_type):
+        """按字段类型规范化取值，类型不符时返回 None"""
+        if field_type == 'boolean':
+            return value if isinstance(value, bool) else None
+        if field_type == 'number':
+            return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+        if field_type == 'string':
+            return value[:SearchService.MAX_VALUE_LENGTH] if isinstance(value, str) else None
+        return None
+
+    def _extract(self, specs, stem, data):
+        """
+        提取一条标注的索引项
+
+        Returns:
+            tuple: ((字段, 取值, 分组)...), ((词项, (字段, 分组))...)
+        """
+        values = set()
+        terms = set()
+
+        def add_text(text, label, group):
+            for token in tokenize(text):
+                terms.add(self._intern((token, self._intern((label, group)))))
+
+        for path, field_type, rule in specs:
+            label = '.'.join(path)
+            value = self._lookup(data, path)
+            if field_type != 'array':
+                scalar = self._scalar(value, field_type)
+                if scalar is not None:
+                    values.add(self._intern((label, scalar, None)))
+                    if field_type == 'string':
+                        add_text(value, label, None)
+                continue
+
+            if not isinstance(value, list):
+                continue
+            group_key, child_types = rule
+            for item in value:
+                if not isinstance(item, dict):
+                    for text in _iter_strings(item):
+                        add_text(text, label, None)
+                    continue
+                group = item.get(group_key) if group_key else None
+                group = str(group)[:self.MAX_VALUE_LENGTH] if group is not None else None
+                for child, child_type in child_types.items():
+                    child_label = f'{label}.{child}'
+                    child_value = item.get(child)
+                    if child == group_key:
+                        if group is not None:
+                            values.add(self._intern((child_label, group, None)))
+                    elif child_type in ('number', 'boolean'):
+                        scalar = self._scalar(child_value, child_type)
+                        if scalar is not None:
+                            values.add(self._intern((child_label, scalar, group)))
+                    else:
+                        # 自由文本（如 result、details）只进全文索引
+                        for text in _iter_strings(child_value):
+                            add_text(text, child_label, group)
+
+        return tuple(values), tuple(terms)
+
+    def _apply(self, stem, facts, sign):
+        values, terms = facts
+        for label, value, group in values:
+            if sign > 0:
+                self._values.setdefault(label, {}).setdefault(value, {}).setdefault(group, set()).add(stem)
+            else:
+                self._discard(self._values, (label, value, group), stem)
+        for token, scope in terms:
+            if sign > 0:
+                self._text.setdefault(token, {}).setdefault(scope, set()).add(stem)
+            else:
+                self._discard(self._text, (token, scope), stem)
+
+    @staticmethod
+    def _discard(index, path, stem):
+        """从嵌套字典的集合中移除 stem，并清理空的层级"""
+        nodes = [index]
+        for key in path[:-1]:
+            nodes.append(nodes[-1][key])
+        stems = nodes[-1][path[-1]]
+        stems.discard(stem)
+        if stems:
+            return
+        del nodes[-1][path[-1]]
+        for depth in range(len(nodes) - 1, 0, -1):
+            if nodes[depth]:
+                break
+            del nodes[depth - 1][path[depth - 1]]
+
+    # ============= 查询 =============
+
+    def search(self, q=None, conditions=(), limit=50, cursor=None):
+        """
+        搜索标注
+
+        Args:
+            q: 在所有文本字段中搜索的关键词
+            conditions: [(字段, 分组, 运算符, 取值)]，分组为 None 时匹配任意分组；
+                        运算符: = 等于，~ 包含（全文），> >= < <= 数值比较
+            limit: 每页数量
+            cursor: 上一页返回的 next_cursor
+
+        Returns:
+            dict: images（图片文件名）/ total（匹配的标注数）/ next_cursor / ready
+        """
+        self.check_fields()
+        if not q and not conditions:
+            raise ValueError("至少需要一个查询条件")
+        limit = min(max(int(limit), 1), self.MAX_LIMIT)
+
+        with self._lock:
+            matched = None
+            if q:
+                matched = self._match_text(None, None, q)
+            for field, group, op, raw in conditions:
+                if matched is not None and not matched:
+                    break
+                stems = self._match(field, group, op, raw)
+                matched = stems if matched is None else matched & stems
+
+            stems = sorted(matched)
+            start = bisect.bisect_right(stems, cursor) if cursor else 0
+            page = stems[start:start + limit]
+            ready = self.ready
+
+        return {
+            "images": self._image_names(page),
+            "total": len(stems),
+            "next_cursor": page[-1] if start + limit < len(stems) else None,
+            "ready": ready
+        }
+
+    def _image_names(self, stems):
+        """
+        把 stem 解析为图片索引中的图片文件名
+
+        标注中保存的 image_name 可能已过时（图片改了扩展名或被替换），以图片索引为准；
+        同一 stem 对应多张图片时全部返回，图片已不存在的标注不返回。未提供图片服务时返回 stem。
+        """
+        if self.image_service is None:
+            return list(stems)
+        catalog = self.image_service.catalog
+        return [image["name"] for stem in stems for image in catalog.get_images_by_stem(stem)]
+
+    def _match(self, field, group, op, raw):
+        """单个条件匹配的 stem 集合（调用方需持有锁）"""
+        field_type = self._types.get(field)
+        if field_type is None:
+            raise ValueError(f"未知字段: {field}")
+        if op not in self.OPERATORS:
+            raise ValueError(f"不支持的运算符: {op}")
+
+        if op == '~':
+            return self._match_text(field, group, raw)
+        if field_type == 'text':
+            raise ValueError(f"字段 {field} 只支持包含查询（~）")
+
+        if op == '=':
+            value = self._parse_value(field, field_type, raw)
+            return self._union(self._values.get(field, {}).get(value, {}), group)
+
+        if field_type != 'number':
+            raise ValueError(f"字段 {field} 不是数值字段，不支持 {op}")
+        bound = self._parse_value(field, field_type, raw)
+        compare = {
+            '>': lambda v: v > bound,
+            '>=': lambda v: v >= bound,
+            '<': lambda v: v < bound,
+            '<=': lambda v: v <= bound,
+        }[op]
+        result = set()
+        for value, groups in self._values.get(field, {}).items():
+            if compare(value):
+                result |= self._union(groups, group)
+        return result
+
+    @staticmethod
+    def _parse_value(field, field_type, raw):
+        if field_type == 'boolean':
+            lowered = raw.strip().lower()
+            if lowered in ('true', '1', 'yes'):
+                return True
+            if lowered in ('false', '0', 'no'):
+                return False
+            raise ValueError(f"字段 {field} 需要布尔值: {raw}")
+        if field_type == 'number':
+            try:
+                return float(raw)
+            except ValueError:
+                raise ValueError(f"字段 {field} 需要数值: {raw}")
+        return raw[:SearchService.MAX_VALUE_LENGTH]
+
+    @staticmethod
+    def _union(groups, group):
+        """合并各分组的 stem 集合，group 不为 None 时只取该分组"""
+        if group is not None:
+            return set(groups.get(group, ()))
+        result = set()
+        for stems in groups.values():
+            result |= stems
+        return result
+
+    def _match_text(self, field, group, text):
+        """所有查询词项都出现在同一字段（及分组）中的 stem 集合（调用方需持有锁）"""
+        tokens = query_tokens(text)
+        if not tokens:
+            raise ValueError(f"查询内容为空: {text}")
+
+        by_scope = None
+        for token in sorted(tokens, key=lambda t: sum(len(s) for s in self._text.get(t, {}).values())):
+            postings = {
+                scope: stems for scope, stems in self._text.get(token, {}).items()
+                if (field is None or scope[0] == field) and (group is None or scope[1] == group)
+            }
+            if by_scope is None:
+                by_scope = postings
+            else:
+                by_scope = {
+                    scope: stems & postings[scope] for scope, stems in by_scope.items()
+                    if scope in postings
+                }
+            if not by_scope:
+                return set()
+
+        result = set()
+        for stems in by_scope.values():
+            result |= stems
+        return result
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "documents": len(self._facts),
+                "fields": len(self._values),
+                "terms": len(self._text),
+                "ready": self.ready,
+                "version": self._version
+            }
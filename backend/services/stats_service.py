@@ -0,0 +1,226 @@
+"""
+数据集统计服务 - 按 json_fields 配置增量维护各字段的聚合统计
+"""
+from collections import Counter
+
+from .annotation_index import AnnotationIndex, array_group_key
+
+
+class StatsService(AnnotationIndex):
+    """
+    数据集统计
+
+    每条标注按字段配置提取出一组计数键（如 overall_status=PASS、confidence_score 所在的直方图区间、
+    某个缺陷分类 compliance=false）。标注保存/删除时先减去旧的计数再加上新的，
+    查询统计时只需汇总计数，与标注总数无关。
+    """
+
+    name = '统计'
+    HISTOGRAM_BINS = 10     # 数值字段在 [0, 1] 上的直方图区间数
+    MAX_VALUE_LENGTH = 100  # 字符串取值计数时截断的长度
+    TOP_VALUES = 50         # 每个字符串字段返回的最多取值数
+
+    def __init__(self, annotation_service):
+        """
+        Args:
+            annotation_service: 标注服务
+        """
+        self._cached = None         # (版本, 格式化后的统计)
+        super().__init__(annotation_service)
+
+    def _reset(self):
+        self._counts = {}           # 字段 -> Counter(计数键)
+        self._sums = Counter()      # 数值字段 -> 总和
+
+    # ============= 字段配置 =============
+
+    def _compile(self, fields, prefix=()):
+        """
+        把 json_fields 配置展开为统计规则 [(字段路径, 类型, 数组分组规则)]
+
+        object 字段展开为 父字段.子字段；array 字段按分组子字段（如 category）分组，
+        统计每组中各布尔子字段（如 compliance）的取值。
+        """
+        specs = []
+        for field in fields:
+            name = field.get('name')
+            field_type = field.get('type')
+            if not name:
+                continue
+            path = prefix + (name,)
+            if field_type in ('string', 'number', 'boolean'):
+                specs.append((path, field_type, None))
+            elif field_type == 'object':
+                specs.extend(self._compile(field.get('children', []), path))
+            elif field_type == 'array':
+                children = field.get('children', [])
+                flags = [c['name'] for c in children if c.get('type') == 'boolean']
+                specs.append((path, field_type, (array_group_key(children), flags)))
+        return specs
+
+    @staticmethod
+    def _lookup(data, path):
+        for key in path:
+            if not isinstance(data, dict):
+                return None
+            data = data.get(key)
+        return data
+
+    def _extract(self, specs, stem, data):
+        """
+        提取一条标注的贡献
+
+        Returns:
+            tuple: ([(字段, 计数键)], {字段: 数值})
+        """
+        keys = []
+        sums = {}
+
+        def add(label, key):
+            keys.append(self._intern((label, key)))
+
+        for path, field_type, rule in specs:
+            label = '.'.join(path)
+            value = self._lookup(data, path)
+            if field_type == 'string':
+                if isinstance(value, str):
+                    add(label, ('value', value[:self.MAX_VALUE_LENGTH]))
+            elif field_type == 'boolean':
+                if isinstance(value, bool):
+                    add(label, ('value', value))
+            elif field_type == 'number':
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    add(label, ('count',))
+                    add(label, ('bin', self._bin_of(value)))
+                    sums[label] = value
+            elif isinstance(value, list):
+                group_key, flags = rule
+                failed_groups = set()
+                for item in value:
+                    if not isinstance(item, dict):
+                        continue
+                    group = item.get(group_key) if group_key else None
+                    group = str(group)[:self.MAX_VALUE_LENGTH] if group is not None else ''
+                    add(label, ('items', group))
+                    for flag in flags:
+                        flag_value = item.get(flag)
+                        if isinstance(flag_value, bool):
+                            add(label, ('flag', group, flag, flag_value))
+                            if not flag_value:
+                                failed_groups.add(group)
+                for group in failed_groups:
+                    add(label, ('failed_images', group))
+        return tuple(keys), sums
+
+    def _bin_of(self, value):
+        if value < 0:
+            return 'below'
+        if value > 1:
+            return 'above'
+        return min(int(value * self.HISTOGRAM_BINS), self.HISTOGRAM_BINS - 1)
+
+    def _apply(self, stem, facts, sign):
+        keys, sums = facts
+        for label, key in keys:
+            counts = self._counts.setdefault(label, Counter())
+            counts[key] += sign
+            if not counts[key]:
+                del counts[key]
+        for label, value in sums.items():
+            self._sums[label] += sign * value
+
+    # ============= 查询 =============
+
+    def get_stats(self):
+        """
+        获取数据集统计
+
+        Returns:
+            dict: total / ready / version / fields
+        """
+        self.check_fields()
+
+        with self._lock:
+            if self._cached is not None and self._cached[0] == self._version:
+                return self._cached[1]
+            total = len(self._facts)
+            fields = {}
+            for path, field_type, rule in self._specs:
+                label = '.'.join(path)
+                counts = self._counts.get(label, Counter())
+                fields[label] = self._format_field(field_type, rule, counts, self._sums[label], total)
+            stats = {
+                "total": total,
+                "ready": not self._building,
+                "version": self._version,
+                "fields": fields
+            }
+            self._cached = (self._version, stats)
+            return stats
+
+    def _format_field(self, field_type, rule, counts, total_sum, total):
+        if field_type == 'string':
+            values = sorted(
+                ((key[1], count) for key, count in counts.items()),
+                key=lambda item: (-item[1], item[0])
+            )
+            top = values[:self.TOP_VALUES]
+            counted = sum(count for _, count in values)
+            return {
+                "type": field_type,
+                "counts": dict(top),
+                "other": counted - sum(count for _, count in top),
+                "missing": total - counted
+            }
+
+        if field_type == 'boolean':
+            true_count = counts.get(('value', True), 0)
+            false_count = counts.get(('value', False), 0)
+            return {
+                "type": field_type,
+                "true": true_count,
+                "false": false_count,
+                "missing": total - true_count - false_count
+            }
+
+        if field_type == 'number':
+            count = counts.get(('count',), 0)
+            width = 1 / self.HISTOGRAM_BINS
+            return {
+                "type": field_type,
+                "count": count,
+                "mean": round(total_sum / count, 6) if count else None,
+                "histogram": [
+                    {
+                        "min": round(index * width, 6),
+                        "max": round((index + 1) * width, 6),
+                        "count": counts.get(('bin', index), 0)
+                    }
+                    for index in range(self.HISTOGRAM_BINS)
+                ],
+                "below": counts.get(('bin', 'below'), 0),
+                "above": counts.get(('bin', 'above'), 0),
+                "missing": total - count
+            }
+
+        # array：按分组统计各布尔子字段的失败率
+        _group_key, flags = rule
+        groups = {}
+        for key, count in counts.items():
+            if key[0] == 'items':
+                groups.setdefault(key[1], {})["items"] = count
+            elif key[0] == 'failed_images':
+                groups.setdefault(key[1], {})["failed_images"] = count
+        for name, group in groups.items():
+            group.setdefault("items", 0)
+            group.setdefault("failed_images", 0)
+            for flag in flags:
+                true_count = counts.get(('flag', name, flag, True), 0)
+                false_count = counts.get(('flag', name, flag, False), 0)
+                checked = true_count + false_count
+                group[flag] = {
+                    "true": true_count,
+                    "false": false_count,
+                    "failure_rate": round(false_count / checked, 4) if checked else None
+                }
+        return {"type": field_type, "groups": dict(sorted(groups.items()))}
@@ -0,0 +1,190 @@
+"""
+缩略图生成池 - 在后台进程池中生成缩略图
+"""
+import os
+import time
+import queue
+import itertools
+import threading
+import multiprocessing
+from pathlib import Path
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .thumbnail_renderer import render_thumbnail, DEFAULT_PROFILE
+
+
+class ThumbnailPool:
+    """
+    缩略图任务池
+
+    - 同一缩略图的并发请求合并为一个任务
+    - 前台请求（priority=0）优先于后台预热任务（priority=1）
+    - 实际渲染在进程池中执行（PIL 缩放是 CPU 密集型），进程池不可用时退回到线程内渲染
+    """
+
+    PRIORITY_REQUEST = 0
+    PRIORITY_WARM = 1
+    THROUGHPUT_WINDOW = 60  # 吞吐量统计窗口（秒）
+
+    def __init__(self, workers=None):
+        # 自动时使用 CPU 核数 - 1；多 worker 部署时（gunicorn.conf.py 设置 VLM_WEB_WORKERS）各 worker 平分
+        web_workers = max(1, int(os.environ.get('VLM_WEB_WORKERS') or 1))
+        self.workers = max(1, workers or ((os.cpu_count() or 2) - 1) // web_workers)
+
+        self._executor = None
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._pending = {}          # key -> Future
+        self._lock = threading.Lock()
+        self._dispatchers = []
+        self._closed = False
+
+        self._stats = {"submitted": 0, "deduplicated": 0, "completed": 0, "failed": 0}
+        self._in_flight = 0
+        self._render_ms_total = 0.0
+        self._completed_at = deque()
+
+    # ============= 提交任务 =============
+
+    def submit(self, image_path, thumbnail_path, size, profile=DEFAULT_PROFILE, priority=PRIORITY_REQUEST):
+        """
+        提交缩略图任务
+
+        Returns:
+            Future: 结果为缩略图路径
+        """
+        key = str(thumbnail_path)
+        with self._lock:
+            self._ensure_started()
+            future = self._pending.get(key)
+            if future is not None:
+                self._stats["deduplicated"] += 1
+                if priority < future.priority:
+                    # 已在预热队列中，提升优先级后重新入队（出队时跳过重复项）
+                    future.priority = priority
+                    self._queue.put((priority, next(self._counter), key))
+                return future
+
+            future = Future()
+            future.priority = priority
+            future.args = (str(image_path), key, tuple(size), profile)
+            self._pending[key] = future
+            self._stats["submitted"] += 1
+            self._queue.put((priority, next(self._counter), key))
+            return future
+
+    def warm(self, jobs, size, profile=DEFAULT_PROFILE):
+        """
+        批量提交后台预热任务
+
+        Args:
+            jobs: [(原图路径, 缩略图路径)]
+        """
+        count = 0
+        for image_path, thumbnail_path in jobs:
+            self.submit(image_path, thumbnail_path, size, profile, priority=self.PRIORITY_WARM)
+            count += 1
+        return count
+
+    # ============= 调度 =============
+
+    def _ensure_started(self):
+        """延迟创建进程池和调度线程（调用方需持有锁）"""
+        if self._dispatchers:
+            return
+        try:
+            # 使用 spawn 避免在多线程进程中 fork
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        except (OSError, NotImplementedError) as e:
+            print(f"[警告] 无法创建缩略图进程池，改为线程内生成: {e}")
+            self._executor = None
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._dispatch, name=f'thumbnail-{index}', daemon=True)
+            thread.start()
+            self._dispatchers.append(thread)
+
+    def _dispatch(self):
+        while True:
+            _priority, _seq, key = self._queue.get()
+            with self._lock:
+                future = self._pending.get(key)
+                if future is None or future.running() or future.done():
+                    continue  # 重复入队的任务
+                if not future.set_running_or_notify_cancel():
+                    self._pending.pop(key, None)
+                    continue
+                self._in_flight += 1
+
+            started = time.perf_counter()
+            try:
+                result = self._render(*future.args)
+                error = None
+            except Exception as e:
+                result, error = None, e
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            with self._lock:
+                self._in_flight -= 1
+                self._pending.pop(key, None)
+                if error is None:
+                    self._stats["completed"] += 1
+                    self._render_ms_total += elapsed_ms
+                    now = time.monotonic()
+                    self._completed_at.append(now)
+                    while self._completed_at and now - self._completed_at[0] > self.THROUGHPUT_WINDOW:
+                        self._completed_at.popleft()
+                else:
+                    self._stats["failed"] += 1
+
+            if error is None:
+                future.set_result(result)
+            else:
+                if future.priority == self.PRIORITY_WARM and not self._closed:
+                    # 前台请求的失败由调用方处理
+                    print(f"[错误] 预生成缩略图失败 {Path(future.args[0]).name}: {error}")
+                future.set_exception(error)
+
+    def _render(self, image_path, thumbnail_path, size, profile):
+        if self._executor is not None:
+            try:
+                return self._executor.submit(
+                    render_thumbnail, image_path, thumbnail_path, size, profile
+                ).result()
+            except BrokenProcessPool:
+                print("[警告] 缩略图进程池已损坏，改为线程内生成")
+                self._executor = None
+            except RuntimeError:
+                # 解释器退出时进程池已被关闭，剩余任务直接放弃
+                self._closed = True
+                raise
+        return render_thumbnail(image_path, thumbnail_path, size, profile)
+
+    # ============= 统计 =============
+
+    def get_stats(self):
+        """队列深度与吞吐量统计"""
+        with self._lock:
+            now = time.monotonic()
+            recent = sum(1 for t in self._completed_at if now - t <= self.THROUGHPUT_WINDOW)
+            completed = self._stats["completed"]
+            return {
+                **self._stats,
+                "workers": self.workers,
+                "mode": ("idle" if not self._dispatchers
+                         else "process" if self._executor is not None else "thread"),
+                "queue_depth": len(self._pending) - self._in_flight,
+                "in_flight": self._in_flight,
+                "avg_render_ms": round(self._render_ms_total / completed, 1) if completed else None,
+                "throughput_per_sec": round(recent / self.THROUGHPUT_WINDOW, 2)
+            }
+
+    def shutdown(self):
+        """关闭进程池"""
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,117 @@
+"""
+缩略图渲染 - 可在子进程中执行的缩略图生成函数
+"""
+import os
+from pathlib import Path
+from PIL import Image
+
+
+# 质量/速度档位
+#   draft_gap:    JPEG 按 DCT 缩放解码时，解码尺寸至少为目标尺寸的倍数（None 表示完整解码）
+#   reducing_gap: Image.thumbnail 先整数倍缩小、再精细重采样时保留的倍数
+#   progressive:  输出渐进式 JPEG 并保留 EXIF/ICC（原图大小的渐进版本，浏览器先显示模糊全图再逐步清晰）
+THUMBNAIL_PROFILES = {
+    "quality": {
+        "draft_gap": 3.0,
+        "reducing_gap": 3.0,
+        "resample": Image.Resampling.LANCZOS,
+        "jpeg_quality": 90,
+        "optimize": True
+    },
+    "balanced": {
+        "draft_gap": 2.0,
+        "reducing_gap": 2.0,
+        "resample": Image.Resampling.LANCZOS,
+        "jpeg_quality": 88,
+        "optimize": True
+    },
+    "fast": {
+        "draft_gap": 1.0,
+        "reducing_gap": 1.5,
+        "resample": Image.Resampling.BILINEAR,
+        "jpeg_quality": 82,
+        "optimize": False
+    },
+    "progressive": {
+        "draft_gap": None,
+        "reducing_gap": None,
+        "resample": Image.Resampling.LANCZOS,
+        "jpeg_quality": 90,
+        "optimize": True,
+        "progressive": True
+    }
+}
+DEFAULT_PROFILE = "balanced"
+
+
+def get_profile(name):
+    """按名称获取档位，未知名称回退到默认档位"""
+    return THUMBNAIL_PROFILES.get(name) or THUMBNAIL_PROFILES[DEFAULT_PROFILE]
+
+
+def _fit_size(width, height, max_size):
+    """保持宽高比缩放到 max_size 之内的尺寸"""
+    scale = min(max_size[0] / width, max_size[1] / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _apply_draft(img, size, draft_gap):
+    """
+    对 JPEG/MPO 启用 DCT 缩放解码（1/2、1/4、1/8），其他格式不受影响
+
+    必须在 convert/load 之前调用，否则已经完整解码
+    """
+    if draft_gap is None or img.format not in ('JPEG', 'MPO'):
+        return
+    target = _fit_size(img.width, img.height, size)
+    requested = (int(target[0] * draft_gap), int(target[1] * draft_gap))
+    # draft 只支持把 YCbCr 直接解码为 RGB；其他模式保持原模式
+    img.draft('RGB' if img.mode == 'RGB' else None, requested)
+
+
+def render_thumbnail(image_path, thumbnail_path, size, profile=DEFAULT_PROFILE):
+    """
+    生成缩略图（模块级函数，可在子进程中执行）
+
+    Args:
+        image_path: 原始图片路径
+        thumbnail_path: 缩略图输出路径（JPEG）
+        size: 最大宽高 (w, h)
+        profile: 质量/速度档位名称，见 THUMBNAIL_PROFILES
+
+    Returns:
+        str: 缩略图路径
+    """
+    image_path = Path(image_path)
+    thumbnail_path = Path(thumbnail_path)
+    options = get_profile(profile)
+    size = tuple(size)
+
+    with Image.open(image_path) as img:
+        _apply_draft(img, size, options["draft_gap"])
+
+        # 转换RGBA到RGB（处理PNG透明背景）
+        if img.mode in ('RGBA', 'LA', 'P'):
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+            img = background
+        elif img.mode not in ('RGB', 'L', 'CMYK'):
+            img = img.convert('RGB')
+
+        # 生成缩略图（保持宽高比）；L/CMYK 在缩小后再转换，减少转换的像素量
+        img.thumbnail(size, options["resample"], reducing_gap=options["reducing_gap"])
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        # 先写临时文件再替换，避免并发读取到写了一半的缩略图
+        tmp_path = thumbnail_path.with_name(f".{thumbnail_path.name}.{os.getpid()}.tmp")
+        extra = {}
+        if options.get("progressive"):
+            # 与原图显示一致：保留方向信息和色彩配置
+            extra = {"progressive": True, "exif": img.info.get('exif', b''), "icc_profile": img.info.get('icc_profile')}
+        img.save(tmp_path, 'JPEG', quality=options["jpeg_quality"], optimize=options["optimize"], **extra)
+        os.replace(tmp_path, thumbnail_path)
+
+    return str(thumbnail_path)
@@ -2,5 +2,9 @@
 工具类模块
 """
 from .system_helper import SystemHelper
+from .http_cache import HttpCacheHelper
+from .process_lock import ProcessLock
+from .file_sender import FileSender
+from .json_response import CompactJSONProvider, ResponseCompressor
 
-__all__ = ['SystemHelper']
+__all__ = ['SystemHelper', 'HttpCacheHelper', 'ProcessLock', 'FileSender', 'CompactJSONProvider', 'ResponseCompressor']
@@ -0,0 +1,188 @@
+"""
+ASGI 适配模块 - 在分组线程池中运行 WSGI 应用，部分路由由协程直接处理
+"""
+import io
+import sys
+import asyncio
+from urllib.parse import parse_qs
+
+from .json_response import dumps
+
+
+class FileWrapper:
+    """wsgi.file_wrapper：按较大的块读取文件，减少大图在线程池和事件循环之间的往返次数"""
+
+    MIN_BLOCK_SIZE = 256 * 1024
+
+    def __init__(self, file, block_size=8192):
+        self.file = file
+        self.block_size = max(block_size, self.MIN_BLOCK_SIZE)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        data = self.file.read(self.block_size)
+        if not data:
+            raise StopIteration
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class AsgiBridge:
+    """
+    ASGI 应用
+
+    - routes 中的路由由协程直接处理（如长轮询、SSE），等待期间不占用线程
+    - 其余请求交给 WSGI 应用，按路径前缀分配到不同线程池执行（响应体也在该线程池中逐块读取），
+      某一类请求的 I/O 变慢（如网络存储上读取标注、生成缩略图）不会占满其他请求的线程
+    """
+
+    def __init__(self, wsgi_app, pools, default_pool, routes=None):
+        """
+        Args:
+            wsgi_app: WSGI 应用
+            pools: [(路径前缀, ThreadPoolExecutor)]，按顺序匹配
+            default_pool: 未匹配任何前缀时使用的线程池
+            routes: {(方法, 路径): 协程函数 handler(scope, receive, send)}
+        """
+        self.wsgi_app = wsgi_app
+        self.pools = list(pools)
+        self.default_pool = default_pool
+        self.routes = dict(routes or {})
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler is not None:
+            await handler(scope, receive, send)
+        else:
+            await self._call_wsgi(scope, receive, send)
+
+    def pool_for(self, path):
+        for prefix, pool in self.pools:
+            if path.startswith(prefix):
+                return pool
+        return self.default_pool
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for pool in {self.default_pool, *(pool for _prefix, pool in self.pools)}:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # ============= WSGI =============
+
+    async def _call_wsgi(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        environ = self._environ(scope, bytes(body))
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                  for name, value in headers]
+            return _write_not_supported
+
+        def call():
+            # 调用应用并取出第一块响应体，多数响应（JSON）只需要这一次线程池往返
+            result = self.wsgi_app(environ, start_response)
+            iterator = iter(result)
+            return result, iterator, next(iterator, None)
+
+        loop = asyncio.get_running_loop()
+        pool = self.pool_for(scope['path'])
+        result, iterator, chunk = await loop.run_in_executor(pool, call)
+        try:
+            await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+            while chunk is not None:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(pool, next, iterator, None)
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                await loop.run_in_executor(pool, close)
+
+    @staticmethod
+    def _environ(scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'REMOTE_ADDR': client[0],
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+            'wsgi.file_wrapper': FileWrapper,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+                key = name
+            else:
+                key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+def _write_not_supported(data):
+    raise NotImplementedError("不支持 WSGI write()，请返回可迭代的响应体")
+
+
+# ============= 协程路由的辅助函数 =============
+
+def query_params(scope):
+    """查询参数（每个参数取第一个值）"""
+    parsed = parse_qs(scope['query_string'].decode('latin-1'), keep_blank_values=True)
+    return {key: values[0] for key, values in parsed.items()}
+
+
+def request_header(scope, name):
+    name = name.lower().encode('latin-1')
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def send_json(send, data, status=200, headers=()):
+    body = dumps(data)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+                    *headers]
+    })
+    await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,95 @@
+"""
+文件发送工具模块 - 可选由前端代理（nginx 等）直接发送文件
+"""
+import mimetypes
+from pathlib import Path
+from urllib.parse import quote
+
+from flask import Response, send_from_directory
+
+
+class FileSender:
+    """
+    发送磁盘上的文件
+
+    mode:
+        'off'         由 Python 读取并发送文件（默认，无需代理配合）
+        'x-accel'     只返回 X-Accel-Redirect 头，由 nginx 的 internal location 发送文件
+        'x-sendfile'  只返回 X-Sendfile 头（Apache mod_xsendfile / lighttpd）
+
+    后两种模式下 worker 在返回响应头后立即空闲，文件内容由代理通过 sendfile 发送，
+    Range 请求也由代理处理。路径检查、ETag 和 304 仍在应用内完成。
+    代理只开放数据目录（root）；不在该目录下的文件仍由 Python 发送。
+    """
+
+    MODES = ('off', 'x-accel', 'x-sendfile')
+
+    def __init__(self, mode='off', accel_prefix='/_protected', root=None):
+        """
+        Args:
+            mode: 发送方式，见类说明
+            accel_prefix: nginx 中映射到数据目录的 internal location 前缀
+                          （location /_protected/ { internal; alias /数据目录/; }）
+            root: 数据目录（图片目录和缩略图目录的上级目录），可以是返回路径的函数（目录可在运行时切换）；
+                  X-Accel-Redirect 使用相对该目录的路径
+        """
+        if mode not in self.MODES:
+            print(f"[警告] 未知的文件发送方式 {mode}，使用 off")
+            mode = 'off'
+        if mode != 'off' and root is None:
+            print(f"[警告] 文件发送方式 {mode} 未指定数据目录，使用 off")
+            mode = 'off'
+        self.mode = mode
+        self.accel_prefix = '/' + accel_prefix.strip('/')
+        self.root = root
+        self._warned_roots = set()
+
+    @property
+    def offloaded(self):
+        return self.mode != 'off'
+
+    def relative_path(self, path):
+        """
+        文件相对数据目录的路径
+
+        Returns:
+            Path，文件不在数据目录下时返回 None
+        """
+        root = self.root() if callable(self.root) else self.root
+        try:
+            return Path(path).resolve().relative_to(Path(root).resolve())
+        except ValueError:
+            if root not in self._warned_roots:
+                self._warned_roots.add(root)
+                print(f"[警告] 文件不在数据目录 {root} 下，改由 Python 发送: {path}")
+            return None
+
+    def send(self, path, etag=None):
+        """
+        发送文件（调用方负责检查路径是否允许访问）
+
+        Args:
+            path: 文件路径
+            etag: 响应的 ETag
+
+        Returns:
+            Response
+        """
+        path = Path(path)
+        relative = self.relative_path(path) if self.mode != 'off' else None
+        if relative is None:
+            response = send_from_directory(path.parent, path.name, etag=etag)
+            # 告知客户端可以按范围续传/分段读取（Range 请求由 send_from_directory 处理）
+            response.accept_ranges = 'bytes'
+            return response
+
+        if not path.is_file():
+            raise FileNotFoundError(f"文件不存在: {path.name}")
+        response = Response(mimetype=mimetypes.guess_type(path.name)[0] or 'application/octet-stream')
+        if self.mode == 'x-accel':
+            response.headers['X-Accel-Redirect'] = self.accel_prefix + '/' + quote(relative.as_posix())
+        else:
+            response.headers['X-Sendfile'] = str(path.resolve())
+        if etag is not None:
+            response.set_etag(etag)
+        return response
@@ -0,0 +1,66 @@
+"""
+HTTP 缓存工具模块
+"""
+from datetime import datetime, timezone
+from flask import request, make_response
+
+
+class HttpCacheHelper:
+    """ETag / Last-Modified / Cache-Control 相关的辅助工具类"""
+
+    # 缓存策略
+    IMMUTABLE = 'immutable'      # URL 带版本号，内容永不变化
+    REVALIDATE = 'revalidate'    # 可缓存，但每次使用前必须向服务器确认（304）
+    PRIVATE = 'private'          # 同 REVALIDATE，且只允许浏览器缓存（标注等用户数据）
+
+    IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+    @staticmethod
+    def is_not_modified(etag, last_modified=None):
+        """
+        判断客户端缓存是否仍然有效
+
+        If-None-Match 存在时只比较 ETag（弱比较，压缩后的响应带弱 ETag），否则比较 If-Modified-Since
+        """
+        if request.if_none_match:
+            return etag is not None and request.if_none_match.contains_weak(etag)
+        if last_modified is not None and request.if_modified_since:
+            return HttpCacheHelper._to_http_datetime(last_modified) <= request.if_modified_since
+        return False
+
+    @staticmethod
+    def not_modified(etag, last_modified=None, policy=REVALIDATE):
+        """构造 304 响应"""
+        response = make_response('', 304)
+        return HttpCacheHelper.apply(response, etag, last_modified, policy)
+
+    @staticmethod
+    def apply(response, etag=None, last_modified=None, policy=REVALIDATE):
+        """为响应设置 ETag、Last-Modified 和 Cache-Control"""
+        if etag is not None:
+            response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = HttpCacheHelper._to_http_datetime(last_modified)
+
+        cache_control = response.cache_control
+        if policy == HttpCacheHelper.IMMUTABLE:
+            cache_control.no_cache = None
+            cache_control.public = True
+            cache_control.max_age = HttpCacheHelper.IMMUTABLE_MAX_AGE
+            cache_control.immutable = True
+        else:
+            cache_control.public = None
+            cache_control.max_age = None
+            cache_control.no_cache = True
+            if policy == HttpCacheHelper.PRIVATE:
+                cache_control.private = True
+        return response
+
+    @staticmethod
+    def _to_http_datetime(value):
+        """转换为精确到秒的 UTC 时间（HTTP 日期格式的精度）"""
+        if isinstance(value, (int, float)):
+            value = datetime.fromtimestamp(value, tz=timezone.utc)
+        elif value.tzinfo is None:
+            value = value.astimezone(timezone.utc)
+        return value.replace(microsecond=0)
@@ -0,0 +1,121 @@
+"""
+JSON 响应工具模块 - 紧凑序列化（可选 orjson）与按 Accept-Encoding 压缩
+"""
+import gzip
+import json
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+# 可选依赖：安装后自动使用
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def dumps(obj, default=DefaultJSONProvider.default, fast=True):
+    """
+    序列化为紧凑的 UTF-8 JSON：无多余空白，中文等非 ASCII 字符不转义，保持字典原有的键顺序
+
+    Args:
+        obj: 要序列化的对象
+        default: 无法直接序列化的对象的转换函数（默认与 Flask 一致：日期、Decimal、UUID、dataclass）
+        fast: 已安装 orjson 时使用 orjson
+
+    Returns:
+        bytes
+    """
+    if fast and orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default,
+                                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            # orjson 不支持的情况（如超过 64 位的整数）回退到标准库
+            pass
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class CompactJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON 提供者：jsonify 输出紧凑 JSON（调试模式下也不缩进）
+
+    默认提供者会把中文转义为 \\uXXXX（每个汉字 6 字节，UTF-8 只需 3 字节），
+    调试模式下还会缩进，标注列表这类大响应因此成倍膨胀。
+    """
+
+    ensure_ascii = False
+    sort_keys = False
+    fast = True     # 已安装 orjson 时使用 orjson
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, self.default, self.fast).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj, self.default, self.fast), mimetype=self.mimetype)
+
+
+class ResponseCompressor:
+    """
+    按请求的 Accept-Encoding 压缩较大的 JSON 响应（已安装 brotli 时优先 br，否则 gzip）
+
+    流式响应（导出）、文件响应和已设置 Content-Encoding 的响应保持原样。
+    压缩后强 ETag 改为弱 ETag：同一内容的不同编码不是逐字节相同的表示。
+    """
+
+    MIMETYPES = ('application/json',)
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5):
+        """
+        Args:
+            min_size: 响应体达到该字节数才压缩，0 表示不压缩
+            gzip_level: gzip 压缩级别（1-9）
+            brotli_quality: brotli 压缩质量（0-11，较高的级别对每次请求都压缩的动态响应太慢）
+        """
+        self.min_size = int(min_size or 0)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    @property
+    def encodings(self):
+        """服务端支持的编码，按优先顺序"""
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, mode=brotli.MODE_TEXT, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def apply(self, response):
+        """after_request 钩子：在满足条件时压缩响应，返回响应"""
+        if (self.min_size <= 0
+                or response.mimetype not in self.MIMETYPES
+                or response.direct_passthrough
+                or response.is_streamed
+                or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        # 是否压缩取决于请求头，缓存需按 Accept-Encoding 区分
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+
+        response.set_data(self.compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+        return response
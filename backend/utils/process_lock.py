@@ -0,0 +1,63 @@
+"""
+跨进程文件锁 - 多 worker 部署时选出唯一执行某项工作的进程
+"""
+import os
+from pathlib import Path
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+
+class ProcessLock:
+    """
+    非阻塞的独占文件锁
+
+    锁随进程退出（包括崩溃）自动释放，因此 worker 被重启后新进程可以重新获得。
+    同一进程内不同实例之间也互斥（每个实例单独打开文件）。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def acquire(self):
+        """
+        尝试获得锁（不等待）
+
+        Returns:
+            bool: 是否获得（已持有时返回 True）
+        """
+        if self._file is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.path, 'a+b')
+        try:
+            if os.name == 'nt':
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if os.name == 'nt':
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
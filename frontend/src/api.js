@@ -38,18 +38,57 @@ export default {
   },
   
   // 获取图片列表
-  getImages() {
-    return api.get('/images')
+  // params 可选: { limit, offset, cursor, annotated, prefix, q, modified_since, status, sort, order }
+  getImages(params = {}) {
+    return api.get('/images', { params })
+  },
+  
+  // 重新扫描图片目录（force=true 时重新校验所有文件）
+  refreshImages(force = false) {
+    return api.post('/images/refresh', { force })
+  },
+  
+  // 订阅图片列表变更（Server-Sent Events），返回 EventSource，调用 close() 取消订阅
+  subscribeImageEvents(onEvent) {
+    const source = new EventSource('/api/images/events')
+    ;['upsert', 'delete', 'reset'].forEach(type => {
+      source.addEventListener(type, e => onEvent(JSON.parse(e.data)))
+    })
+    return source
   },
   
   // 获取图片URL（使用相对路径，自动适配开发和生产环境）
-  getImageUrl(filename) {
-    return `/api/images/${encodeURIComponent(filename)}`
+  // size 可选: 'thumb' | 'preview' | 'original'（默认原图）
+  // version 为图片列表中的内容版本号，带上后浏览器可长期缓存
+  getImageUrl(filename, size, version) {
+    const params = new URLSearchParams()
+    if (size) params.set('size', size)
+    if (version) params.set('v', version)
+    const query = params.toString()
+    const url = `/api/images/${encodeURIComponent(filename)}`
+    return query ? `${url}?${query}` : url
   },
   
   // 获取缩略图URL（使用相对路径，自动适配开发和生产环境）
-  getThumbnailUrl(filename) {
-    return `/api/thumbnails/${encodeURIComponent(filename)}`
+  getThumbnailUrl(filename, version) {
+    const url = `/api/thumbnails/${encodeURIComponent(filename)}`
+    return version ? `${url}?v=${version}` : url
+  },
+  
+  // 批量获取缩略图（一次请求返回一页图片的缩略图）
+  // 返回 { thumbnails: { 文件名: { url: blob URL, version } }, errors: { 文件名: 错误信息 } }
+  async getThumbnailBatch(names) {
+    const buffer = await api.post('/thumbnails/batch', { names }, { responseType: 'arraybuffer' })
+    // 响应格式: 4 字节索引长度 + JSON 索引 + 拼接的 JPEG 数据
+    const indexLength = new DataView(buffer).getUint32(0)
+    const index = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, indexLength)))
+    const dataStart = 4 + indexLength
+    const thumbnails = {}
+    for (const item of index.thumbnails) {
+      const blob = new Blob([new Uint8Array(buffer, dataStart + item.offset, item.length)], { type: 'image/jpeg' })
+      thumbnails[item.name] = { url: URL.createObjectURL(blob), version: item.version }
+    }
+    return { thumbnails, errors: index.errors }
   },
   
   // 删除图片
@@ -67,9 +106,14 @@ export default {
     return api.get(`/annotations/${imageName}/summary`)
   },
   
-  // 保存标注数据
-  saveAnnotation(imageName, data) {
-    return api.post(`/annotations/${imageName}`, data)
+  // 批量获取一页图片的标注摘要（单次最多 200 张）
+  getAnnotationSummaries(names) {
+    return api.post('/annotations/summaries', { names })
+  },
+  
+  // 保存标注数据，complete 为 true 时后端同时校验必填字段（手动保存），否则只校验类型（自动保存）
+  saveAnnotation(imageName, data, complete = false) {
+    return api.post(`/annotations/${imageName}`, data, { params: complete ? { complete: true } : {} })
   },
   
   // 获取所有标注
@@ -77,6 +121,44 @@ export default {
     return api.get('/annotations')
   },
   
+  // 批量写入标注（后台任务），selector: { names } | { filter } | { all: true }
+  saveAnnotationsBulk(annotation, selector, onlyUnannotated = false) {
+    return api.post('/annotations/bulk', { annotation, ...selector, only_unannotated: onlyUnannotated })
+  },
+  
+  // 查询后台任务进度
+  getJob(jobId) {
+    return api.get(`/jobs/${jobId}`)
+  },
+  
+  // 字段配置修改后迁移已有标注（后台任务）
+  // renames: { 旧字段路径: 新字段名 }；dryRun 为 true 时只统计不写入
+  migrateAnnotations({ renames = {}, dryRun = false } = {}) {
+    return api.post('/annotations/migrate', { renames, dry_run: dryRun })
+  },
+  
+  // VLM 训练数据导出地址（后端流式生成）
+  // format 可选: 'jsonl' | 'json'
+  getExportUrl(format = 'jsonl') {
+    return `/api/export/vlm?format=${format}`
+  },
+  
+  // 数据集统计（各字段取值计数、直方图、分组失败率）
+  getStats() {
+    return api.get('/stats')
+  },
+  
+  // 搜索标注内容
+  // conditions: ['overall_status=FAIL', 'defect_categories.result[物理缺陷]~气泡', ...]
+  searchAnnotations({ q, conditions = [], limit = 50, cursor } = {}) {
+    const params = new URLSearchParams()
+    if (q) params.append('q', q)
+    conditions.forEach(condition => params.append('where', condition))
+    params.append('limit', limit)
+    if (cursor) params.append('cursor', cursor)
+    return api.get(`/search?${params.toString()}`)
+  },
+  
   // 打开文件夹
   openFolder(folderType) {
     return api.post('/open-folder', { folder_type: folderType })
@@ -8,7 +8,12 @@ echo "======================================"
 # 启动后端
 echo "启动后端服务..."
 cd /app/backend
-python3 app.py &
+if command -v gunicorn >/dev/null 2>&1; then
+    gunicorn -c gunicorn.conf.py wsgi:app &
+else
+    echo "未安装 gunicorn，使用开发服务器"
+    python3 app.py &
+fi
 BACKEND_PID=$!
 
 # 等待后端启动
@@ -3,13 +3,18 @@
 # 停止所有旧进程
 echo "停止旧进程..."
 pkill -9 -f "python3 app.py"
+pkill -f "gunicorn -c gunicorn.conf.py"
 pkill -9 -f "vite --host"
 sleep 2
 
 # 启动后端
 echo "启动后端服务 (端口5000)..."
 cd /app/backend
-nohup python3 app.py > /tmp/backend.log 2>&1 &
+if command -v gunicorn >/dev/null 2>&1; then
+    nohup gunicorn -c gunicorn.conf.py wsgi:app > /tmp/backend.log 2>&1 &
+else
+    nohup python3 app.py > /tmp/backend.log 2>&1 &
+fi
 BACKEND_PID=$!
 echo $BACKEND_PID > /tmp/backend.pid
 echo "后端PID: $BACKEND_PID"